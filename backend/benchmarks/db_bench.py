@@ -0,0 +1,206 @@
+"""数据库基准测试
+
+对不同规模（默认 1万、10万、100万）的合成项目目录，测量项目列表（首页、深分页、各类筛选、含摘要）、
+项目详情、CSV 导出以及批量导入（新增与更新）的耗时。生成的数据库按规模和种子缓存在 --data-dir 中，
+重复运行时直接复用；导入基准写入的项目在测量后删除，不影响下次运行。
+每个查询测量前清空查询缓存，测的是数据库本身的耗时。
+
+用法（在 backend 目录下）：
+    python benchmarks/db_bench.py --sizes 10k,100k --output db-bench.json
+    python benchmarks/db_bench.py --sizes 1m --baseline db-bench.json --tolerance 0.2
+"""
+import argparse
+import io
+import logging
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from results import build_report, check_baseline, write_report  # noqa: E402
+from synthetic_catalogue import generate_projects, parse_count, populate, write_ndjson  # noqa: E402
+
+import models  # noqa: E402
+from cache import query_cache  # noqa: E402
+
+# 比较基线时检查的指标（数值越大越差）
+REGRESSION_METRICS = ('median_ms',)
+# 每页条数（与前端一致）
+PER_PAGE = 20
+# 导入基准的批准号序号起始值（合成目录的序号为4位，导入的项目不会与之重复而被当作更新）
+INGEST_SERIAL_START = 10000
+# 超过此规模时跳过全量 CSV 导出（export_projects_to_csv 会把结果全部放在内存中）
+DEFAULT_EXPORT_MAX = 100000
+
+# 项目列表基准：名称 -> (get_projects_list 的参数, 页码位置)
+# 页码位置为 first / middle / last，按筛选后的总数计算
+LIST_CASES = {
+    'list_first_page': ({}, 'first'),
+    'list_middle_page': ({}, 'middle'),
+    'list_deep_page': ({}, 'last'),
+    'list_unit': ({'unit': '浙江大学'}, 'first'),
+    'list_unit_deep': ({'unit': '浙江大学'}, 'last'),
+    'list_code': ({'code': 'F02'}, 'first'),
+    'list_range': ({'filters': {'funding_min': 200, 'start_year_min': 2015, 'start_year_max': 2018}}, 'first'),
+    'list_combined': ({'unit': '大学', 'code': 'H', 'filters': {'end_year_max': 2015}}, 'middle'),
+    'list_with_texts': ({'fields': models.PROJECT_LIST_FIELDS}, 'first'),
+}
+
+
+def timed_runs(func, repeat):
+    """运行 repeat 次（每次前清空查询缓存），返回 (各次耗时毫秒, 最后一次的结果)"""
+    timings, result = [], None
+    for _ in range(repeat):
+        query_cache.invalidate()
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, result
+
+
+def summarize(size_label, mode, timings, **extra):
+    item = {
+        'scenario': size_label,
+        'mode': mode,
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'runs': len(timings),
+    }
+    item.update(extra)
+    return item
+
+
+def bench_lists(size_label, repeat):
+    results = []
+    for mode, (kwargs, position) in LIST_CASES.items():
+        query_cache.invalidate()
+        _, total = models.get_projects_list(per_page=PER_PAGE, **kwargs)
+        last_page = max(1, -(-total // PER_PAGE))
+        page = {'first': 1, 'middle': max(1, last_page // 2), 'last': last_page}[position]
+        timings, _ = timed_runs(lambda: models.get_projects_list(page=page, per_page=PER_PAGE, **kwargs), repeat)
+        results.append(summarize(size_label, mode, timings, page=page, matched=total))
+    return results
+
+
+def bench_detail(size_label, repeat, samples=50):
+    """随机抽取项目测量详情查询，每个项目测一次"""
+    conn = models.get_db_connection()
+    ids = [row['id'] for row in conn.execute(
+        'SELECT id FROM projects WHERE rowid IN (SELECT abs(random()) % (SELECT max(rowid) FROM projects) + 1 '
+        f'FROM projects LIMIT {samples})')]
+    conn.close()
+    timings = []
+    for project_id in ids * repeat:
+        query_cache.invalidate()
+        start = time.perf_counter()
+        models.get_project_detail(project_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return [summarize(size_label, 'detail', timings)]
+
+
+def bench_export(size_label, size, repeat, export_max):
+    results = []
+    cases = [('export_csv_unit', {'unit': '浙江大学'})]
+    if size <= export_max:
+        cases.append(('export_csv_full', {}))
+    for mode, kwargs in cases:
+        timings, content = timed_runs(lambda: models.export_projects_to_csv(**kwargs), repeat)
+        results.append(summarize(size_label, mode, timings, bytes=len(content)))
+    return results
+
+
+def bench_ingest(size_label, rows, seed):
+    """通过 importer 导入 NDJSON（先新增再更新同一批项目），测量后删除导入的项目"""
+    from importer import import_projects
+
+    stream = io.StringIO()
+    projects = list(generate_projects(rows, seed + 1, INGEST_SERIAL_START))
+    write_ndjson(projects, stream)
+    results = []
+    try:
+        for mode in ('ingest_insert', 'ingest_update'):
+            stream.seek(0)
+            start = time.perf_counter()
+            report = import_projects(stream, 'ndjson')
+            elapsed = time.perf_counter() - start
+            if report['failed']:
+                raise RuntimeError(f'导入失败: {report["errors"][:3]}')
+            results.append(summarize(size_label, mode, [elapsed * 1000], rows=rows,
+                                     rows_per_sec=round(rows / elapsed)))
+    finally:
+        models.delete_projects_bulk([project['id'] for project in projects])
+    return results
+
+
+def prepare_database(data_dir, size, seed, regenerate):
+    """返回指定规模的合成数据库路径，不存在时生成"""
+    path = os.path.join(data_dir, f'catalogue-{size}-seed{seed}.db')
+    if regenerate and os.path.exists(path):
+        os.remove(path)
+    if not os.path.exists(path):
+        print(f'生成 {size} 个项目: {path}')
+        try:
+            summary = populate(path, size, seed, progress=lambda done, total: print(
+                f'\r  已写入 {done}/{total}', end='', flush=True))
+        except BaseException:
+            # 不保留不完整的数据库
+            os.remove(path)
+            raise
+        print(f"\n  耗时 {summary['seconds']} 秒（{summary['rows_per_sec']} 行/秒）")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库基准测试（合成项目目录）')
+    parser.add_argument('--sizes', default='10k,100k,1m', help='目录规模，逗号分隔，如 10k,100k,1m')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'nsfc-db-bench'),
+                        help='缓存生成的数据库的目录')
+    parser.add_argument('--regenerate', action='store_true', help='重新生成数据库')
+    parser.add_argument('--repeat', type=int, default=5, help='每个查询的重复次数，取中位数')
+    parser.add_argument('--ingest-rows', type=int, default=10000, help='导入基准的行数')
+    parser.add_argument('--export-max', type=parse_count, default=DEFAULT_EXPORT_MAX,
+                        help='全量 CSV 导出的最大规模，超过时跳过')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    parser.add_argument('--baseline', help='用于比较的基线 JSON 文件')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的相对回退（默认 0.2 即 20%%）')
+    parser.add_argument('-v', '--verbose', action='store_true', help='输出应用日志（含慢查询）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    results = []
+    for label in args.sizes.split(','):
+        size = parse_count(label)
+        label = label.strip().lower()
+        models.DATABASE = prepare_database(args.data_dir, size, args.seed, args.regenerate)
+        models.init_db()
+
+        print(f'\n== {label}（{size} 个项目）')
+        for item in (bench_lists(label, args.repeat) + bench_detail(label, args.repeat)
+                     + bench_export(label, size, args.repeat, args.export_max)
+                     + bench_ingest(label, args.ingest_rows, args.seed)):
+            rate = f"  {item['rows_per_sec']} 行/秒" if 'rows_per_sec' in item else ''
+            print(f"  {item['mode']:<20}{item['median_ms']:>12.2f} ms  "
+                  f"(最小 {item['min_ms']:.2f}，最大 {item['max_ms']:.2f}){rate}")
+            results.append(item)
+        # Linux 下 ru_maxrss 单位为 KB；各规模依次运行，该值为截至当前的峰值
+        results.append({'scenario': label, 'mode': 'peak_rss',
+                        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+
+    if args.output:
+        write_report(args.output, build_report('database', vars(args), results))
+    if args.baseline:
+        return check_baseline(args.baseline, results, REGRESSION_METRICS, args.tolerance)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""下载器基准测试
+
+在本进程中启动模拟服务器，每个场景在独立子进程中运行下载器（scan_total_pages 或 download_report），
+记录耗时、请求数、子进程峰值 RSS 和 PDF 大小。结果可写入 JSON，并与基线比较以发现性能回退。
+
+用法（在 backend 目录下）：
+    python benchmarks/downloader_bench.py
+    python benchmarks/downloader_bench.py --pages 80 --api-latency-ms 30 --output bench.json
+    python benchmarks/downloader_bench.py --baseline bench.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_nsfc_server import MockConfig, MockNsfcServer  # noqa: E402
+from results import build_report, check_baseline, write_report  # noqa: E402
+
+# 场景：名称 -> 模拟服务器配置的覆盖项
+SCENARIOS = {
+    'clean': {},
+    'latency': {'api_latency_ms': 40, 'image_latency_ms': 80, 'jitter_ms': 20},
+    'faults': {'error_rate': 0.03, 'rate_limit_rate': 0.05},
+    # 报告末尾之后还有 20 页空白占位图
+    'placeholder': {'placeholder_pages': 20},
+}
+# 比较基线时检查的指标（数值越大越差）
+REGRESSION_METRICS = ('wall_time', 'requests', 'peak_rss_kb')
+REPORT_ID = '0123456789abcdef0123456789abcdef'
+
+
+def run_child(mode, base_url, output_dir, delay_scale):
+    """子进程：运行一次下载器并输出 JSON 结果"""
+    import resource
+    sys.path.insert(0, BACKEND_DIR)
+    from downloader import NsfcReportDownloader
+
+    downloader = NsfcReportDownloader(base_url=base_url, delay_scale=delay_scale, output_dir=output_dir)
+    start = time.perf_counter()
+    if mode == 'scan':
+        pages = downloader.scan_total_pages(REPORT_ID)
+        result = {'pages': pages}
+    else:
+        report = downloader.download_report(REPORT_ID, 'benchmark')
+        result = {
+            'pages': report.get('page_count', 0),
+            'success': report['success'],
+            'pdf_bytes': os.path.getsize(report['file_path']) if report['success'] else 0,
+        }
+    result['wall_time'] = round(time.perf_counter() - start, 3)
+    # Linux 下 ru_maxrss 单位为 KB
+    result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps(result))
+
+
+def run_scenario(name, overrides, args):
+    """运行一个场景的 scan 和 download 两个基准"""
+    config = MockConfig(pages=args.pages, image_width=args.image_width, image_height=args.image_height,
+                        seed=args.seed, **overrides)
+    server = MockNsfcServer(config).start()
+    results = []
+    try:
+        for mode in ('scan', 'download'):
+            server.reset_stats()
+            with tempfile.TemporaryDirectory() as output_dir:
+                completed = subprocess.run(
+                    [sys.executable, __file__, '--child', mode, server.base_url, output_dir, str(args.delay_scale)],
+                    capture_output=True, text=True, cwd=BACKEND_DIR
+                )
+            if completed.returncode != 0:
+                raise RuntimeError(f'{name}/{mode} 运行失败:\n{completed.stderr[-2000:]}')
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            stats = server.snapshot()
+            result.update({
+                'scenario': name,
+                'mode': mode,
+                'requests': stats['total'],
+                'faults': {key: value for key, value in stats.items() if key.startswith('faults.')},
+            })
+            results.append(result)
+    finally:
+        server.stop()
+    return results
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        mode, base_url, output_dir, delay_scale = sys.argv[2:6]
+        run_child(mode, base_url, output_dir, float(delay_scale))
+        return 0
+
+    parser = argparse.ArgumentParser(description='下载器基准测试（使用本地模拟服务器）')
+    parser.add_argument('--pages', type=int, default=40, help='每个报告的页数')
+    parser.add_argument('--image-width', type=int, default=1240)
+    parser.add_argument('--image-height', type=int, default=1754)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='只运行指定场景（可重复）')
+    parser.add_argument('--delay-scale', type=float, default=0.0, help='下载器请求间延时的缩放系数，默认 0（不等待）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    parser.add_argument('--baseline', help='用于比较的基线 JSON 文件')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的相对回退（默认 0.2 即 20%%）')
+    args = parser.parse_args()
+
+    results = []
+    for name in args.scenario or SCENARIOS:
+        results.extend(run_scenario(name, SCENARIOS[name], args))
+
+    print(f"{'场景':<12}{'模式':<10}{'耗时(s)':>10}{'请求数':>8}{'页数':>6}{'峰值RSS(MB)':>13}{'PDF(KB)':>10}")
+    for item in results:
+        print(f"{item['scenario']:<12}{item['mode']:<10}{item['wall_time']:>10.3f}{item['requests']:>8}"
+              f"{item.get('pages') or 0:>6}{item['peak_rss_kb'] / 1024:>13.1f}{item.get('pdf_bytes', 0) / 1024:>10.1f}")
+
+    if args.output:
+        write_report(args.output, build_report('downloader', vars(args), results))
+    if args.baseline:
+        return check_baseline(args.baseline, results, REGRESSION_METRICS, args.tolerance)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""启动导入耗时基准
+
+在子进程中使用 python -X importtime 导入应用模块，统计多次运行的累计导入耗时（中位数），
+列出耗时最多的模块，并检查重量级依赖没有在启动时被导入。超出预算或违反检查时以非零状态退出。
+
+用法（在 backend 目录下）：
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module routes --budget-ms 250 --runs 7
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 默认预算（毫秒）：导入 app（创建应用并注册路由）的累计耗时
+DEFAULT_BUDGET_MS = 350
+# 启动时不应导入的重量级依赖（只在用到的代码路径中延迟导入）
+LAZY_MODULES = ('fitz', 'PIL', 'requests', 'bs4', 'selenium', 'pyarrow')
+
+
+def measure(module):
+    """导入一次模块，返回 {模块名: (自身耗时us, 累计耗时us)}"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'导入 {module} 失败:\n{result.stderr[-2000:]}')
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='应用启动导入耗时基准')
+    parser.add_argument('--module', default='app', help='导入的模块（默认 app）')
+    parser.add_argument('--runs', type=int, default=5, help='运行次数，取中位数')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS, help='累计导入耗时预算（毫秒）')
+    parser.add_argument('--top', type=int, default=15, help='列出耗时最多的模块数')
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    totals = [timings[args.module][1] / 1000 for timings in runs]
+    total_ms = statistics.median(totals)
+
+    last = runs[-1]
+    print(f"{args.module}: 累计导入耗时中位数 {total_ms:.1f} ms "
+          f"(最小 {min(totals):.1f} ms，最大 {max(totals):.1f} ms，{args.runs} 次)")
+    print(f"\n自身耗时最多的 {args.top} 个模块：")
+    for name, (self_us, cumulative_us) in sorted(last.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  (累计 {cumulative_us / 1000:8.1f} ms)  {name}")
+
+    failed = False
+    eager = sorted(name for name in LAZY_MODULES if name in last)
+    if eager:
+        print(f"\n失败：启动时导入了应延迟导入的模块: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"\n失败：超出预算 {args.budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print(f"\n通过：预算 {args.budget_ms:.0f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
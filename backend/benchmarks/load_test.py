@@ -0,0 +1,472 @@
+"""混合负载 HTTP 压测
+
+按可配置的负载组合（项目列表、详情、上传、PDF 预览、缩略图、SSE 下载）并发请求应用，
+在逐级提高的并发数下统计吞吐、各端点的 p50/p95/p99 延迟和错误率，并估计吞吐饱和点。
+
+默认在临时目录中启动一套独立环境：kd.nsfc.cn 模拟服务器、填充了合成项目的数据库和应用本身
+（通过 NSFC_DATA_DIR / NSFC_BASE_URL 指向临时目录和模拟服务器，不影响项目自身的数据）。
+也可以用 --url 压测已部署的实例（上传和下载操作会写入数据）。
+
+用法（在 backend 目录下）：
+    python benchmarks/load_test.py --concurrency 1,4,16,32 --duration 20
+    python benchmarks/load_test.py --mix list=50,detail=30,preview=20 --output load.json
+    python benchmarks/load_test.py --url http://127.0.0.1:5002 --mix browse
+"""
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from results import build_report, check_baseline, write_report  # noqa: E402
+from synthetic_catalogue import UNITS  # noqa: E402
+
+# 预设的负载组合：操作 -> 权重
+MIXES = {
+    'browse': {'list': 60, 'detail': 30, 'preview': 10},
+    'mixed': {'list': 40, 'detail': 25, 'preview': 15, 'upload': 10, 'download': 5, 'thumbnail': 5},
+    'write': {'list': 30, 'upload': 50, 'download': 20},
+}
+# 比较基线时检查的指标（数值越大越差）
+REGRESSION_METRICS = ('p50_ms', 'p99_ms', 'error_rate')
+# 吞吐增长低于该比例时认为已饱和
+SATURATION_GAIN = 0.1
+# 每页条数（与前端一致）
+PER_PAGE = 20
+# 列表请求最多翻到的页码
+MAX_LIST_PAGE = 200
+# 单个请求的超时（秒）；SSE 下载使用 DOWNLOAD_TIMEOUT
+REQUEST_TIMEOUT = 30
+DOWNLOAD_TIMEOUT = 300
+
+
+def make_pdf(pages=4, seed=0, width=200, height=280):
+    """生成每页含一张随机灰度图片和页码文字的 PDF（只依赖标准库）"""
+    rng = random.Random(seed)
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for page in range(1, pages + 1):
+        image = zlib.compress(rng.randbytes(width * height), 1)
+        objects.append(b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray '
+                       b'/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream'
+                       % (width, height, len(image), image))
+        image_ref = len(objects)
+        content = b'q 500 0 0 700 50 80 cm /Im1 Do Q BT /F1 24 Tf 50 40 Td (Page %d) Tj ET' % page
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+        content_ref = len(objects)
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 600 842] /Contents %d 0 R '
+                       b'/Resources << /Font << /F1 3 0 R >> /XObject << /Im1 %d 0 R >> >> >>'
+                       % (content_ref, image_ref))
+        kids.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), pages)
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+def parse_mix(value):
+    """解析负载组合：预设名称或 list=50,detail=30 形式"""
+    if value in MIXES:
+        return dict(MIXES[value])
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'未知操作: {name}（可选 {", ".join(OPERATIONS)}）')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法百分位数"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Workload:
+    """压测目标及其共享数据（项目ID、报告ID）"""
+
+    def __init__(self, base_url, seed=0):
+        self.base_url = base_url.rstrip('/')
+        self.project_ids = []
+        self.download_ids = []
+        self.report_ids = []
+        self.total_pages = 1
+        self.pdf = make_pdf(seed=seed)
+        self._lock = threading.Lock()
+
+    def url(self, path):
+        return self.base_url + path
+
+    def discover(self, session, max_projects=2000):
+        """读取项目列表，收集用于请求的项目ID和报告ID"""
+        page = 1
+        while len(self.project_ids) < max_projects:
+            response = session.get(self.url('/api/projects'), params={
+                'page': page, 'per_page': 100, 'fields': 'id,nsfc_id,url'}, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+            if page == 1:
+                self.total_pages = max(1, -(-data['pagination']['total'] // PER_PAGE))
+            if not data['data']:
+                break
+            for project in data['data']:
+                self.project_ids.append(project['id'])
+                if project.get('nsfc_id') or 'id=' in (project.get('url') or ''):
+                    self.download_ids.append(project['id'])
+            page += 1
+        if not self.project_ids:
+            raise RuntimeError('目标实例中没有项目，无法压测')
+
+        # 只使用文件确实存在的报告
+        for project_id in self.project_ids[:50]:
+            response = session.get(self.url(f'/api/projects/{project_id}'), timeout=REQUEST_TIMEOUT)
+            if not response.ok:
+                continue
+            for report in response.json()['data'].get('reports') or []:
+                if session.head(self.url(f"/api/pdf/preview/{report['id']}"), timeout=REQUEST_TIMEOUT).ok:
+                    self.report_ids.append(report['id'])
+
+    def seed_reports(self, session, count):
+        """上传报告，供预览和缩略图请求使用"""
+        rng = random.Random(0)
+        for _ in range(count):
+            op_upload(self, session, rng)
+
+    def add_report(self, report_id):
+        with self._lock:
+            self.report_ids.append(report_id)
+
+    def random_report(self, rng):
+        with self._lock:
+            return rng.choice(self.report_ids) if self.report_ids else None
+
+
+# 各操作：返回 (是否成功, HTTP 状态码)
+def op_list(workload, session, rng):
+    params = {'page': rng.randint(1, min(workload.total_pages, MAX_LIST_PAGE)), 'per_page': PER_PAGE}
+    if rng.random() < 0.3:
+        params['unit'] = rng.choice(UNITS)
+    response = session.get(workload.url('/api/projects'), params=params, timeout=REQUEST_TIMEOUT)
+    return response.ok, response.status_code
+
+
+def op_detail(workload, session, rng):
+    project_id = rng.choice(workload.project_ids)
+    response = session.get(workload.url(f'/api/projects/{project_id}'), timeout=REQUEST_TIMEOUT)
+    return response.ok, response.status_code
+
+
+def op_upload(workload, session, rng):
+    project_id = rng.choice(workload.project_ids)
+    response = session.post(workload.url('/api/reports/upload'), data={'project_id': project_id},
+                            files={'file': ('loadtest.pdf', workload.pdf, 'application/pdf')},
+                            timeout=REQUEST_TIMEOUT)
+    if response.ok:
+        workload.add_report(response.json()['report_id'])
+    return response.ok, response.status_code
+
+
+def op_preview(workload, session, rng):
+    report_id = workload.random_report(rng)
+    if report_id is None:
+        return False, 'no-report'
+    response = session.get(workload.url(f'/api/pdf/preview/{report_id}'), timeout=REQUEST_TIMEOUT)
+    return response.ok, response.status_code
+
+
+def op_thumbnail(workload, session, rng):
+    report_id = workload.random_report(rng)
+    if report_id is None:
+        return False, 'no-report'
+    response = session.get(workload.url(f'/api/reports/{report_id}/thumbnail'), timeout=REQUEST_TIMEOUT)
+    return response.ok, response.status_code
+
+
+def op_download(workload, session, rng):
+    """SSE 下载：读取事件流直到完成或失败"""
+    if not workload.download_ids:
+        return False, 'no-project'
+    project_id = rng.choice(workload.download_ids)
+    with session.get(workload.url(f'/api/projects/{project_id}/download-report'),
+                     stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if not response.ok:
+            return False, response.status_code
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            event = json.loads(line[5:])
+            if event.get('type') == 'complete':
+                workload.add_report(event['report_id'])
+                return True, response.status_code
+            if event.get('type') == 'error':
+                return False, 'sse-error'
+    return False, 'sse-closed'
+
+
+# 操作名称 -> (统计用的端点名称, 函数)
+OPERATIONS = {
+    'list': ('GET /api/projects', op_list),
+    'detail': ('GET /api/projects/<id>', op_detail),
+    'upload': ('POST /api/reports/upload', op_upload),
+    'preview': ('GET /api/pdf/preview/<id>', op_preview),
+    'thumbnail': ('GET /api/reports/<id>/thumbnail', op_thumbnail),
+    'download': ('GET /api/projects/<id>/download-report', op_download),
+}
+
+
+def run_level(workload, mix, concurrency, duration, seed):
+    """以给定并发数运行 duration 秒，返回 [(端点, 耗时秒, 是否成功, 状态码)]"""
+    import requests
+
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = time.perf_counter() + duration
+    samples = [[] for _ in range(concurrency)]
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        session = requests.Session()
+        records = samples[index]
+        while time.perf_counter() < deadline:
+            endpoint, operation = OPERATIONS[rng.choices(names, weights)[0]]
+            start = time.perf_counter()
+            try:
+                ok, status = operation(workload, session, rng)
+            except requests.RequestException as e:
+                ok, status = False, type(e).__name__
+            records.append((endpoint, time.perf_counter() - start, ok, status))
+        session.close()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return [record for records in samples for record in records], elapsed
+
+
+def summarize_level(concurrency, records, elapsed):
+    """统计一个并发等级：总计和各端点的吞吐、延迟百分位和错误率"""
+    groups = defaultdict(list)
+    for record in records:
+        groups[record[0]].append(record)
+    groups['total'] = records
+
+    results = []
+    for endpoint, items in groups.items():
+        latencies = sorted(item[1] * 1000 for item in items)
+        errors = [item for item in items if not item[2]]
+        statuses = defaultdict(int)
+        for item in errors:
+            statuses[str(item[3])] += 1
+        results.append({
+            'scenario': f'c{concurrency}',
+            'mode': endpoint,
+            'concurrency': concurrency,
+            'requests': len(items),
+            'throughput': round(len(items) / elapsed, 2) if elapsed else 0,
+            'p50_ms': round(percentile(latencies, 0.50) or 0, 2),
+            'p95_ms': round(percentile(latencies, 0.95) or 0, 2),
+            'p99_ms': round(percentile(latencies, 0.99) or 0, 2),
+            'max_ms': round(latencies[-1], 2) if latencies else 0,
+            'error_rate': round(len(errors) / len(items), 4) if items else 0,
+            'errors': dict(statuses),
+        })
+    results.sort(key=lambda item: (item['mode'] != 'total', item['mode']))
+    return results
+
+
+def find_saturation(totals):
+    """返回吞吐增长低于 SATURATION_GAIN 的第一个并发等级（未饱和时为None）"""
+    for previous, current in zip(totals, totals[1:]):
+        if current['throughput'] < previous['throughput'] * (1 + SATURATION_GAIN):
+            return previous, current
+    return None
+
+
+def print_level(results):
+    print(f"\n并发 {results[0]['concurrency']}")
+    print(f"  {'端点':<42}{'请求数':>8}{'吞吐/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'错误率':>8}")
+    for item in results:
+        print(f"  {item['mode']:<44}{item['requests']:>8}{item['throughput']:>9.1f}{item['p50_ms']:>9.1f}"
+              f"{item['p95_ms']:>9.1f}{item['p99_ms']:>9.1f}{item['error_rate'] * 100:>7.1f}%")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url, timeout=60, process=None):
+    """等待服务可以响应请求"""
+    import requests
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'服务进程已退出: {url}')
+        try:
+            requests.get(url, timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f'等待服务启动超时: {url}')
+
+
+def serve_app(workdir, port, projects, seed):
+    """子进程：在 workdir 中准备数据库并启动应用（多线程 WSGI 服务器）"""
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    import models
+    from synthetic_catalogue import populate
+
+    database = os.path.join(workdir, models.DATABASE)
+    if not os.path.exists(database):
+        populate(database, projects, seed)
+    models.DATABASE = database
+    models.init_db()
+
+    from werkzeug.serving import make_server
+    from app import app
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+class LocalEnvironment:
+    """临时目录中的模拟服务器和应用进程"""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = args.workdir or tempfile.mkdtemp(prefix='nsfc-load-')
+        os.makedirs(self.workdir, exist_ok=True)
+        self.processes = []
+        self.log = None
+
+    def start(self):
+        args = self.args
+        self.log = open(os.path.join(self.workdir, 'services.log'), 'ab')
+        mock_port, app_port = free_port(), free_port()
+        self._spawn([os.path.join(BENCH_DIR, 'mock_nsfc_server.py'), '--port', str(mock_port),
+                     '--pages', str(args.mock_pages), '--api-latency-ms', str(args.mock_latency_ms),
+                     '--image-latency-ms', str(args.mock_latency_ms), '--image-width', '600', '--image-height', '850'])
+        wait_ready(f'http://127.0.0.1:{mock_port}/__stats', process=self.processes[-1])
+
+        env = dict(os.environ, NSFC_DATA_DIR=self.workdir, NSFC_BASE_URL=f'http://127.0.0.1:{mock_port}',
+                   NSFC_DELAY_SCALE=str(args.delay_scale))
+        self._spawn([__file__, '--serve', self.workdir, str(app_port), str(args.projects), str(args.seed)], env)
+        url = f'http://127.0.0.1:{app_port}'
+        print(f'准备环境: {self.workdir}（{args.projects} 个合成项目）')
+        wait_ready(url + '/api/health', timeout=600, process=self.processes[-1])
+        return url
+
+    def _spawn(self, command, env=None):
+        self.processes.append(subprocess.Popen([sys.executable] + command, cwd=BACKEND_DIR, env=env,
+                                               stdout=self.log, stderr=subprocess.STDOUT))
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self.log:
+            self.log.close()
+        if not self.args.workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        workdir, port, projects, seed = sys.argv[2:6]
+        serve_app(workdir, int(port), int(projects), int(seed))
+        return 0
+
+    parser = argparse.ArgumentParser(description='混合负载 HTTP 压测')
+    parser.add_argument('--url', help='压测已部署的实例；不指定时启动临时的本地环境')
+    parser.add_argument('--mix', type=parse_mix, default='mixed',
+                        help=f'负载组合：预设（{", ".join(MIXES)}）或 list=50,detail=30 形式')
+    parser.add_argument('--concurrency', default='1,4,16,32', help='逐级运行的并发数，逗号分隔')
+    parser.add_argument('--duration', type=float, default=15, help='每个并发等级的运行时间（秒）')
+    parser.add_argument('--seed-reports', type=int, default=20, help='压测前上传的报告数（供预览和缩略图使用）')
+    parser.add_argument('--projects', type=int, default=20000, help='本地环境的合成项目数')
+    parser.add_argument('--workdir', help='本地环境的目录（指定时保留，可重复使用已生成的数据库）')
+    parser.add_argument('--mock-pages', type=int, default=5, help='模拟服务器每个报告的页数')
+    parser.add_argument('--mock-latency-ms', type=float, default=20, help='模拟服务器的接口和图片延迟')
+    parser.add_argument('--delay-scale', type=float, default=0.0, help='本地环境下载器延时的缩放系数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    parser.add_argument('--baseline', help='用于比较的基线 JSON 文件')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的相对回退（默认 0.2 即 20%%）')
+    args = parser.parse_args()
+
+    import requests
+
+    environment = None if args.url else LocalEnvironment(args)
+    try:
+        url = args.url or environment.start()
+        workload = Workload(url, args.seed)
+        with requests.Session() as session:
+            workload.discover(session)
+            if {'preview', 'thumbnail'} & set(args.mix) and len(workload.report_ids) < args.seed_reports:
+                workload.seed_reports(session, args.seed_reports - len(workload.report_ids))
+        print(f"目标 {url}：{len(workload.project_ids)} 个项目，{len(workload.report_ids)} 个报告；负载组合 {args.mix}")
+
+        results, totals = [], []
+        for concurrency in (int(value) for value in args.concurrency.split(',')):
+            records, elapsed = run_level(workload, args.mix, concurrency, args.duration, args.seed)
+            level = summarize_level(concurrency, records, elapsed)
+            print_level(level)
+            results.extend(level)
+            totals.append(level[0])
+    finally:
+        if environment:
+            environment.stop()
+
+    saturation = find_saturation(totals)
+    if saturation:
+        previous, current = saturation
+        print(f"\n吞吐在并发 {previous['concurrency']} 左右饱和：并发 {current['concurrency']} 时吞吐 "
+              f"{previous['throughput']:.1f} -> {current['throughput']:.1f}/s，p99 {previous['p99_ms']:.0f} -> "
+              f"{current['p99_ms']:.0f} ms")
+    else:
+        print('\n在测试的并发范围内吞吐仍在增长，未达到饱和')
+
+    if args.output:
+        config = dict(vars(args), saturation_concurrency=saturation[0]['concurrency'] if saturation else None)
+        write_report(args.output, build_report('load', config, results))
+    if args.baseline:
+        return check_baseline(args.baseline, results, REGRESSION_METRICS, args.tolerance)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""kd.nsfc.cn 的本地模拟服务器
+
+实现下载器用到的接口：首页、conclusionProjectInfo、completeProjectReport 和报告页面图片，
+可配置页数、末尾占位页、延迟、错误和 429 注入以及图片尺寸，用于离线测试和下载器基准测试。
+只依赖标准库，图片为使用 zlib 生成的灰度 PNG。
+
+用法（在 backend 目录下）：
+    python benchmarks/mock_nsfc_server.py --port 8765 --pages 40 --api-latency-ms 50 --rate-limit-rate 0.05
+    NSFC_BASE_URL=http://127.0.0.1:8765 python app.py
+
+管理接口：GET /__stats 返回请求计数，POST /__reset 清零计数。
+"""
+import argparse
+import json
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass, asdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+_IMAGE_PATH = re.compile(r'^/report/([\w-]+)/(\d+)\.png$')
+_INFO_PATH = re.compile(r'^/api/baseQuery/conclusionProjectInfo/([\w-]+)$')
+
+
+@dataclass
+class MockConfig:
+    """模拟服务器配置"""
+    pages: int = 30                 # 每个报告的页数
+    placeholder_pages: int = 0      # 报告最后一页之后仍返回地址、图片为空白占位图的页数
+    api_latency_ms: float = 0       # 接口平均延迟
+    image_latency_ms: float = 0     # 图片平均延迟
+    jitter_ms: float = 0            # 延迟的随机抖动（±）
+    error_rate: float = 0           # 返回 500 的概率
+    rate_limit_rate: float = 0      # 返回 429 的概率
+    retry_after: int = 0            # 429 响应的 Retry-After（秒）
+    image_width: int = 1240
+    image_height: int = 1754
+    noise: float = 0.2              # 图片中随机噪声行的比例（影响压缩后的大小）
+    seed: int = 0
+
+
+def make_png(width, height, seed=0, noise=0.2):
+    """生成灰度 PNG：渐变背景加随机噪声行"""
+    rng = random.Random(seed)
+    gradient = bytes((x * 255 // max(width - 1, 1)) for x in range(width))
+    rows = []
+    for _ in range(height):
+        pixels = rng.randbytes(width) if rng.random() < noise else gradient
+        rows.append(b'\x00' + pixels)
+    return _encode_png(width, height, b''.join(rows))
+
+
+def make_blank_png(width, height):
+    """生成纯白灰度 PNG（报告末尾之后的占位图）"""
+    return _encode_png(width, height, (b'\x00' + b'\xff' * width) * height)
+
+
+def _encode_png(width, height, raw):
+    """把带行过滤字节的 8 位灰度像素数据编码为 PNG"""
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw, 6)) + chunk(b'IEND', b'')
+
+
+class MockNsfcServer:
+    """在后台线程中运行的模拟服务器"""
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or MockConfig()
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+        self._images = {}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='mock-nsfc', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {}
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['total'] = sum(value for key, value in stats.items() if key.startswith('requests.'))
+        return stats
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _image(self, page):
+        """按页缓存生成的图片（不同页使用不同噪声）"""
+        key = page % 8
+        image = self._images.get(key)
+        if image is None:
+            config = self.config
+            image = make_png(config.image_width, config.image_height, config.seed + key, config.noise)
+            self._images[key] = image
+        return image
+
+    def _placeholder(self):
+        """空白占位图（所有占位页相同）"""
+        image = self._images.get('placeholder')
+        if image is None:
+            image = make_blank_png(self.config.image_width, self.config.image_height)
+            self._images['placeholder'] = image
+        return image
+
+    def _fault(self):
+        """按配置随机返回 429 或 500，返回状态码或None"""
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.config.rate_limit_rate:
+            return 429
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            return 500
+        return None
+
+    def _delay(self, latency_ms):
+        jitter = self.config.jitter_ms
+        if jitter:
+            with self._lock:
+                latency_ms += self._rng.uniform(-jitter, jitter)
+        if latency_ms > 0:
+            time.sleep(latency_ms / 1000)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body=b'', content_type='application/json', headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            def _send_json(self, data, status=200):
+                self._send(status, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+            def _inject_fault(self):
+                status = server._fault()
+                if status is None:
+                    return False
+                server._count(f'faults.{status}')
+                headers = {'Retry-After': str(server.config.retry_after)} if status == 429 else None
+                self._send(status, b'{}', headers=headers)
+                return True
+
+            def _read_form(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode('utf-8') if length else ''
+                return {key: values[0] for key, values in parse_qs(body).items()}
+
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/__stats':
+                    return self._send_json(server.snapshot())
+
+                match = _IMAGE_PATH.match(path)
+                if match:
+                    server._count('requests.image')
+                    server._delay(server.config.image_latency_ms)
+                    if self._inject_fault():
+                        return
+                    page = int(match.group(2))
+                    config = server.config
+                    if not 1 <= page <= config.pages + config.placeholder_pages:
+                        return self._send(404, b'', 'text/plain')
+                    image = server._image(page) if page <= config.pages else server._placeholder()
+                    return self._send(200, image, 'image/png')
+
+                if path == '/':
+                    server._count('requests.home')
+                    return self._send(200, b'<html><body>mock kd.nsfc.cn</body></html>', 'text/html',
+                                      {'Set-Cookie': 'JSESSIONID=mock; Path=/'})
+
+                self._send(404, b'', 'text/plain')
+
+            def do_HEAD(self):
+                self.do_GET()
+
+            def do_POST(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/__reset':
+                    server.reset_stats()
+                    return self._send_json({'success': True})
+
+                if path == '/api/baseQuery/completeProjectReport':
+                    server._count('requests.api')
+                    form = self._read_form()
+                    server._delay(server.config.api_latency_ms)
+                    if self._inject_fault():
+                        return
+                    try:
+                        index = int(form.get('index', 0))
+                    except ValueError:
+                        index = 0
+                    report_id = form.get('id', 'unknown')
+                    if 1 <= index <= server.config.pages + server.config.placeholder_pages:
+                        data = {'url': f'/report/{report_id}/{index}.png'}
+                    else:
+                        data = None
+                    return self._send_json({'code': 200, 'message': 'success', 'data': data})
+
+                match = _INFO_PATH.match(path)
+                if match:
+                    server._count('requests.info')
+                    self._read_form()
+                    server._delay(server.config.api_latency_ms)
+                    return self._send_json({'code': 200, 'data': {'projectName': f'模拟项目_{match.group(1)[:8]}'}})
+
+                self._send(404, b'', 'text/plain')
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='kd.nsfc.cn 本地模拟服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    for name, value in asdict(MockConfig()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    config = MockConfig(**{name: getattr(args, name) for name in asdict(MockConfig())})
+    server = MockNsfcServer(config, args.host, args.port)
+    print(f'模拟服务器已启动: {server.base_url} ({config})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""基准测试结果的保存与基线比较
+
+各基准脚本输出相同结构的 JSON：
+    {"benchmark": 名称, "created_at": ..., "python": ..., "config": {...}, "results": [...]}
+results 中的每一项以 (scenario, mode) 标识，其余为数值指标，便于不同版本之间比较。
+"""
+import json
+import sys
+import time
+
+
+def build_report(benchmark, config, results):
+    """组装结果报告"""
+    return {
+        'benchmark': benchmark,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'config': config,
+        'results': results,
+    }
+
+
+def write_report(path, report):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def compare(results, baseline, metrics, tolerance):
+    """与基线比较，返回回退描述列表
+
+    Args:
+        metrics: 参与比较的指标（数值越大越差）
+        tolerance: 允许的相对增长，如 0.2 表示 20%
+    """
+    previous = {(item['scenario'], item['mode']): item for item in baseline['results']}
+    regressions = []
+    for item in results:
+        base = previous.get((item['scenario'], item['mode']))
+        if not base:
+            continue
+        for metric in metrics:
+            old, new = base.get(metric), item.get(metric)
+            if old and new and new > old * (1 + tolerance):
+                regressions.append(f"{item['scenario']}/{item['mode']} {metric}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def check_baseline(path, results, metrics, tolerance):
+    """读取基线文件并输出比较结果，有回退时返回 1，否则返回 0"""
+    with open(path, encoding='utf-8') as f:
+        regressions = compare(results, json.load(f), metrics, tolerance)
+    if regressions:
+        print('\n性能回退：')
+        for line in regressions:
+            print(f'  {line}')
+        return 1
+    print(f'\n与基线相比无超过 {tolerance * 100:.0f}% 的回退')
+    return 0
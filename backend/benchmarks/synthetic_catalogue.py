@@ -0,0 +1,257 @@
+"""合成项目目录生成器
+
+按给定数量生成仿真的项目记录（中文题目、摘要、依托单位、申请代码、负责人、批准号、经费和起止日期），
+通过 models.upsert_projects_batch 写入数据库（与批量导入走相同的代码路径，统计表由触发器维护），
+并为一部分项目生成结题报告记录（只写数据库，不生成 PDF 文件）。相同的种子生成相同的数据。
+
+用法（在 backend 目录下）：
+    python benchmarks/synthetic_catalogue.py --count 100000 --db bench-100k.db
+    python benchmarks/synthetic_catalogue.py --count 10000 --ndjson projects.ndjson   # 只生成导入文件
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# 每个事务写入的项目数
+GENERATE_BATCH_SIZE = 5000
+# 有结题报告记录的项目比例
+REPORT_RATIO = 0.3
+# 有结题摘要的项目比例
+CONCLUSION_RATIO = 0.6
+
+# 科学部：(批准号首位, 申请代码字母, 学科方向, 研究对象)
+DEPARTMENTS = (
+    ('1', 'A', ('数学', '力学', '天文学', '物理学'),
+     ('非线性偏微分方程', '量子多体系统', '湍流边界层', '引力波信号', '拓扑绝缘体', '随机动力系统')),
+    ('2', 'B', ('无机化学', '有机化学', '物理化学', '高分子科学'),
+     ('金属有机框架', '不对称催化反应', '二维材料界面', '可降解高分子', '单原子催化剂', '电化学储能体系')),
+    ('3', 'C', ('微生物学', '植物学', '遗传学', '神经科学'),
+     ('水稻抗逆基因', '肠道菌群', '线粒体自噬', '突触可塑性', '干细胞命运决定', '病毒宿主互作')),
+    ('4', 'D', ('地理学', '地质学', '大气科学', '海洋科学'),
+     ('青藏高原隆升', '季风降水变率', '黄河流域生态', '深海沉积物', '城市热岛', '地下水污染')),
+    ('5', 'E', ('金属材料', '机械工程', '土木工程', '能源与动力'),
+     ('高熵合金', '复合材料损伤', '超高性能混凝土', '氢燃料电池', '增材制造构件', '桥梁健康监测')),
+    ('6', 'F', ('计算机科学', '人工智能', '电子学', '自动化'),
+     ('大语言模型', '图神经网络', '边缘计算系统', '类脑芯片', '多智能体协同控制', '隐私保护机器学习')),
+    ('7', 'G', ('管理科学', '工商管理', '经济科学', '宏观管理与政策'),
+     ('数字经济平台', '供应链韧性', '公共卫生应急管理', '绿色金融', '区域创新网络', '碳交易市场')),
+    ('8', 'H', ('肿瘤学', '心血管系统', '神经精神疾病', '免疫学'),
+     ('肝细胞癌', '动脉粥样硬化', '阿尔茨海默病', '自身免疫性疾病', '脓毒症', '肿瘤免疫微环境')),
+)
+
+METHODS = ('机制研究', '关键技术研究', '理论与方法', '调控机制及应用', '多尺度建模与分析', '演化规律研究', '设计与优化')
+QUALIFIERS = ('基于深度学习的', '面向复杂环境的', '', '', '高通量', '多模态', '新型', '跨尺度')
+
+UNITS = (
+    '清华大学', '北京大学', '浙江大学', '复旦大学', '上海交通大学', '南京大学', '中国科学技术大学',
+    '武汉大学', '华中科技大学', '中山大学', '四川大学', '西安交通大学', '哈尔滨工业大学', '山东大学',
+    '吉林大学', '厦门大学', '同济大学', '东南大学', '天津大学', '南开大学', '湖南大学', '重庆大学',
+    '兰州大学', '大连理工大学', '北京航空航天大学', '中国科学院物理研究所', '中国科学院化学研究所',
+    '中国科学院地理科学与资源研究所', '中国医学科学院北京协和医院', '郑州大学', '苏州大学', '深圳大学',
+)
+
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢'
+GIVEN_CHARS = '伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉萍红建文辉力鹏飞志宏雪梅晨宇浩然子轩欣怡思远博文'
+
+# 项目类型：(批准号第二位, 资助经费范围（万元）, 执行年数, 权重)
+PROJECT_TYPES = (
+    ('1', (20, 30), 3, 0.45),    # 青年科学基金
+    ('7', (45, 80), 4, 0.45),    # 面上项目
+    ('3', (200, 350), 5, 0.10),  # 重点项目
+)
+
+ABSTRACT_SENTENCES = (
+    '{topic}是{field}领域的重要科学问题，对国家重大需求具有重要意义。',
+    '现有研究对{topic}的{aspect}认识仍不充分，制约了相关理论与技术的发展。',
+    '本项目拟综合运用实验观测、理论分析与数值模拟等手段，系统研究{topic}的{aspect}。',
+    '重点解决{aspect}表征困难、关键参数难以获取等问题，建立{topic}的定量描述模型。',
+    '项目将构建覆盖多种条件的数据集，发展高效可靠的分析方法，并开展验证与应用示范。',
+    '预期成果将深化对{topic}{aspect}的理解，为{field}的学科发展提供新思路。',
+)
+CONCLUSION_SENTENCES = (
+    '项目按计划完成了研究任务，揭示了{topic}的{aspect}。',
+    '发表学术论文{papers}篇，其中SCI收录{sci}篇，申请发明专利{patents}项。',
+    '培养博士研究生{phd}名、硕士研究生{master}名，项目负责人入选省部级人才计划。',
+    '相关成果在{field}领域得到应用，为后续研究奠定了坚实基础。',
+)
+ASPECTS = ('形成机制', '演化规律', '调控网络', '结构与性能关系', '动力学特征', '关键影响因素')
+
+
+def _weighted_type(rng):
+    roll = rng.random()
+    for project_type in PROJECT_TYPES:
+        roll -= project_type[3]
+        if roll < 0:
+            return project_type
+    return PROJECT_TYPES[-1]
+
+
+def generate_projects(count, seed=0, serial_start=0):
+    """生成 count 个项目信息字典（字段与导入格式一致）
+
+    Args:
+        serial_start: 批准号序号的起始值，向已有目录追加项目时用于避免批准号重复
+    """
+    rng = random.Random(seed)
+    serials = {}
+    for _ in range(count):
+        digit, letter, fields, topics = rng.choice(DEPARTMENTS)
+        field_index = rng.randrange(len(fields))
+        field, topic = fields[field_index], rng.choice(topics)
+        type_digit, (funding_low, funding_high), years, _ = _weighted_type(rng)
+        start_year = rng.randint(2005, 2022)
+        end_year = start_year + years - 1
+
+        # 批准号：科学部 + 项目类型 + 年份后两位 + 序号，同一前缀内递增保证唯一
+        prefix = f'{digit}{type_digit}{start_year % 100:02d}'
+        serials[prefix] = serial = serials.get(prefix, serial_start) + 1
+        nsfc_id = f'{rng.getrandbits(128):032x}'
+
+        aspect = rng.choice(ASPECTS)
+        values = {'topic': topic, 'field': field, 'aspect': aspect}
+        abstract = ''.join(sentence.format(**values) for sentence in ABSTRACT_SENTENCES
+                           if rng.random() < 0.85)
+        conclusion_abstract = None
+        if end_year < 2024 and rng.random() < CONCLUSION_RATIO:
+            values.update(papers=rng.randint(3, 30), sci=rng.randint(1, 20), patents=rng.randint(0, 8),
+                          phd=rng.randint(0, 6), master=rng.randint(1, 10))
+            conclusion_abstract = ''.join(sentence.format(**values) for sentence in CONCLUSION_SENTENCES)
+
+        yield {
+            'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'nsfc_id': nsfc_id,
+            'title': f'{rng.choice(QUALIFIERS)}{topic}{rng.choice(METHODS)}',
+            'approval_number': f'{prefix}{serial:04d}',
+            'application_code': f'{letter}{field_index + 1:02d}{rng.randint(1, 12):02d}',
+            'leader': rng.choice(SURNAMES) + ''.join(rng.choice(GIVEN_CHARS) for _ in range(rng.randint(1, 2))),
+            'unit': rng.choice(UNITS),
+            'start_date': f'{start_year}-01-01',
+            'end_date': f'{end_year}-12-31',
+            'funding': float(rng.randint(funding_low, funding_high)),
+            'abstract': abstract,
+            'conclusion_abstract': conclusion_abstract,
+            'url': f'https://kd.nsfc.cn/finalDetails?id={nsfc_id}',
+        }
+
+
+def write_ndjson(projects, stream):
+    """将项目写为 NDJSON（可用于 importer 导入）"""
+    for project in projects:
+        stream.write(json.dumps(project, ensure_ascii=False))
+        stream.write('\n')
+
+
+def _insert_reports(projects, rng):
+    """为部分项目写入结题报告记录（文件不存在，只用于查询基准）"""
+    import models
+
+    rows = []
+    for project in projects:
+        if rng.random() < REPORT_RATIO:
+            filename = f"{project['approval_number']}.pdf"
+            rows.append((str(uuid.UUID(int=rng.getrandbits(128), version=4)), project['id'], filename,
+                         os.path.join('uploads', 'synthetic', filename), rng.randint(2, 40) * 1024 * 1024))
+    conn = models.get_db_connection()
+    try:
+        conn.executemany(
+            'INSERT INTO reports (id, project_id, filename, file_path, file_size) VALUES (?, ?, ?, ?, ?)', rows)
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def populate(database, count, seed=0, batch_size=GENERATE_BATCH_SIZE, progress=None):
+    """向空数据库写入 count 个合成项目
+
+    Returns:
+        dict: {'projects', 'reports', 'seconds', 'rows_per_sec'}
+    """
+    import models
+
+    models.DATABASE = database
+    models.init_db()
+    conn = sqlite3.connect(database)
+    existing = conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+    conn.close()
+    if existing:
+        raise ValueError(f'数据库 {database} 中已有 {existing} 个项目，请使用新的数据库文件')
+
+    rng = random.Random(seed + 1)
+    inserted = reports = 0
+    start = time.perf_counter()
+    batch = []
+
+    def flush():
+        nonlocal inserted, reports
+        added, _, errors = models.upsert_projects_batch(list(enumerate(batch, inserted + 1)))
+        if errors:
+            raise RuntimeError(f'写入合成项目失败: {errors[:3]}')
+        reports += _insert_reports(batch, rng)
+        inserted += added
+        if progress:
+            progress(inserted, count)
+
+    for project in generate_projects(count, seed):
+        batch.append(project)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+
+    seconds = time.perf_counter() - start
+    return {
+        'projects': inserted,
+        'reports': reports,
+        'seconds': round(seconds, 2),
+        'rows_per_sec': round(inserted / seconds) if seconds else 0,
+    }
+
+
+def parse_count(value):
+    """解析 10k、1m 这样的数量"""
+    value = value.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成项目目录')
+    parser.add_argument('--count', type=parse_count, default=10000, help='项目数，可写作 10k、1m')
+    parser.add_argument('--db', default='nsfc.db', help='写入的数据库文件（须不含项目）')
+    parser.add_argument('--ndjson', help='只生成 NDJSON 导入文件，不写数据库')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=GENERATE_BATCH_SIZE, help='每个事务写入的项目数')
+    args = parser.parse_args()
+
+    if args.ndjson:
+        with io.open(args.ndjson, 'w', encoding='utf-8') as f:
+            write_ndjson(generate_projects(args.count, args.seed), f)
+        print(f'已生成 {args.count} 个项目: {args.ndjson}')
+        return 0
+
+    def progress(done, total):
+        print(f'\r已写入 {done}/{total}', end='', flush=True)
+
+    try:
+        summary = populate(args.db, args.count, args.seed, args.batch_size, progress)
+    except ValueError as e:
+        print(str(e))
+        return 1
+    print(f"\n完成：{summary['projects']} 个项目，{summary['reports']} 条报告记录，"
+          f"耗时 {summary['seconds']} 秒（{summary['rows_per_sec']} 行/秒）")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""查询结果缓存
+
+进程内 LRU 缓存，条目同时受数量和存活时间限制。写操作通过递增代数（generation）
+使所有已缓存结果失效；多进程部署时其他进程的写入只能依靠 TTL 过期感知。
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+# 缓存条目上限
+QUERY_CACHE_SIZE = 512
+# 缓存条目存活时间（秒）
+QUERY_CACHE_TTL = 30.0
+
+
+def _freeze(value):
+    """将参数转换为可哈希的缓存键"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class QueryCache:
+    """带代数失效的 LRU 查询结果缓存
+
+    缓存的结果对象由所有调用方共享，调用方不应修改返回值。
+    """
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """读取缓存，返回 (是否命中, 值)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                generation, expires_at, value = entry
+                if generation == self.generation and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, generation):
+        """写入缓存；generation 为查询开始前的代数，查询期间发生写入时不缓存"""
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """使所有缓存结果失效"""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self):
+        """命中率等统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'generation': self.generation,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def cached(self, func):
+        """装饰器：按函数名和参数缓存查询结果"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__name__, _freeze(args), _freeze(kwargs))
+            hit, value = self.get(key)
+            if hit:
+                return value
+            generation = self.generation
+            value = func(*args, **kwargs)
+            self.set(key, value, generation)
+            return value
+        return wrapper
+
+
+query_cache = QueryCache()
@@ -0,0 +1,201 @@
+"""可续传的分块上传
+
+上传会话保存在 uploads/.partial/ 中（数据文件 + JSON 元数据），客户端按偏移量依次 PUT 分块，
+断线后查询当前偏移量继续上传，最后调用完成接口校验并生成报告记录。
+分块直接写入临时文件，SHA-256 在写入过程中同步计算，完成时无需再次读取整个文件。
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from fileutils import copy_stream, looks_like_pdf, atomic_write
+
+logger = logging.getLogger(__name__)
+
+# 临时文件目录（位于上传目录下）
+PARTIAL_DIR = '.partial'
+# 单个上传的大小上限（字节）
+MAX_UPLOAD_SIZE = 4 * 1024 * 1024 * 1024
+# 建议的分块大小（字节）
+CHUNK_SIZE = 8 * 1024 * 1024
+# 未完成上传的保留时间（秒）
+PARTIAL_UPLOAD_TTL = 24 * 3600
+
+
+class UploadError(Exception):
+    """上传请求错误，status 为对应的 HTTP 状态码"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class ChunkedUploadStore:
+    """分块上传会话的存储"""
+
+    def __init__(self):
+        self.root = None
+        # 上传ID -> (已写入字节数, 哈希对象)，用于续传时增量计算哈希
+        self._digests = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def configure(self, upload_folder):
+        """设置上传目录"""
+        self.root = os.path.join(upload_folder, PARTIAL_DIR)
+        os.makedirs(self.root, exist_ok=True)
+
+    def create(self, project_id, filename, size=None):
+        """创建上传会话，返回上传ID"""
+        if size is not None and not 0 < size <= MAX_UPLOAD_SIZE:
+            raise UploadError(f'文件大小超出限制（最大 {MAX_UPLOAD_SIZE // 1024 // 1024} MB）', 413)
+
+        upload_id = uuid.uuid4().hex
+        meta = {'project_id': project_id, 'filename': filename, 'size': size, 'created_at': time.time()}
+        open(self._part_path(upload_id), 'wb').close()
+        atomic_write(self._meta_path(upload_id), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        with self._lock:
+            self._digests[upload_id] = (0, hashlib.sha256())
+        return upload_id
+
+    def get(self, upload_id):
+        """获取上传会话信息（含当前偏移量），不存在时返回None"""
+        if not self._valid_id(upload_id):
+            return None
+        try:
+            with open(self._meta_path(upload_id), encoding='utf-8') as f:
+                meta = json.load(f)
+            meta['offset'] = os.path.getsize(self._part_path(upload_id))
+        except (OSError, ValueError):
+            return None
+        meta['upload_id'] = upload_id
+        return meta
+
+    def append(self, upload_id, offset, stream):
+        """从 offset 处写入一个分块，返回写入后的偏移量"""
+        with self._upload_lock(upload_id):
+            meta = self.get(upload_id)
+            if meta is None:
+                raise UploadError('上传不存在或已过期', 404)
+            if offset != meta['offset']:
+                raise UploadError(f"偏移量不匹配，当前偏移量为 {meta['offset']}", 409, meta['offset'])
+
+            digest = self._digest(upload_id, offset)
+            part_path = self._part_path(upload_id)
+            with open(part_path, 'r+b') as f:
+                f.seek(offset)
+                head = stream.read(5) if offset == 0 else b''
+                if offset == 0 and head and not b'%PDF-'.startswith(head):
+                    raise UploadError('只支持PDF格式文件')
+                f.write(head)
+                digest.update(head)
+                written = len(head) + copy_stream(stream, f, digest)
+
+            new_offset = offset + written
+            if new_offset > MAX_UPLOAD_SIZE or (meta['size'] and new_offset > meta['size']):
+                with open(part_path, 'r+b') as f:
+                    f.truncate(offset)
+                self._forget_digest(upload_id)
+                raise UploadError('写入的数据超过声明的文件大小', 413, offset)
+
+            with self._lock:
+                self._digests[upload_id] = (new_offset, digest)
+            return new_offset
+
+    def finish(self, upload_id):
+        """校验上传完整性
+
+        Returns:
+            tuple: (会话信息, 临时文件路径, SHA-256)
+        """
+        with self._upload_lock(upload_id):
+            meta = self.get(upload_id)
+            if meta is None:
+                raise UploadError('上传不存在或已过期', 404)
+            if meta['size'] and meta['offset'] != meta['size']:
+                raise UploadError(f"上传未完成（{meta['offset']}/{meta['size']} 字节）", 409, meta['offset'])
+
+            part_path = self._part_path(upload_id)
+            if meta['offset'] == 0 or not looks_like_pdf(part_path):
+                raise UploadError('文件不是有效的PDF')
+
+            digest = self._digest(upload_id, meta['offset'])
+            return meta, part_path, digest.hexdigest()
+
+    def discard(self, upload_id):
+        """删除上传会话及其临时文件"""
+        if not self._valid_id(upload_id):
+            return
+        self._forget_digest(upload_id)
+        with self._lock:
+            self._locks.pop(upload_id, None)
+        for path in (self._part_path(upload_id), self._meta_path(upload_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def cleanup_stale(self, max_age=PARTIAL_UPLOAD_TTL):
+        """删除超过保留时间未完成的上传
+
+        以上传的数据文件和元数据中较新的修改时间计算（元数据只在创建时写入，数据文件随每个分块更新），
+        仍在传输的上传不会被清理。
+        """
+        if not self.root or not os.path.isdir(self.root):
+            return
+        cutoff = time.time() - max_age
+        last_modified = {}
+        for name in os.listdir(self.root):
+            upload_id = name.split('.', 1)[0]
+            try:
+                mtime = os.path.getmtime(os.path.join(self.root, name))
+            except OSError:
+                continue
+            last_modified[upload_id] = max(mtime, last_modified.get(upload_id, 0))
+        for upload_id, mtime in last_modified.items():
+            if mtime < cutoff:
+                self.discard(upload_id)
+                logger.info(f"已清理过期的未完成上传: {upload_id}")
+
+    def _digest(self, upload_id, offset):
+        """获取与 offset 对应的哈希状态；进程重启等情况下从临时文件重新计算"""
+        with self._lock:
+            state = self._digests.get(upload_id)
+        if state is not None and state[0] == offset:
+            return state[1]
+
+        digest = hashlib.sha256()
+        with open(self._part_path(upload_id), 'rb') as f:
+            remaining = offset
+            while remaining > 0:
+                chunk = f.read(min(1024 * 1024, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+        return digest
+
+    def _forget_digest(self, upload_id):
+        with self._lock:
+            self._digests.pop(upload_id, None)
+
+    def _upload_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _valid_id(self, upload_id):
+        return len(upload_id) == 32 and all(c in '0123456789abcdef' for c in upload_id)
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.root, f'{upload_id}.part')
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.root, f'{upload_id}.json')
+
+
+chunked_uploads = ChunkedUploadStore()
@@ -1,22 +1,81 @@
 """国自然结题报告下载器"""
-import requests
+import os
 import time
-import random
 import re
 import logging
 from io import BytesIO
-from PIL import Image
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+
+from metrics import (
+    DOWNLOADER_API_SECONDS, DOWNLOADER_IMAGE_SECONDS, DOWNLOADER_HTTP_RETRIES, DOWNLOADER_HTTP_429,
+    DOWNLOADER_DROPPED_PAGES, DOWNLOADER_PAGE_RETRIES, PDF_ASSEMBLY_SECONDS, PAGE_BUFFER_BYTES,
+    PAGE_BUFFER_PEAK_BYTES
+)
+from page_filter import PageFilter, is_placeholder_size
+from politeness import parse_retry_after, politeness
+from tracing import NULL_TRACE, log_page
 
 logger = logging.getLogger(__name__)
 
+# 丢弃页面的类型名称（用于日志和进度消息）
+DROPPED_PAGE_NAMES = {
+    PageFilter.BLANK: '空白页',
+    PageFilter.DUPLICATE: '重复页',
+    PageFilter.PLACEHOLDER: '占位图',
+}
+
+
+class DownloadCancelled(Exception):
+    """下载被取消"""
+
+
+# 报告站点地址（测试或基准测试时可指向本地模拟服务器）
+NSFC_BASE_URL = os.environ.get('NSFC_BASE_URL', 'https://kd.nsfc.cn')
+# 收到 429 后在节流许可下重新发送的最多次数
+THROTTLE_MAX_RETRIES = 10
+# 所有延时的缩放系数（0 表示不等待且跳过主机节流，仅用于测试和基准测试）
+DELAY_SCALE = float(os.environ.get('NSFC_DELAY_SCALE', '1'))
+# PDF 默认保存目录（与 routes 的上传目录一致）
+UPLOAD_DIR = os.path.join(os.environ.get('NSFC_DATA_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'),
+                          'uploads')
+
+_counting_retry_class = None
+
+
+def _counting_retry(**kwargs):
+    """创建会记录重试指标的 urllib3 Retry（子类在首次使用时定义，避免启动时导入 urllib3）"""
+    global _counting_retry_class
+    if _counting_retry_class is None:
+        from urllib3.util.retry import Retry
+
+        class CountingRetry(Retry):
+            def increment(self, method=None, url=None, response=None, error=None, *args, **kw):
+                status = getattr(response, 'status', None)
+                DOWNLOADER_HTTP_RETRIES.inc(reason=status or type(error).__name__)
+                return super().increment(method, url, response, error, *args, **kw)
+
+        _counting_retry_class = CountingRetry
+    return _counting_retry_class(**kwargs)
+
 
 class NsfcReportDownloader:
     """国自然结题报告下载器"""
 
-    def __init__(self):
-        self.base_url = "https://kd.nsfc.cn"
+    def __init__(self, cancel_event=None, trace=None, base_url=None, delay_scale=None, output_dir=None):
+        """
+        Args:
+            cancel_event: threading.Event，被设置后下载在下一个检查点停止
+            trace: tracing.Trace，记录各阶段耗时
+            base_url: 报告站点地址，默认 NSFC_BASE_URL
+            delay_scale: 请求间延时的缩放系数，默认 DELAY_SCALE
+            output_dir: PDF 保存目录，默认 UPLOAD_DIR
+        """
+        self.cancel_event = cancel_event
+        self.trace = trace or NULL_TRACE
+        self.base_url = (base_url or NSFC_BASE_URL).rstrip('/')
+        self.delay_scale = DELAY_SCALE if delay_scale is None else delay_scale
+        self.output_dir = output_dir or UPLOAD_DIR
+        # 同一主机的请求速率由所有下载器和抓取共享
+        self.scheduler = politeness.for_url(self.base_url)
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Origin": self.base_url,
@@ -24,25 +83,72 @@ class NsfcReportDownloader:
             "Accept": "application/json, text/plain, */*",
             "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
         }
+        # requests 和 Pillow 导入较慢，在创建下载器时才导入
+        import requests
+        from requests.adapters import HTTPAdapter
+        
         self.session = requests.Session()
         self.session.headers.update(self.headers)
 
-        # 配置重试策略
-        retry_strategy = Retry(
+        # 配置重试策略（429 不在此重试，由 _request 交给主机调度器处理）
+        retry_strategy = _counting_retry(
             total=10,
             backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
+            status_forcelist=[500, 502, 503, 504],
             allowed_methods=["HEAD", "GET", "POST"]
         )
         adapter = HTTPAdapter(max_retries=retry_strategy)
         self.session.mount("https://", adapter)
         self.session.mount("http://", adapter)
 
+    def check_cancelled(self):
+        """检查是否已取消，已取消时抛出 DownloadCancelled"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise DownloadCancelled()
+
+    def _sleep(self, seconds):
+        """可被取消打断的延时（按 delay_scale 缩放）"""
+        seconds *= self.delay_scale
+        if seconds <= 0:
+            self.check_cancelled()
+            return
+        with self.trace.span('sleep', seconds=round(seconds, 2)):
+            if self.cancel_event is None:
+                time.sleep(seconds)
+            else:
+                self.cancel_event.wait(seconds)
+        self.check_cancelled()
+
+    def _throttle(self):
+        """等待主机调度器的许可"""
+        if self.delay_scale <= 0:
+            self.check_cancelled()
+            return
+        with self.trace.span('throttle') as span:
+            waited = self.scheduler.acquire(id(self), self.cancel_event)
+            if waited is not None:
+                span['waited'] = round(waited, 2)
+        self.check_cancelled()
+
+    def _request(self, method, url, **kwargs):
+        """经主机调度器发送请求；429 时降低该主机的速率，取得新的许可后重新发送"""
+        for _ in range(THROTTLE_MAX_RETRIES + 1):
+            self._throttle()
+            resp = self.session.request(method, url, **kwargs)
+            if resp.status_code != 429:
+                if resp.status_code < 500:
+                    self.scheduler.record_success()
+                return resp
+            DOWNLOADER_HTTP_429.inc()
+            DOWNLOADER_HTTP_RETRIES.inc(reason=429)
+            self.scheduler.record_throttle(parse_retry_after(resp.headers.get('Retry-After')))
+        return resp
+
     def init_session(self):
         """访问首页以获取初始Cookie"""
         try:
             logger.info(f"[INIT] 访问首页获取Cookie: {self.base_url}")
-            resp = self.session.get(self.base_url, timeout=10)
+            resp = self._request('GET', self.base_url, timeout=10)
             logger.info(f"[INIT] 首页访问状态: {resp.status_code}")
             logger.info(f"[INIT] Cookie: {self.session.cookies.get_dict()}")
         except Exception as e:
@@ -54,7 +160,7 @@ class NsfcReportDownloader:
         url = f"{self.base_url}/api/baseQuery/conclusionProjectInfo/{project_id}"
         try:
             logger.info(f"[INFO] 获取项目信息: {url}")
-            resp = self.session.post(url, timeout=15)
+            resp = self._request('POST', url, timeout=15)
             logger.info(f"[INFO] 项目信息响应状态: {resp.status_code}")
             if resp.status_code == 200:
                 data = resp.json().get('data', {})
@@ -82,14 +188,17 @@ class NsfcReportDownloader:
 
         try:
             if not check_only:
-                logger.info(f"[API] 请求第 {index} 页: {api_url}, data={data}")
-            resp = self.session.post(api_url, data=data, timeout=15)
+                log_page(logger, index, "[API] 请求第 %d 页: %s", index, api_url)
+            mode = 'scan' if check_only else 'page'
+            with DOWNLOADER_API_SECONDS.time(mode=mode), self.trace.span('api', page=index, mode=mode) as span:
+                resp = self._request('POST', api_url, data=data, timeout=15)
+                span['status'] = resp.status_code
             if not check_only:
-                logger.info(f"[API] 第 {index} 页响应状态: {resp.status_code}")
+                log_page(logger, index, "[API] 第 %d 页响应状态: %d", index, resp.status_code)
             if resp.status_code == 200:
                 json_data = resp.json()
-                if not check_only:
-                    logger.info(f"[API] 第 {index} 页响应数据: {json_data}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[API] 第 %d 页响应数据: %.500s", index, json_data)
                 
                 # 严格检查：code必须为200，data必须存在，且data中必须有url字段且不为空
                 if json_data.get('code') == 200:
@@ -104,10 +213,13 @@ class NsfcReportDownloader:
                             if check_only:
                                 # 尝试HEAD请求验证图片是否存在（不下载完整内容）
                                 try:
-                                    head_resp = self.session.head(img_url, timeout=5, allow_redirects=True)
+                                    head_resp = self._request('HEAD', img_url, timeout=5, allow_redirects=True)
                                     if head_resp.status_code == 404:
                                         logger.debug(f"[扫描] 第 {index} 页：图片URL返回404，页面不存在")
                                         return None
+                                    if is_placeholder_size(head_resp.headers.get('Content-Length')):
+                                        logger.debug(f"[扫描] 第 {index} 页：图片大小与配置的占位图相同，页面不存在")
+                                        return None
                                     elif head_resp.status_code != 200:
                                         # 非200非404，可能是其他错误，记录但继续
                                         logger.debug(f"[扫描] 第 {index} 页：图片URL状态码 {head_resp.status_code}，可能存在问题")
@@ -116,7 +228,7 @@ class NsfcReportDownloader:
                                     logger.debug(f"[扫描] 第 {index} 页：验证图片URL时出错: {e}")
                             
                             if not check_only:
-                                logger.info(f"[API] 第 {index} 页获取到图片URL: {img_url}")
+                                log_page(logger, index, "[API] 第 %d 页获取到图片URL: %s", index, img_url)
                             return img_url
                         else:
                             # url为空或不存在，说明页面不存在
@@ -178,7 +290,6 @@ class NsfcReportDownloader:
                     # 页面存在，继续测试更大的页码
                     upper_bound = test_page
                     logger.info(f"[扫描] 第 {test_page} 页存在，继续扩大范围")
-                    time.sleep(0.5)  # 短暂延时，避免请求过快
                 elif result is None:
                     # 页面不存在，找到上界
                     upper_bound = test_page - 1
@@ -186,7 +297,7 @@ class NsfcReportDownloader:
                     break
                 else:
                     # RETRY，可能是网络问题，重试一次
-                    time.sleep(1)
+                    self._sleep(1)
                     result = self.get_image_url_from_api(nsfc_id, test_page, check_only=True)
                     if result and result != "RETRY":
                         upper_bound = test_page
@@ -212,7 +323,6 @@ class NsfcReportDownloader:
                     if result and result != "RETRY":
                         upper_bound = current_test
                         logger.info(f"[扫描] 第 {current_test} 页存在，继续扩大范围")
-                        time.sleep(0.5)
                     elif result is None:
                         # 页面不存在，找到上界
                         upper_bound = current_test - 1
@@ -220,7 +330,7 @@ class NsfcReportDownloader:
                         break
                     else:
                         # RETRY，重试一次
-                        time.sleep(1)
+                        self._sleep(1)
                         result = self.get_image_url_from_api(nsfc_id, current_test, check_only=True)
                         if result and result != "RETRY":
                             upper_bound = current_test
@@ -268,15 +378,13 @@ class NsfcReportDownloader:
                     logger.info(f"[扫描] 第 {mid} 页不存在，向左查找")
                 else:
                     # RETRY，可能是网络问题，重试一次
-                    time.sleep(1)
+                    self._sleep(1)
                     result = self.get_image_url_from_api(nsfc_id, mid, check_only=True)
                     if result and result != "RETRY":
                         last_valid_page = mid
                         left = mid + 1
                     elif result is None:
                         right = mid - 1
-                
-                time.sleep(0.3)  # 短暂延时，避免请求过快
             
             if last_valid_page > 0:
                 logger.info(f"[扫描] 二分查找完成，总页数：{last_valid_page}")
@@ -289,26 +397,34 @@ class NsfcReportDownloader:
                     progress_callback(25, "无法确定总页数，将动态显示进度", 0, 0, None)
                 return None
                 
+        except DownloadCancelled:
+            raise
         except Exception as e:
             logger.error(f"[扫描] 扫描总页数失败: {str(e)}")
             if progress_callback:
                 progress_callback(25, f"扫描总页数失败: {str(e)}", 0, 0, None)
             return None
 
-    def download_image_content(self, img_url):
-        """下载图片二进制内容"""
+    def download_image_content(self, img_url, index=0):
+        """下载图片二进制内容
+
+        Args:
+            index: 页码，仅用于日志采样和追踪
+        """
         try:
-            logger.info(f"[IMG] 开始下载图片: {img_url}")
-            resp = self.session.get(img_url, timeout=20)
-            logger.info(f"[IMG] 图片响应状态: {resp.status_code}")
+            log_page(logger, index, "[IMG] 开始下载图片: %s", img_url)
+            with DOWNLOADER_IMAGE_SECONDS.time(), self.trace.span('image', page=index) as span:
+                resp = self._request('GET', img_url, timeout=20)
+                span['status'] = resp.status_code
+                span['bytes'] = len(resp.content or b'')
+            log_page(logger, index, "[IMG] 图片响应状态: %d", resp.status_code)
             if resp.status_code == 404:
                 logger.info(f"[IMG] 图片返回404: {img_url}")
                 return "404"
             if resp.status_code != 200:
                 logger.warning(f"[IMG] 图片响应异常: {resp.status_code}")
                 return None
-            content_length = len(resp.content) if resp.content else 0
-            logger.info(f"[IMG] 图片下载成功，大小: {content_length} bytes")
+            log_page(logger, index, "[IMG] 图片下载成功，大小: %d bytes", len(resp.content or b''))
             return resp.content
         except Exception as e:
             logger.warning(f"[IMG] 图片下载异常: {e}")
@@ -326,6 +442,8 @@ class NsfcReportDownloader:
         Returns:
             dict: {'success': bool, 'file_path': str, 'filename': str, 'message': str, 'page_count': int}
         """
+        # 已缓存页面图片的字节数（解码后），用于内存指标
+        buffered_bytes = 0
         try:
             # 初始化会话
             if progress_callback:
@@ -338,17 +456,21 @@ class NsfcReportDownloader:
                 safe_name = f"nsfc_{nsfc_id}"
 
             # 使用二分查找法扫描总页数
-            total_pages = self.scan_total_pages(nsfc_id, progress_callback)
+            with self.trace.span('scan') as span:
+                total_pages = self.scan_total_pages(nsfc_id, progress_callback)
+                span['total_pages'] = total_pages
 
             images = []
             index = 1
             consecutive_failures = 0
+            page_filter = PageFilter()
 
             if progress_callback:
                 progress_callback(30, f"开始下载项目: {safe_name}", 0, 0, total_pages)
 
             while True:
-                logger.info(f"========== 开始处理第 {index} 页 ==========")
+                self.check_cancelled()
+                log_page(logger, index, "========== 开始处理第 %d 页 ==========", index)
                 
                 # 通知开始处理当前页
                 if progress_callback:
@@ -365,13 +487,19 @@ class NsfcReportDownloader:
 
                 # API 获取 URL 的重试循环
                 while retry_count < 3:
-                    logger.info(f"[循环] 第 {index} 页，API重试次数: {retry_count}")
+                    log_page(logger, index, "[循环] 第 %d 页，API重试次数: %d", index, retry_count)
                     img_url = self.get_image_url_from_api(nsfc_id, index)
                     if img_url == "RETRY":
+                        if total_pages and index > total_pages:
+                            # 超出扫描到的总页数的页面请求失败，不再重试
+                            logger.info(f"[循环] 第 {index} 页超出总页数 {total_pages} 且请求失败，判断为下载结束")
+                            img_url = None
+                            break
+                        DOWNLOADER_PAGE_RETRIES.inc(stage='api')
                         retry_count += 1
                         wait_time = 2 * retry_count
                         logger.info(f"[循环] API重试等待 {wait_time}秒...")
-                        time.sleep(wait_time)
+                        self._sleep(wait_time)
                         continue
                     break
 
@@ -391,13 +519,14 @@ class NsfcReportDownloader:
                         progress = 30 + min(int((index * 65 / 100)), 65)
                     progress_callback(progress, f"正在下载第 {index} 页...", index, len(images), total_pages)
 
+                self.check_cancelled()
                 content = None
                 dl_retry = 0
 
                 # 图片下载的重试循环
                 while dl_retry < 5:
-                    logger.info(f"[循环] 第 {index} 页，图片下载重试次数: {dl_retry}")
-                    content = self.download_image_content(img_url)
+                    log_page(logger, index, "[循环] 第 %d 页，图片下载重试次数: %d", index, dl_retry)
+                    content = self.download_image_content(img_url, index)
 
                     if content == "404":
                         logger.info(f"[循环] 第 {index} 页图片返回404，结束下载")
@@ -408,10 +537,16 @@ class NsfcReportDownloader:
                         break
 
                     if content:
-                        logger.info(f"[循环] 第 {index} 页图片下载成功")
+                        log_page(logger, index, "[循环] 第 %d 页图片下载成功", index)
+                        break
+
+                    if total_pages and index > total_pages:
+                        logger.info(f"[循环] 第 {index} 页超出总页数 {total_pages} 且下载失败，判断为下载结束")
+                        img_url = None
                         break
 
                     dl_retry += 1
+                    DOWNLOADER_PAGE_RETRIES.inc(stage='image')
                     sleep_time = 2 + dl_retry
                     logger.info(f"[循环] 第 {index} 页下载失败，等待 {sleep_time}秒后重试")
                     if progress_callback:
@@ -422,7 +557,7 @@ class NsfcReportDownloader:
                             progress = 30 + min(int((index * 65 / 100)), 65)
                         progress_callback(progress,
                                          f"第 {index} 页下载失败，第 {dl_retry} 次重试 (等待{sleep_time}s)...", index, len(images), total_pages)
-                    time.sleep(sleep_time)
+                    self._sleep(sleep_time)
 
                 if img_url is None:
                     logger.info(f"[循环] img_url为None，跳出循环")
@@ -440,31 +575,51 @@ class NsfcReportDownloader:
 
                 consecutive_failures = 0
 
-                # 步骤3: 处理图片
+                # 步骤3: 处理图片（丢弃空白页、占位图和重复页）
                 try:
-                    img = Image.open(BytesIO(content))
-                    if img.mode != "RGB":
-                        img = img.convert("RGB")
-                    images.append(img)
-                    logger.info(f"[图片] 第 {index} 页图片处理成功，当前已收集 {len(images)} 张图片")
-                    # 通知图片处理成功
-                    if progress_callback:
-                        # 如果有总页数，计算准确进度；否则使用估算进度
-                        if total_pages:
-                            progress = 30 + int((len(images) / total_pages) * 65)
-                        else:
-                            progress = 30 + min(int((index * 65 / 100)), 65)
-                        progress_callback(progress, f"第 {index} 页处理成功，已收集 {len(images)} 张图片", index, len(images), total_pages)
+                    from PIL import Image
+                    with self.trace.span('decode', page=index) as span:
+                        kind = page_filter.check_content(content)
+                        if kind is None:
+                            img = Image.open(BytesIO(content))
+                            if img.mode != "RGB":
+                                img = img.convert("RGB")
+                            kind = page_filter.check_image(img)
+                        if kind != PageFilter.PAGE:
+                            span['dropped'] = kind
+                    if kind == PageFilter.PAGE:
+                        images.append(img)
+                        image_bytes = img.width * img.height * len(img.getbands())
+                        buffered_bytes += image_bytes
+                        PAGE_BUFFER_BYTES.inc(image_bytes)
+                        PAGE_BUFFER_PEAK_BYTES.set_max(buffered_bytes)
+                        log_page(logger, index, "[图片] 第 %d 页图片处理成功，当前已收集 %d 张图片", index, len(images))
+                        # 通知图片处理成功
+                        if progress_callback:
+                            # 如果有总页数，计算准确进度；否则使用估算进度
+                            if total_pages:
+                                progress = 30 + int((len(images) / total_pages) * 65)
+                            else:
+                                progress = 30 + min(int((index * 65 / 100)), 65)
+                            progress_callback(progress, f"第 {index} 页处理成功，已收集 {len(images)} 张图片", index, len(images), total_pages)
+                    else:
+                        DOWNLOADER_DROPPED_PAGES.inc(kind=kind)
+                        logger.info(f"[图片] 第 {index} 页为{DROPPED_PAGE_NAMES[kind]}，已丢弃")
                 except Exception as e:
                     logger.error(f"图片损坏: {e}")
 
+                if page_filter.ended:
+                    logger.info(f"[循环] 第 {index} 页：已连续 {page_filter.run} 页为空白页、占位图或重复页，判断为下载结束")
+                    if progress_callback:
+                        progress_callback(95, f"第 {index} 页为{DROPPED_PAGE_NAMES[page_filter.last_kind]}，下载结束",
+                                          index, len(images), total_pages)
+                    break
+
                 index += 1
-                sleep_time = random.uniform(1.5, 3.5)
-                logger.info(f"[循环] 随机延时 {sleep_time:.2f}秒")
-                time.sleep(sleep_time)
 
             logger.info(f"[循环] 主循环结束，共收集 {len(images)} 张图片")
             # 步骤4: 合成PDF
+            self.check_cancelled()
             if images:
                 logger.info(f"[PDF] 开始合成PDF，共 {len(images)} 页")
                 if progress_callback:
@@ -473,15 +628,21 @@ class NsfcReportDownloader:
                 # 生成文件名
                 timestamp = int(time.time())
                 filename = f"{safe_name}_{timestamp}.pdf"
-                import os
-                # 获取当前文件的目录，然后构建 uploads 路径
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                file_path = os.path.join(current_dir, '..', 'uploads', filename)
+                file_path = os.path.join(self.output_dir, filename)
                 logger.info(f"[PDF] 保存路径: {file_path}")
+                # 工作进程中没有由应用创建的 uploads 目录
+                os.makedirs(self.output_dir, exist_ok=True)
 
-                images[0].save(
-                    file_path, "PDF", resolution=100.0, save_all=True, append_images=images[1:]
-                )
+                try:
+                    with PDF_ASSEMBLY_SECONDS.time(), self.trace.span('pdf_write', pages=len(images)):
+                        images[0].save(
+                            file_path, "PDF", resolution=100.0, save_all=True, append_images=images[1:]
+                        )
+                except Exception:
+                    # 删除写了一半的文件
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                    raise
                 logger.info(f"[PDF] PDF合成完成")
 
                 if progress_callback:
@@ -503,6 +664,13 @@ class NsfcReportDownloader:
                     'message': "未能下载任何有效图片"
                 }
 
+        except DownloadCancelled:
+            logger.info(f"[取消] 下载已取消: {nsfc_id}")
+            return {
+                'success': False,
+                'cancelled': True,
+                'message': "下载已取消"
+            }
         except Exception as e:
             logger.error(f"下载结题报告失败: {str(e)}")
             if progress_callback:
@@ -511,3 +679,5 @@ class NsfcReportDownloader:
                 'success': False,
                 'message': f"下载失败: {str(e)}"
             }
+        finally:
+            PAGE_BUFFER_BYTES.dec(buffered_bytes)
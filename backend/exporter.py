@@ -0,0 +1,173 @@
+"""项目目录的分析格式导出（NDJSON / Parquet / Arrow IPC）
+
+所有格式都按批次从 SQLite 游标读取并逐批输出，内存占用与数据总量无关。
+"""
+import io
+import json
+from datetime import date, datetime
+
+from optional import optional_import
+from models import iter_project_batches
+from normalize import parse_funding, parse_date
+
+# 每批读取和写出的行数（Parquet 中即为一个 row group）
+EXPORT_BATCH_SIZE = 10000
+
+# 导出列及其类型
+EXPORT_COLUMNS = [
+    ('id', 'string'),
+    ('nsfc_id', 'string'),
+    ('title', 'string'),
+    ('approval_number', 'string'),
+    ('application_code', 'string'),
+    ('leader', 'string'),
+    ('unit', 'string'),
+    ('start_date', 'date'),
+    ('end_date', 'date'),
+    ('funding', 'float'),
+    ('abstract', 'string'),
+    ('conclusion_abstract', 'string'),
+    ('url', 'string'),
+    ('created_at', 'timestamp'),
+]
+
+# 支持的导出格式：格式名 -> (MIME类型, 文件扩展名)
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+# 依赖 pyarrow 的格式
+ARROW_FORMATS = {'parquet', 'arrow'}
+
+
+def _to_date(value):
+    """文本日期转换为 date 对象"""
+    iso = parse_date(value)
+    return date.fromisoformat(iso) if iso else None
+
+
+def _to_timestamp(value):
+    """SQLite 时间戳文本转换为 datetime 对象"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+_CONVERTERS = {
+    'string': lambda v: None if v is None else str(v),
+    'date': _to_date,
+    'float': parse_funding,
+    'timestamp': _to_timestamp,
+}
+
+
+def _typed_columns(rows):
+    """将一批记录转换为按列组织的带类型数据"""
+    return {
+        name: [_CONVERTERS[kind](row.get(name)) for row in rows]
+        for name, kind in EXPORT_COLUMNS
+    }
+
+
+def export_projects_to_ndjson(unit='', code='', filters=None):
+    """以 NDJSON 格式逐批导出项目（日期为 ISO 字符串，经费为数值）"""
+    for rows in iter_project_batches(unit, code, EXPORT_BATCH_SIZE, filters):
+        columns = _typed_columns(rows)
+        lines = []
+        for i in range(len(rows)):
+            record = {}
+            for name, _ in EXPORT_COLUMNS:
+                value = columns[name][i]
+                record[name] = value.isoformat() if isinstance(value, (date, datetime)) else value
+            lines.append(json.dumps(record, ensure_ascii=False))
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """只写的内存缓冲区，供 pyarrow 写入后按块取出"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        """取出并清空已写入的数据"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def arrow_available():
+    """是否已安装 pyarrow（Parquet / Arrow 导出需要）"""
+    return optional_import('pyarrow') is not None
+
+
+def _arrow_schema():
+    """导出使用的 Arrow schema"""
+    pa = optional_import('pyarrow')
+    types = {
+        'string': pa.string(),
+        'date': pa.date32(),
+        'float': pa.float64(),
+        'timestamp': pa.timestamp('s'),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS])
+
+
+def _export_arrow(unit, code, filters, open_writer):
+    """按批次写入 Arrow 记录批并逐块输出字节"""
+    pa = optional_import('pyarrow')
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    writer = open_writer(sink, schema)
+    try:
+        for rows in iter_project_batches(unit, code, EXPORT_BATCH_SIZE, filters):
+            batch = pa.RecordBatch.from_pydict(_typed_columns(rows), schema=schema)
+            writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_projects_to_parquet(unit='', code='', filters=None):
+    """以 Parquet 格式逐批导出项目"""
+    pq = optional_import('pyarrow.parquet')
+    return _export_arrow(unit, code, filters, lambda sink, schema: pq.ParquetWriter(sink, schema, compression='zstd'))
+
+
+def export_projects_to_arrow(unit='', code='', filters=None):
+    """以 Arrow IPC 流格式逐批导出项目"""
+    pa = optional_import('pyarrow')
+    return _export_arrow(unit, code, filters, pa.ipc.new_stream)
+
+
+def export_projects(fmt, unit='', code='', filters=None):
+    """按指定格式导出项目，返回字节块生成器"""
+    if fmt == 'ndjson':
+        return export_projects_to_ndjson(unit, code, filters)
+    if fmt == 'parquet':
+        return export_projects_to_parquet(unit, code, filters)
+    if fmt == 'arrow':
+        return export_projects_to_arrow(unit, code, filters)
+    raise ValueError(f'不支持的导出格式: {fmt}')
@@ -0,0 +1,120 @@
+"""报告文件的后台清理
+
+数据库事务提交后，待删除的文件路径放入队列，由后台线程删除；
+后台线程还会定期清理 uploads/ 中没有任何报告记录引用的孤立文件。
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+from models import get_report_file_paths
+
+logger = logging.getLogger(__name__)
+
+# 孤立文件清理间隔（秒）
+ORPHAN_SWEEP_INTERVAL = 3600
+# 修改时间在此时长（秒）内的文件不视为孤立文件，避免误删正在写入或尚未登记的文件
+ORPHAN_GRACE_PERIOD = 600
+
+
+class FileReaper:
+    """后台文件删除与孤立文件清理"""
+
+    def __init__(self, sweep_interval=ORPHAN_SWEEP_INTERVAL, grace_period=ORPHAN_GRACE_PERIOD):
+        self.sweep_interval = sweep_interval
+        self.grace_period = grace_period
+        self.upload_folder = None
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._extra_sweeps = []
+
+    def start(self, upload_folder):
+        """启动后台线程"""
+        with self._lock:
+            self.upload_folder = upload_folder
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='file-reaper', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, file_paths):
+        """将文件加入删除队列（接受单个路径或路径列表）"""
+        if not file_paths:
+            return
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        for file_path in file_paths:
+            self.queue.put(file_path)
+
+    def add_sweep(self, callback):
+        """登记随孤立文件清理一起定期执行的清理函数"""
+        self._extra_sweeps.append(callback)
+
+    def pending(self):
+        """队列中待删除的文件数"""
+        return self.queue.qsize()
+
+    def sweep_orphans(self):
+        """删除 uploads/ 中没有报告记录引用的文件
+
+        Returns:
+            list: 已删除的文件名
+        """
+        if not self.upload_folder or not os.path.isdir(self.upload_folder):
+            return []
+
+        referenced = {os.path.realpath(path) for path in get_report_file_paths()}
+        cutoff = time.time() - self.grace_period
+        removed = []
+
+        with os.scandir(self.upload_folder) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.startswith('.'):
+                    continue
+                if os.path.realpath(entry.path) in referenced:
+                    continue
+                try:
+                    if entry.stat().st_mtime > cutoff:
+                        continue
+                    os.remove(entry.path)
+                    removed.append(entry.name)
+                except OSError as e:
+                    logger.error(f"删除孤立文件失败: {entry.name}, {str(e)}")
+
+        if removed:
+            logger.info(f"已清理 {len(removed)} 个孤立文件")
+        return removed
+
+    def _remove(self, file_path):
+        """删除单个文件"""
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except OSError as e:
+            logger.error(f"删除文件失败: {str(e)}")
+
+    def _run(self):
+        """后台线程主循环"""
+        while True:
+            try:
+                self._remove(self.queue.get(timeout=1.0))
+            except queue.Empty:
+                pass
+
+            if time.monotonic() - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = time.monotonic()
+                try:
+                    self.sweep_orphans()
+                except Exception as e:
+                    logger.error(f"清理孤立文件失败: {str(e)}")
+                for callback in self._extra_sweeps:
+                    try:
+                        callback()
+                    except Exception as e:
+                        logger.error(f"定期清理失败: {str(e)}")
+
+
+file_reaper = FileReaper()
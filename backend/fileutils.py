@@ -0,0 +1,50 @@
+"""文件相关的工具函数"""
+import hashlib
+import os
+
+
+def file_fingerprint(file_path):
+    """基于文件大小和修改时间的指纹，文件内容变化后随之改变"""
+    stat = os.stat(file_path)
+    return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+
+def atomic_write(file_path, data):
+    """先写临时文件再替换，避免读到写了一半的文件"""
+    tmp_path = f'{file_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """分块计算文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_stream(src, dst, digest=None, chunk_size=1024 * 1024):
+    """分块复制流，可同时更新哈希，返回复制的字节数"""
+    copied = 0
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        dst.write(chunk)
+        if digest is not None:
+            digest.update(chunk)
+        copied += len(chunk)
+    return copied
+
+
+def looks_like_pdf(file_path):
+    """检查 PDF 文件头和文件尾标记（只读取首尾少量字节）"""
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        if not f.read(5) == b'%PDF-':
+            return False
+        f.seek(max(size - 1024, 0))
+        return b'%%EOF' in f.read()
@@ -0,0 +1,118 @@
+"""搜索历史的异步批量写入
+
+请求线程只把事件放入内存队列，由后台线程按批次在单个事务中写入数据库，
+并定期按保留策略清理旧记录。
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from models import insert_search_history_batch, prune_search_history
+
+logger = logging.getLogger(__name__)
+
+# 每批最多写入的事件数
+HISTORY_BATCH_SIZE = 200
+# 队列为空时最长等待时间（秒），到时即写入已收集的事件
+HISTORY_FLUSH_INTERVAL = 2.0
+# 内存队列容量，超出后丢弃新事件
+HISTORY_QUEUE_SIZE = 10000
+# 保留策略：最多保留的行数、最长保留天数
+HISTORY_MAX_ROWS = 10000
+HISTORY_MAX_AGE_DAYS = 90
+# 清理旧记录的间隔（秒）
+HISTORY_PRUNE_INTERVAL = 600
+
+
+class SearchHistoryWriter:
+    """搜索历史后台批量写入器"""
+
+    def __init__(self, batch_size=HISTORY_BATCH_SIZE, flush_interval=HISTORY_FLUSH_INTERVAL,
+                 max_rows=HISTORY_MAX_ROWS, max_age_days=HISTORY_MAX_AGE_DAYS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.max_age_days = max_age_days
+        self.queue = queue.Queue(maxsize=HISTORY_QUEUE_SIZE)
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._last_prune = 0
+
+    def record(self, search_type, keyword, results_count):
+        """记录一次搜索（非阻塞）"""
+        self._ensure_started()
+        created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            self.queue.put_nowait((search_type, keyword, results_count, created_at))
+        except queue.Full:
+            logger.warning("搜索历史队列已满，丢弃本条记录")
+
+    def flush(self):
+        """立即写入队列中所有待处理事件（在调用线程中执行）"""
+        while True:
+            events = self._drain(self.batch_size)
+            if not events:
+                break
+            self._write(events)
+
+    def pending(self):
+        """队列中待写入的事件数"""
+        return self.queue.qsize()
+
+    def _ensure_started(self):
+        """首次使用时启动后台线程"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='search-history-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _drain(self, limit):
+        """非阻塞地从队列取出至多 limit 个事件"""
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def _write(self, events):
+        """批量写入事件"""
+        with self._write_lock:
+            insert_search_history_batch(events)
+
+    def _run(self):
+        """后台线程主循环：攒批写入并定期清理"""
+        while True:
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+                events = [first] + self._drain(self.batch_size - 1)
+                self._write(events)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                logger.error(f"写入搜索历史失败: {str(e)}")
+
+            if time.monotonic() - self._last_prune >= HISTORY_PRUNE_INTERVAL:
+                self._last_prune = time.monotonic()
+                try:
+                    deleted = prune_search_history(self.max_rows, self.max_age_days)
+                    if deleted:
+                        logger.info(f"已清理 {deleted} 条过期搜索历史")
+                except Exception as e:
+                    logger.error(f"清理搜索历史失败: {str(e)}")
+
+
+search_history_writer = SearchHistoryWriter()
+
+
+def record_search_history(search_type, keyword, results_count):
+    """记录搜索历史（放入队列，由后台线程批量写入）"""
+    search_history_writer.record(search_type, keyword, results_count)
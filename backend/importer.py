@@ -0,0 +1,202 @@
+"""项目批量导入（CSV / NDJSON）
+
+逐行流式读取文件，校验后按批次在单个事务中写入数据库。CSV 格式与
+/api/export/projects 导出的格式一致，NDJSON 使用导出时的英文字段名。
+
+命令行用法:
+    python importer.py projects.csv
+    python importer.py projects.ndjson --batch-size 5000 --db nsfc.db
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+
+import models
+from models import upsert_projects_batch
+from normalize import parse_funding
+
+logger = logging.getLogger(__name__)
+
+# 每个事务写入的行数
+IMPORT_BATCH_SIZE = 5000
+
+# 报告中最多返回的错误条数
+MAX_REPORTED_ERRORS = 1000
+
+# CSV 表头（与导出格式一致）到字段名的映射
+CSV_HEADER_MAP = {
+    '项目名称': 'title',
+    '批准号': 'approval_number',
+    '申请代码': 'application_code',
+    '负责人': 'leader',
+    '依托单位': 'unit',
+    '开始日期': 'start_date',
+    '结束日期': 'end_date',
+    '资助经费': 'funding',
+    '项目摘要': 'abstract',
+    '结题摘要': 'conclusion_abstract',
+    'URL': 'url',
+}
+
+PROJECT_FIELDS = [
+    'id', 'nsfc_id', 'title', 'approval_number', 'application_code', 'leader', 'unit',
+    'start_date', 'end_date', 'funding', 'abstract', 'conclusion_abstract', 'url'
+]
+
+REQUIRED_FIELDS = ['title', 'approval_number', 'unit']
+
+IMPORT_FORMATS = {'csv', 'ndjson'}
+
+
+def detect_format(filename):
+    """根据文件扩展名判断导入格式"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension in ('ndjson', 'jsonl', 'json'):
+        return 'ndjson'
+    return 'csv'
+
+
+def iter_csv_rows(text_stream):
+    """逐行读取CSV，返回 (行号, 字段字典)"""
+    reader = csv.reader(text_stream)
+    header = next(reader, None)
+    if header is None:
+        return
+
+    fields = [CSV_HEADER_MAP.get(name.strip(), name.strip()) for name in header]
+    if not any(field in PROJECT_FIELDS for field in fields):
+        raise ValueError(f'无法识别的CSV表头: {header}')
+
+    for values in reader:
+        if not any(values):
+            continue
+        yield reader.line_num, dict(zip(fields, values))
+
+
+def iter_ndjson_rows(text_stream):
+    """逐行读取NDJSON，返回 (行号, 字段字典)；无法解析的行返回错误信息字符串"""
+    for line_no, line in enumerate(text_stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, f'JSON解析失败: {e.msg}'
+            continue
+        if not isinstance(record, dict):
+            yield line_no, '每行必须是一个JSON对象'
+            continue
+        yield line_no, record
+
+
+def validate_project_row(row):
+    """校验并规整一行数据
+
+    Returns:
+        tuple: (项目信息, 错误信息)，校验通过时错误信息为None
+    """
+    project_info = {}
+    for field in PROJECT_FIELDS:
+        value = row.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        project_info[field] = value if value not in ('', None) else None
+
+    for field in REQUIRED_FIELDS:
+        if not project_info[field]:
+            return None, f'{field}不能为空'
+
+    if project_info['funding'] is not None:
+        funding = parse_funding(project_info['funding'])
+        if funding is None:
+            return None, f"资助经费格式错误: {project_info['funding']}"
+        project_info['funding'] = funding
+
+    for field in PROJECT_FIELDS:
+        value = project_info[field]
+        if field != 'funding' and value is not None and not isinstance(value, str):
+            project_info[field] = str(value)
+
+    return project_info, None
+
+
+def import_projects(text_stream, fmt='csv', batch_size=IMPORT_BATCH_SIZE):
+    """从文本流批量导入项目
+
+    Args:
+        text_stream: 文本流（CSV 或 NDJSON）
+        fmt: 'csv' 或 'ndjson'
+        batch_size: 每个事务写入的行数
+
+    Returns:
+        dict: {'total', 'inserted', 'updated', 'failed', 'errors': [{'line', 'error'}]}
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f'不支持的导入格式: {fmt}')
+
+    rows = iter_csv_rows(text_stream) if fmt == 'csv' else iter_ndjson_rows(text_stream)
+    report = {'total': 0, 'inserted': 0, 'updated': 0, 'failed': 0, 'errors': []}
+
+    def add_error(line_no, message):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line_no, 'error': message})
+
+    def flush(batch):
+        inserted, updated, errors = upsert_projects_batch(batch)
+        report['inserted'] += inserted
+        report['updated'] += updated
+        for line_no, message in errors:
+            add_error(line_no, message)
+        logger.info(f"[导入] 已写入 {report['inserted'] + report['updated']} 行")
+
+    batch = []
+    for line_no, row in rows:
+        report['total'] += 1
+        if isinstance(row, str):
+            add_error(line_no, row)
+            continue
+
+        project_info, error = validate_project_row(row)
+        if error:
+            add_error(line_no, error)
+            continue
+
+        batch.append((line_no, project_info))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+
+    if batch:
+        flush(batch)
+
+    return report
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='批量导入项目（CSV / NDJSON）')
+    parser.add_argument('file', help='导入文件路径')
+    parser.add_argument('--format', choices=sorted(IMPORT_FORMATS), help='文件格式，默认按扩展名判断')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='每个事务写入的行数')
+    parser.add_argument('--db', default=models.DATABASE, help='数据库文件路径')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    models.DATABASE = args.db
+    models.init_db()
+
+    fmt = args.format or detect_format(args.file)
+    with io.open(args.file, encoding='utf-8-sig', newline='') as f:
+        report = import_projects(f, fmt, args.batch_size)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0 if report['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
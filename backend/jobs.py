@@ -0,0 +1,279 @@
+"""结题报告下载任务
+
+下载在后台线程中执行，进度写入进度代理的通道，与 SSE 请求解耦：
+观看下载的请求只订阅通道，断开或刷新页面都不影响下载本身。
+
+队列模式（NSFC_DOWNLOAD_MODE=queue）下下载不在应用进程中执行：任务写入 download_tasks 表，
+由 worker.py 工作进程领取，应用进程中的后台线程轮询任务记录并把进度发布到同一个通道。
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from cache import query_cache
+from downloader import NsfcReportDownloader
+from models import create_report_record, create_download_task, get_download_task, request_download_task_cancel
+from progress import progress_broker
+from tracing import Trace, TraceSnapshot, log_page
+
+logger = logging.getLogger(__name__)
+
+# 最后一个观看者断开后，等待重连的时间（秒），超时仍无人观看则取消下载
+DISCONNECT_GRACE_PERIOD = 20
+# 下载执行方式：'thread' 在应用进程的后台线程中下载；'queue' 交给 worker.py 工作进程
+DOWNLOAD_MODE = os.environ.get('NSFC_DOWNLOAD_MODE', 'thread')
+# 队列模式下轮询任务进度的间隔（秒）
+TASK_POLL_INTERVAL = 1.0
+
+
+class DownloadJob:
+    """单个结题报告下载任务"""
+
+    def __init__(self, project_id, nsfc_id, project_name, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.project_id = project_id
+        self.nsfc_id = nsfc_id
+        self.project_name = project_name
+        self.channel = progress_broker.create(self.id)
+        self.trace = Trace(self.id)
+        self.thread = None
+        self.cancel_event = threading.Event()
+        self.cancel_reason = None
+        self.subscribers = 0
+        self._grace_timer = None
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.channel.closed
+
+    def start(self):
+        """启动下载线程"""
+        self.thread = threading.Thread(target=self._run, name=f'download-{self.id[:8]}', daemon=True)
+        self.thread.start()
+
+    def cancel(self, reason='下载已取消'):
+        """请求取消下载，下载器在下一个检查点停止"""
+        if self.finished or self.cancel_event.is_set():
+            return
+        self.cancel_reason = reason
+        self.cancel_event.set()
+        logger.info(f"[取消] {self.id}: {reason}")
+
+    def subscribe(self):
+        """登记一个观看者，取消待执行的断线取消"""
+        with self._lock:
+            self.subscribers += 1
+            if self._grace_timer is not None:
+                self._grace_timer.cancel()
+                self._grace_timer = None
+
+    def unsubscribe(self):
+        """注销观看者；最后一个观看者断开后，宽限期内无人重连则取消下载"""
+        with self._lock:
+            self.subscribers -= 1
+            if self.subscribers > 0 or self.finished:
+                return
+            self._grace_timer = threading.Timer(
+                DISCONNECT_GRACE_PERIOD, self.cancel, args=('客户端已断开，下载已取消',))
+            self._grace_timer.daemon = True
+            self._grace_timer.start()
+
+    def progress_callback(self, progress, message, current_page=0, collected_pages=0, total_pages=None):
+        """下载器进度回调：发布进度事件"""
+        self.channel.publish({
+            'type': 'progress',
+            'progress': progress,
+            'message': message,
+            'current_page': current_page,
+            'collected_pages': collected_pages,
+            'total_pages': total_pages
+        })
+        log_page(logger, current_page, "[下载进度] %s%% - %s (第%s页，已收集%s/%s页)",
+                 progress, message, current_page, collected_pages, total_pages or '?')
+
+    def _run(self):
+        """执行下载并发布完成或失败事件"""
+        try:
+            logger.info(f"开始下载结题报告: {self.project_id}, nsfc_id: {self.nsfc_id}, 项目名称: {self.project_name}")
+            downloader = NsfcReportDownloader(cancel_event=self.cancel_event, trace=self.trace)
+            result = downloader.download_report(self.nsfc_id, self.project_name, self.progress_callback)
+
+            if result.get('cancelled'):
+                self.channel.publish({
+                    'type': 'error',
+                    'cancelled': True,
+                    'message': self.cancel_reason or result['message']
+                })
+            elif result['success']:
+                # 保存到数据库
+                report_id = create_report_record(
+                    self.project_id,
+                    result['filename'],
+                    result['file_path'],
+                    os.path.getsize(result['file_path'])
+                )
+
+                logger.info(f"结题报告下载完成: {result['filename']}, 共 {result.get('page_count', 0)} 页")
+
+                self.channel.publish({
+                    'type': 'complete',
+                    'success': True,
+                    'report_id': report_id,
+                    'filename': result['filename'],
+                    'page_count': result.get('page_count', 0),
+                    'message': result['message']
+                })
+            else:
+                logger.warning(f"结题报告下载失败: {result['message']}")
+                self.channel.publish({'type': 'error', 'message': result['message']})
+
+        except Exception as e:
+            logger.error(f"下载结题报告失败: {str(e)}")
+            self.channel.publish({'type': 'error', 'message': f'下载失败: {str(e)}'})
+        finally:
+            self.trace.finish()
+            self.channel.close()
+            _prune_jobs()
+
+
+class QueuedDownloadJob(DownloadJob):
+    """队列模式的下载任务：由工作进程执行，本对象轮询任务记录并发布进度
+
+    任务ID即 download_tasks 表的记录ID；取消请求写入任务记录，由工作进程在下次心跳时停止下载。
+    """
+
+    def __init__(self, task):
+        super().__init__(task['project_id'], task['nsfc_id'], task['project_name'], job_id=task['id'])
+
+    def _run(self):
+        """轮询任务记录直到结束"""
+        last_state = None
+        cancel_sent = False
+        try:
+            while True:
+                if self.cancel_event.is_set() and not cancel_sent:
+                    request_download_task_cancel(self.id, self.cancel_reason)
+                    cancel_sent = True
+
+                try:
+                    task = get_download_task(self.id)
+                except sqlite3.Error as e:
+                    logger.warning(f"[下载任务] 读取任务 {self.id} 失败: {str(e)}")
+                    time.sleep(TASK_POLL_INTERVAL)
+                    continue
+
+                if task is None:
+                    self.channel.publish({'type': 'error', 'message': '下载任务不存在'})
+                    break
+                if task['trace']:
+                    self.trace = TraceSnapshot(json.loads(task['trace']))
+
+                if task['status'] == 'completed':
+                    # 报告记录由工作进程写入，只失效了工作进程自己的查询缓存
+                    query_cache.invalidate()
+                    self.channel.publish({
+                        'type': 'complete',
+                        'success': True,
+                        'report_id': task['report_id'],
+                        'filename': task['filename'],
+                        'page_count': task['page_count'] or 0,
+                        'message': task['message']
+                    })
+                    break
+                if task['status'] in ('failed', 'cancelled'):
+                    event = {'type': 'error', 'message': task['error'] or task['message']}
+                    if task['status'] == 'cancelled':
+                        event['cancelled'] = True
+                    self.channel.publish(event)
+                    break
+
+                state = (task['status'], task['progress'], task['message'], task['current_page'],
+                         task['collected_pages'], task['total_pages'])
+                if state != last_state:
+                    last_state = state
+                    self.channel.publish({
+                        'type': 'progress',
+                        'progress': task['progress'],
+                        'message': task['message'],
+                        'current_page': task['current_page'] or 0,
+                        'collected_pages': task['collected_pages'] or 0,
+                        'total_pages': task['total_pages']
+                    })
+
+                # 取消请求发出后 cancel_event 一直处于置位状态，改为固定间隔等待
+                if cancel_sent:
+                    time.sleep(TASK_POLL_INTERVAL)
+                else:
+                    self.cancel_event.wait(TASK_POLL_INTERVAL)
+
+        except Exception as e:
+            logger.error(f"轮询下载任务失败: {str(e)}")
+            self.channel.publish({'type': 'error', 'message': f'下载失败: {str(e)}'})
+        finally:
+            self.trace.finish()
+            self.channel.close()
+            _prune_jobs()
+
+
+# 任务ID -> 任务；项目ID -> 该项目最近一次的任务
+_jobs = {}
+_project_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def start_download_job(project_id, nsfc_id, project_name):
+    """启动下载任务；同一项目已有进行中的任务时直接返回该任务"""
+    with _jobs_lock:
+        job = _project_jobs.get(project_id)
+        if job is not None and not job.finished:
+            return job
+
+        if DOWNLOAD_MODE == 'queue':
+            job = QueuedDownloadJob(create_download_task(project_id, nsfc_id, project_name))
+        else:
+            job = DownloadJob(project_id, nsfc_id, project_name)
+        job.channel.publish({'type': 'start', 'message': '开始下载结题报告...', 'download_id': job.id})
+        _jobs[job.id] = job
+        _project_jobs[project_id] = job
+    job.start()
+    return job
+
+
+def get_download_job(job_id):
+    """按任务ID获取任务（包括结束后仍在保留期内的任务）"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None or progress_broker.get(job.id) is None:
+        return None
+    return job
+
+
+def find_project_job(project_id):
+    """获取项目最近一次的下载任务（进行中或结束后仍在保留期内）"""
+    with _jobs_lock:
+        job = _project_jobs.get(project_id)
+    if job is None or progress_broker.get(job.id) is None:
+        return None
+    return job
+
+
+def active_job_count():
+    """进行中的下载任务数"""
+    with _jobs_lock:
+        return sum(1 for job in _jobs.values() if not job.finished)
+
+
+def _prune_jobs():
+    """清理已过保留期的任务记录"""
+    with _jobs_lock:
+        expired = [job_id for job_id, item in _jobs.items()
+                   if item.finished and progress_broker.get(job_id) is None]
+        for job_id in expired:
+            item = _jobs.pop(job_id)
+            if _project_jobs.get(item.project_id) is item:
+                del _project_jobs[item.project_id]
@@ -0,0 +1,288 @@
+"""运行指标（Prometheus 文本格式）
+
+进程内的计数器、仪表和直方图，由 /api/metrics 以 Prometheus 文本格式输出。
+每次记录只做一次加锁的数值更新，可以在生产环境常开。多进程部署时每个进程各自统计。
+"""
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+# 默认的耗时直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    """转义标签值"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """指标基类：按标签值组合保存数据"""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in sorted(items)]
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的仪表，也可以在输出时调用函数取值"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_max(self, value, **labels):
+        """仅当 value 大于当前值时更新（记录峰值）"""
+        key = self._key(labels)
+        with self._lock:
+            if value > self._values.get(key, 0):
+                self._values[key] = value
+
+    def set_function(self, func, **labels):
+        """输出时调用 func() 取值"""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = func
+
+    def _samples(self):
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, func in functions:
+            try:
+                value = func()
+            except Exception as e:
+                logger.warning(f"读取指标 {self.name} 失败: {str(e)}")
+                continue
+            with self._lock:
+                self._values[key] = value
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各分桶计数（最后一个为 +Inf）, 总和, 次数]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """记录代码块的耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        """装饰器：记录函数调用的耗时"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+
+        lines = []
+        for key, (counts, total, count) in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'指标已存在: {metric.name}')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """以 Prometheus 文本格式输出所有指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# HTTP 请求
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'nsfc_http_request_duration_seconds', 'HTTP 请求处理耗时（流式响应只计到开始输出）',
+    ('method', 'route', 'status'))
+
+# 项目信息抓取
+SCRAPE_SECONDS = registry.histogram(
+    'nsfc_scrape_duration_seconds', 'extract_project_info 抓取项目信息的耗时',
+    buckets=(1.0, 2.5, 5.0, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 120.0))
+
+# 结题报告下载
+DOWNLOADER_API_SECONDS = registry.histogram(
+    'nsfc_downloader_api_duration_seconds', '报告页面接口请求耗时（含底层重试）', ('mode',))
+DOWNLOADER_IMAGE_SECONDS = registry.histogram(
+    'nsfc_downloader_image_duration_seconds', '报告页面图片下载耗时（含底层重试）')
+DOWNLOADER_HTTP_RETRIES = registry.counter(
+    'nsfc_downloader_http_retries_total', 'HTTP 层自动重试次数（按触发原因）', ('reason',))
+DOWNLOADER_HTTP_429 = registry.counter(
+    'nsfc_downloader_http_429_total', '收到 429 Too Many Requests 的次数')
+DOWNLOADER_PAGE_RETRIES = registry.counter(
+    'nsfc_downloader_page_retries_total', '下载器对单页的重试次数', ('stage',))
+DOWNLOADER_DROPPED_PAGES = registry.counter(
+    'nsfc_downloader_dropped_pages_total', '被识别为空白页、占位图或重复页而丢弃的页面数', ('kind',))
+PDF_ASSEMBLY_SECONDS = registry.histogram(
+    'nsfc_pdf_assembly_duration_seconds', '页面图片合成 PDF 的耗时')
+PAGE_BUFFER_BYTES = registry.gauge(
+    'nsfc_downloader_page_buffer_bytes', '进行中的下载在内存中缓存的页面图片字节数')
+PAGE_BUFFER_PEAK_BYTES = registry.gauge(
+    'nsfc_downloader_page_buffer_peak_bytes', '单个下载缓存页面图片字节数的峰值（进程启动以来）')
+
+# 按主机的请求节流
+POLITENESS_WAIT_SECONDS = registry.histogram(
+    'nsfc_politeness_wait_seconds', '请求等待主机节流许可的时间', ('host',),
+    buckets=(0.01, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+POLITENESS_RATE = registry.gauge(
+    'nsfc_politeness_rate', '对主机当前允许的请求速率（次/秒，按 429 自适应调整）', ('host',))
+POLITENESS_THROTTLED = registry.counter(
+    'nsfc_politeness_throttled_total', '主机返回 429 的次数', ('host',))
+
+# 数据库
+DB_QUERY_SECONDS = registry.histogram(
+    'nsfc_db_query_duration_seconds', '数据模型函数的 SQLite 耗时', ('function',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+
+# 队列长度
+QUEUE_DEPTH = registry.gauge('nsfc_queue_depth', '后台队列中待处理的任务数', ('queue',))
+
+
+def db_timed(func):
+    """装饰器：按函数名记录数据模型函数的耗时"""
+    return DB_QUERY_SECONDS.timed(function=func.__name__)(func)
+
+
+def init_metrics(app):
+    """记录每个请求的处理耗时"""
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else '<unmatched>'
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                         route=route, status=response.status_code)
+        return response
@@ -1,17 +1,34 @@
 """数据库模型和操作"""
 import sqlite3
 import logging
+import os
+import time
 from datetime import datetime
 import uuid
 
+from normalize import normalize_project_info
+from cache import query_cache
+from fileutils import file_sha256
+from metrics import db_timed
+from profiling import SlowQueryConnection
+
 logger = logging.getLogger(__name__)
 
+# 数据库文件路径
+DATABASE = 'nsfc.db'
+# 等待其他进程释放写锁的时间（秒）；应用和同一主机上的多个下载工作进程共用同一个数据库
+DB_BUSY_TIMEOUT = float(os.environ.get('NSFC_DB_BUSY_TIMEOUT', '30'))
+
 
 def init_db():
     """初始化数据库"""
-    conn = sqlite3.connect('nsfc.db')
+    conn = sqlite3.connect(DATABASE, timeout=DB_BUSY_TIMEOUT)
     cursor = conn.cursor()
     
+    # WAL 模式下读写互不阻塞，多个进程同时访问时只有写入需要排队。
+    # WAL 依赖共享内存，访问数据库的进程（应用和下载工作进程）必须在同一台主机上，不能放在网络文件系统上
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     # 项目表
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS projects (
@@ -25,10 +42,20 @@ def init_db():
             start_date TEXT,
             end_date TEXT,
             funding REAL,
+            url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            start_year INTEGER,
+            end_year INTEGER
+        )
+    ''')
+    
+    # 项目摘要表（长文本与项目元数据分开存放，列表查询和筛选只读取较窄的 projects 表）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS project_texts (
+            project_id TEXT PRIMARY KEY,
             abstract TEXT,
             conclusion_abstract TEXT,
-            url TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            FOREIGN KEY (project_id) REFERENCES projects (id)
         )
     ''')
     
@@ -40,6 +67,44 @@ def init_db():
         cursor.execute('ALTER TABLE projects ADD COLUMN nsfc_id TEXT')
         logger.info("已添加 nsfc_id 列到 projects 表")
     
+    if 'start_year' not in columns:
+        cursor.execute('ALTER TABLE projects ADD COLUMN start_year INTEGER')
+        cursor.execute('ALTER TABLE projects ADD COLUMN end_year INTEGER')
+        logger.info("已添加 start_year / end_year 列到 projects 表")
+        _backfill_typed_columns(cursor)
+    
+    # 旧版本的摘要存放在 projects 表中，迁移到 project_texts 表后重建 projects 表
+    # （重建会删除原表的索引和触发器，下面重新创建）
+    split_texts = 'abstract' in columns
+    if split_texts:
+        _split_project_texts(cursor)
+    
+    # 去重查找使用的索引
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_nsfc_id ON projects (nsfc_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_url ON projects (url)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_approval_number ON projects (approval_number)')
+    
+    # 范围筛选使用的索引
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_funding ON projects (funding)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_start_year ON projects (start_year)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_end_year ON projects (end_year)')
+    
+    # 统计汇总表（由触发器增量维护）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS project_stats (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            project_count INTEGER NOT NULL DEFAULT 0,
+            total_funding REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, key)
+        ) WITHOUT ROWID
+    ''')
+    _create_stats_triggers(cursor)
+    
+    cursor.execute('SELECT 1 FROM project_stats LIMIT 1')
+    if not cursor.fetchone():
+        _rebuild_project_stats(cursor)
+    
     # PDF 文件表
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS reports (
@@ -49,9 +114,18 @@ def init_db():
             file_path TEXT NOT NULL,
             file_size INTEGER,
             upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            content_hash TEXT,
             FOREIGN KEY (project_id) REFERENCES projects (id)
         )
     ''')
+    cursor.execute("PRAGMA table_info(reports)")
+    report_columns = [row[1] for row in cursor.fetchall()]
+    
+    if 'content_hash' not in report_columns:
+        cursor.execute('ALTER TABLE reports ADD COLUMN content_hash TEXT')
+        logger.info("已添加 content_hash 列到 reports 表")
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_project_id ON reports (project_id)')
     
     # 搜索历史表
     cursor.execute('''
@@ -63,28 +137,209 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_search_history_created_at ON search_history (created_at)')
+    
+    # 下载任务表（队列模式下由工作进程通过租约领取执行）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS download_tasks (
+            id TEXT PRIMARY KEY,
+            project_id TEXT NOT NULL,
+            nsfc_id TEXT NOT NULL,
+            project_name TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            worker_id TEXT,
+            lease_expires_at REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            progress INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            current_page INTEGER,
+            collected_pages INTEGER,
+            total_pages INTEGER,
+            report_id TEXT,
+            filename TEXT,
+            page_count INTEGER,
+            error TEXT,
+            trace TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            updated_at REAL,
+            finished_at REAL,
+            FOREIGN KEY (project_id) REFERENCES projects (id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_download_tasks_status ON download_tasks (status, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_download_tasks_project_id ON download_tasks (project_id)')
     
     conn.commit()
+    
+    if split_texts:
+        # 回收迁移前摘要占用的页面
+        conn.execute('VACUUM')
+    
     conn.close()
     logger.info("数据库初始化完成")
 
 
+# projects 表的列（不含摘要）
+PROJECT_COLUMNS = (
+    'id', 'nsfc_id', 'title', 'approval_number', 'application_code', 'leader', 'unit',
+    'start_date', 'end_date', 'funding', 'url', 'created_at', 'start_year', 'end_year',
+)
+# 存放在 project_texts 表中的长文本字段
+PROJECT_TEXT_FIELDS = ('abstract', 'conclusion_abstract')
+
+
+def _split_project_texts(cursor):
+    """将摘要从 projects 表迁移到 project_texts 表，并重建不含摘要列的 projects 表"""
+    cursor.execute('''
+        INSERT OR REPLACE INTO project_texts (project_id, abstract, conclusion_abstract)
+        SELECT id, abstract, conclusion_abstract FROM projects
+        WHERE COALESCE(abstract, '') != '' OR COALESCE(conclusion_abstract, '') != ''
+    ''')
+    moved = cursor.rowcount
+    
+    columns = ', '.join(PROJECT_COLUMNS)
+    cursor.execute('DROP TABLE IF EXISTS projects_new')
+    cursor.execute('''
+        CREATE TABLE projects_new (
+            id TEXT PRIMARY KEY,
+            nsfc_id TEXT,
+            title TEXT NOT NULL,
+            approval_number TEXT,
+            application_code TEXT,
+            leader TEXT,
+            unit TEXT,
+            start_date TEXT,
+            end_date TEXT,
+            funding REAL,
+            url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            start_year INTEGER,
+            end_year INTEGER
+        )
+    ''')
+    cursor.execute(f'INSERT INTO projects_new ({columns}) SELECT {columns} FROM projects')
+    cursor.execute('DROP TABLE projects')
+    cursor.execute('ALTER TABLE projects_new RENAME TO projects')
+    logger.info(f"已将 {moved} 个项目的摘要迁移到 project_texts 表")
+
+
+def _backfill_typed_columns(cursor):
+    """为已有数据回填规范化后的经费、日期和年份"""
+    cursor.execute('SELECT id, funding, start_date, end_date FROM projects')
+    rows = cursor.fetchall()
+    
+    updates = []
+    for row in rows:
+        info = normalize_project_info({'funding': row[1], 'start_date': row[2], 'end_date': row[3]})
+        updates.append((info['funding'], info['start_date'], info['end_date'],
+                        info['start_year'], info['end_year'], row[0]))
+    
+    cursor.executemany('''
+        UPDATE projects SET funding=?, start_date=?, end_date=?, start_year=?, end_year=?
+        WHERE id=?
+    ''', updates)
+    logger.info(f"已回填 {len(updates)} 个项目的经费和日期字段")
+
+
+# 统计维度：维度名 -> 分组表达式（基于 projects 表的列）
+STATS_DIMENSIONS = {
+    'total': "''",
+    'unit': "COALESCE({row}unit, '')",
+    'code_section': "COALESCE(substr({row}application_code, 1, 1), '')",
+    'code_prefix': "COALESCE(substr({row}application_code, 1, 3), '')",
+    'start_year': "COALESCE(CAST({row}start_year AS TEXT), '')",
+    'end_year': "COALESCE(CAST({row}end_year AS TEXT), '')",
+}
+
+# 影响统计结果的列
+_STATS_COLUMNS = 'unit, application_code, funding, start_year, end_year'
+
+
+def _stats_add_sql(row):
+    """生成将一行计入各统计维度的SQL语句"""
+    return ''.join(f'''
+            INSERT INTO project_stats (dimension, key, project_count, total_funding)
+            VALUES ('{dimension}', {expr.format(row=row + '.')}, 1, COALESCE({row}.funding, 0))
+            ON CONFLICT (dimension, key) DO UPDATE SET
+                project_count = project_count + 1,
+                total_funding = total_funding + excluded.total_funding;'''
+        for dimension, expr in STATS_DIMENSIONS.items())
+
+
+def _stats_remove_sql(row):
+    """生成将一行从各统计维度中扣除的SQL语句（计数归零的分组随之删除）"""
+    statements = []
+    for dimension, expr in STATS_DIMENSIONS.items():
+        condition = f"dimension = '{dimension}' AND key = {expr.format(row=row + '.')}"
+        statements.append(f'''
+            UPDATE project_stats SET
+                project_count = project_count - 1,
+                total_funding = total_funding - COALESCE({row}.funding, 0)
+            WHERE {condition};''')
+        if dimension != 'total':
+            statements.append(f'''
+            DELETE FROM project_stats WHERE {condition} AND project_count <= 0;''')
+    return ''.join(statements)
+
+
+def _create_stats_triggers(cursor):
+    """创建维护统计汇总表的触发器"""
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_projects_stats_insert AFTER INSERT ON projects
+        BEGIN{_stats_add_sql('NEW')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_projects_stats_delete AFTER DELETE ON projects
+        BEGIN{_stats_remove_sql('OLD')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_projects_stats_update AFTER UPDATE OF {_STATS_COLUMNS} ON projects
+        BEGIN{_stats_remove_sql('OLD')}{_stats_add_sql('NEW')}
+        END
+    ''')
+
+
+def _rebuild_project_stats(cursor):
+    """根据 projects 表全量重建统计汇总表"""
+    cursor.execute('DELETE FROM project_stats')
+    for dimension, expr in STATS_DIMENSIONS.items():
+        key_expr = expr.format(row='')
+        cursor.execute(f'''
+            INSERT INTO project_stats (dimension, key, project_count, total_funding)
+            SELECT '{dimension}', {key_expr}, COUNT(*), COALESCE(SUM(funding), 0)
+            FROM projects GROUP BY {key_expr}
+        ''')
+
+
+@db_timed
+def rebuild_project_stats():
+    """全量重建统计汇总表（用于修复或批量维护后校正）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    _rebuild_project_stats(cursor)
+    
+    conn.commit()
+    conn.close()
+
+
 def get_db_connection():
     """获取数据库连接"""
-    conn = sqlite3.connect('nsfc.db')
+    conn = sqlite3.connect(DATABASE, timeout=DB_BUSY_TIMEOUT, factory=SlowQueryConnection)
     conn.row_factory = sqlite3.Row
     return conn
 
 
-def create_project(project_info):
-    """创建项目"""
-    project_id = str(uuid.uuid4())
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+def _insert_project(cursor, project_id, project_info):
+    """在给定游标上插入项目记录"""
+    project_info = normalize_project_info(project_info)
     cursor.execute('''
         INSERT INTO projects (id, nsfc_id, title, approval_number, application_code, leader, unit,
-                            start_date, end_date, funding, abstract, conclusion_abstract, url)
+                            start_date, end_date, funding, url, start_year, end_year)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
         project_id,
@@ -97,25 +352,20 @@ def create_project(project_info):
         project_info['start_date'],
         project_info['end_date'],
         project_info['funding'],
-        project_info['abstract'],
-        project_info['conclusion_abstract'],
-        project_info['url']
+        project_info['url'],
+        project_info['start_year'],
+        project_info['end_year']
     ))
-    
-    conn.commit()
-    conn.close()
-    return project_id
+    _save_project_texts(cursor, project_id, project_info)
 
 
-def update_project(project_id, project_info):
-    """更新项目"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+def _update_project(cursor, project_id, project_info):
+    """在给定游标上更新项目记录"""
+    project_info = normalize_project_info(project_info)
     cursor.execute('''
         UPDATE projects
         SET nsfc_id=?, title=?, approval_number=?, application_code=?, leader=?, unit=?,
-            start_date=?, end_date=?, funding=?, abstract=?, conclusion_abstract=?, url=?
+            start_date=?, end_date=?, funding=?, url=?, start_year=?, end_year=?
         WHERE id=?
     ''', (
         project_info.get('nsfc_id'),
@@ -127,16 +377,58 @@ def update_project(project_id, project_info):
         project_info['start_date'],
         project_info['end_date'],
         project_info['funding'],
-        project_info['abstract'],
-        project_info['conclusion_abstract'],
         project_info['url'],
+        project_info['start_year'],
+        project_info['end_year'],
         project_id
     ))
+    _save_project_texts(cursor, project_id, project_info)
+
+
+def _save_project_texts(cursor, project_id, project_info):
+    """写入项目摘要，摘要均为空时删除对应记录"""
+    abstract = project_info.get('abstract')
+    conclusion_abstract = project_info.get('conclusion_abstract')
+    if abstract or conclusion_abstract:
+        cursor.execute('''
+            INSERT INTO project_texts (project_id, abstract, conclusion_abstract) VALUES (?, ?, ?)
+            ON CONFLICT (project_id) DO UPDATE SET
+                abstract = excluded.abstract,
+                conclusion_abstract = excluded.conclusion_abstract
+        ''', (project_id, abstract, conclusion_abstract))
+    else:
+        cursor.execute('DELETE FROM project_texts WHERE project_id = ?', (project_id,))
+
+
+@db_timed
+def create_project(project_info):
+    """创建项目"""
+    project_id = str(uuid.uuid4())
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    _insert_project(cursor, project_id, project_info)
+    
+    conn.commit()
+    conn.close()
+    query_cache.invalidate()
+    return project_id
+
+
+@db_timed
+def update_project(project_id, project_info):
+    """更新项目"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    _update_project(cursor, project_id, project_info)
     
     conn.commit()
     conn.close()
+    query_cache.invalidate()
 
 
+@db_timed
 def find_existing_project(url, nsfc_id=None):
     """查找已存在的项目"""
     conn = get_db_connection()
@@ -155,28 +447,134 @@ def find_existing_project(url, nsfc_id=None):
     return existing_project
 
 
-def get_projects_list(unit='', code='', page=1, per_page=20):
-    """获取项目列表"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = 'SELECT * FROM projects WHERE 1=1'
+# 范围筛选条件：参数名 -> SQL 条件
+RANGE_FILTERS = {
+    'funding_min': 'funding >= ?',
+    'funding_max': 'funding <= ?',
+    'start_year_min': 'start_year >= ?',
+    'start_year_max': 'start_year <= ?',
+    'end_year_min': 'end_year >= ?',
+    'end_year_max': 'end_year <= ?',
+}
+
+
+# 项目列表可投影的字段（fields 参数的白名单）
+PROJECT_LIST_FIELDS = PROJECT_COLUMNS + PROJECT_TEXT_FIELDS
+
+# 关联项目摘要
+_PROJECT_TEXTS_JOIN = ' LEFT JOIN project_texts ON project_texts.project_id = projects.id'
+
+
+def _project_select(fields=None):
+    """构建项目查询的 SELECT ... FROM 部分，只有需要摘要时才关联 project_texts 表
+
+    Args:
+        fields: 需要的字段，为空时返回全部字段
+    """
+    fields = [field for field in PROJECT_LIST_FIELDS if not fields or field in fields]
+    columns = ', '.join(
+        f'project_texts.{field}' if field in PROJECT_TEXT_FIELDS else f'projects.{field}'
+        for field in fields
+    )
+    query = f'SELECT {columns} FROM projects'
+    if any(field in PROJECT_TEXT_FIELDS for field in fields):
+        query += _PROJECT_TEXTS_JOIN
+    return query
+
+
+def _build_project_filters(unit='', code='', filters=None):
+    """构建项目查询的 WHERE 子句及参数
+
+    Args:
+        unit: 依托单位（模糊匹配）
+        code: 申请代码（模糊匹配）
+        filters: 范围筛选条件，键见 RANGE_FILTERS
+    """
+    where = ' WHERE 1=1'
     params = []
     
     if unit:
-        query += ' AND unit LIKE ?'
+        where += ' AND unit LIKE ?'
         params.append(f'%{unit}%')
     
     if code:
-        query += ' AND application_code LIKE ?'
+        where += ' AND application_code LIKE ?'
         params.append(f'%{code}%')
     
+    for name, condition in RANGE_FILTERS.items():
+        if filters and filters.get(name) is not None:
+            where += f' AND {condition}'
+            params.append(filters[name])
+    
+    return where, params
+
+
+@db_timed
+def upsert_projects_batch(projects):
+    """在单个事务中批量写入项目，已存在的项目（按ID、NSFC ID、URL或批准号匹配）执行更新
+
+    Args:
+        projects: (行号, 项目信息) 列表
+
+    Returns:
+        tuple: (新增数, 更新数, 错误列表[(行号, 错误信息)])
+    """
+    inserted, updated, errors = 0, 0, []
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        for line_no, project_info in projects:
+            try:
+                existing_id = _match_existing_project_id(cursor, project_info)
+                if existing_id:
+                    _update_project(cursor, existing_id, project_info)
+                    updated += 1
+                else:
+                    _insert_project(cursor, project_info.get('id') or str(uuid.uuid4()), project_info)
+                    inserted += 1
+            except sqlite3.Error as e:
+                errors.append((line_no, f'数据库写入失败: {str(e)}'))
+        
+        conn.commit()
+    finally:
+        conn.close()
+        query_cache.invalidate()
+    
+    return inserted, updated, errors
+
+
+def _match_existing_project_id(cursor, project_info):
+    """按ID、NSFC ID、URL、批准号的顺序查找已存在的项目ID"""
+    for column in ('id', 'nsfc_id', 'url', 'approval_number'):
+        value = project_info.get(column)
+        if value:
+            cursor.execute(f'SELECT id FROM projects WHERE {column} = ? LIMIT 1', (value,))
+            row = cursor.fetchone()
+            if row:
+                return row['id']
+    return None
+
+
+@query_cache.cached
+@db_timed
+def get_projects_list(unit='', code='', page=1, per_page=20, filters=None, fields=None):
+    """获取项目列表
+
+    Args:
+        fields: 返回的字段（须在 PROJECT_LIST_FIELDS 中），为空时返回全部字段
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    where, params = _build_project_filters(unit, code, filters)
+    
     # 获取总数
-    count_query = query.replace('SELECT *', 'SELECT COUNT(*) as count')
-    cursor.execute(count_query, params)
+    cursor.execute('SELECT COUNT(*) as count FROM projects' + where, params)
     total = cursor.fetchone()['count']
     
-    # 分页查询
+    # 分页查询，只读取需要的列
+    query = _project_select(fields) + where
     query += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
     params.extend([per_page, (page - 1) * per_page])
     
@@ -188,12 +586,14 @@ def get_projects_list(unit='', code='', page=1, per_page=20):
     return projects, total
 
 
+@query_cache.cached
+@db_timed
 def get_project_detail(project_id):
     """获取项目详情"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM projects WHERE id = ?', (project_id,))
+    cursor.execute(_project_select() + ' WHERE projects.id = ?', (project_id,))
     project = cursor.fetchone()
     
     if project:
@@ -208,47 +608,100 @@ def get_project_detail(project_id):
 
 
 def delete_project_and_reports(project_id):
-    """删除项目及其关联的报告文件"""
+    """删除项目及其关联的报告记录
+
+    文件由调用方在事务提交后交给后台清理线程删除。
+
+    Returns:
+        list: 需要删除的报告文件路径
+    """
+    _, file_paths = delete_projects_bulk([project_id])
+    return file_paths
+
+
+# 单条 SQL 中 IN 列表的最大参数个数
+_IN_CHUNK_SIZE = 500
+
+
+@db_timed
+def delete_projects_bulk(project_ids):
+    """在单个事务中批量删除项目及其关联的报告记录
+
+    Returns:
+        tuple: (删除的项目数, 需要删除的报告文件路径列表)
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # 获取并删除关联的PDF文件
-    cursor.execute('SELECT file_path FROM reports WHERE project_id = ?', (project_id,))
-    reports = cursor.fetchall()
+    deleted = 0
+    file_paths = []
+    try:
+        for i in range(0, len(project_ids), _IN_CHUNK_SIZE):
+            chunk = project_ids[i:i + _IN_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            
+            cursor.execute(f'SELECT file_path FROM reports WHERE project_id IN ({placeholders})', chunk)
+            file_paths.extend(row['file_path'] for row in cursor.fetchall())
+            
+            cursor.execute(f'DELETE FROM reports WHERE project_id IN ({placeholders})', chunk)
+            cursor.execute(f'DELETE FROM project_texts WHERE project_id IN ({placeholders})', chunk)
+            cursor.execute(f'DELETE FROM projects WHERE id IN ({placeholders})', chunk)
+            deleted += cursor.rowcount
+            _cancel_project_download_tasks(cursor, chunk, placeholders)
+        
+        conn.commit()
+    finally:
+        conn.close()
+        query_cache.invalidate()
     
-    import os
-    for report in reports:
-        file_path = report['file_path']
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                logger.error(f"删除文件失败: {str(e)}")
+    return deleted, file_paths
+
+
+def _insert_report(cursor, project_id, filename, file_path, file_size, content_hash):
+    """在给定游标上插入报告记录，返回报告ID"""
+    report_id = str(uuid.uuid4())
+    cursor.execute('''
+        INSERT INTO reports (id, project_id, filename, file_path, file_size, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (report_id, project_id, filename, file_path, file_size, content_hash))
+    return report_id
+
+
+@db_timed
+def create_report_record(project_id, filename, file_path, file_size, content_hash=None):
+    """创建报告记录
+
+    Args:
+        content_hash: 文件内容的 SHA-256，未提供时读取文件计算
+    """
+    if content_hash is None:
+        content_hash = file_sha256(file_path)
     
-    # 删除数据库记录
-    cursor.execute('DELETE FROM reports WHERE project_id = ?', (project_id,))
-    cursor.execute('DELETE FROM projects WHERE id = ?', (project_id,))
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    report_id = _insert_report(cursor, project_id, filename, file_path, file_size, content_hash)
     
     conn.commit()
     conn.close()
+    query_cache.invalidate()
+    return report_id
 
 
-def create_report_record(project_id, filename, file_path, file_size):
-    """创建报告记录"""
+@db_timed
+def set_report_content_hash(report_id, content_hash):
+    """补写报告文件的内容哈希（用于早期没有哈希的记录）"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    report_id = str(uuid.uuid4())
-    cursor.execute('''
-        INSERT INTO reports (id, project_id, filename, file_path, file_size)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (report_id, project_id, filename, file_path, file_size))
+    cursor.execute('UPDATE reports SET content_hash = ? WHERE id = ?', (content_hash, report_id))
     
     conn.commit()
     conn.close()
-    return report_id
+    query_cache.invalidate()
 
 
+@db_timed
 def get_report_info(report_id):
     """获取报告信息"""
     conn = get_db_connection()
@@ -261,39 +714,68 @@ def get_report_info(report_id):
     return dict(report) if report else None
 
 
+@db_timed
 def delete_report(report_id):
-    """删除报告记录和文件"""
+    """删除报告记录
+
+    Returns:
+        str: 需要删除的报告文件路径，记录不存在时返回None
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute('SELECT file_path FROM reports WHERE id = ?', (report_id,))
     report = cursor.fetchone()
     
+    file_path = None
     if report:
-        import os
         file_path = report['file_path']
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                logger.error(f"删除文件失败: {str(e)}")
-        
         cursor.execute('DELETE FROM reports WHERE id = ?', (report_id,))
         conn.commit()
     
     conn.close()
+    query_cache.invalidate()
+    return file_path
+
+
+@db_timed
+def get_report_ids():
+    """获取所有报告ID"""
+    conn = get_db_connection()
+    try:
+        return [row['id'] for row in conn.execute('SELECT id FROM reports')]
+    finally:
+        conn.close()
+
+
+@db_timed
+def get_report_file_paths():
+    """获取所有报告记录引用的文件路径"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT file_path FROM reports')
+    file_paths = [row['file_path'] for row in cursor.fetchall()]
+    
+    conn.close()
+    return file_paths
+
 
+@db_timed
+def insert_search_history_batch(events):
+    """在单个事务中批量写入搜索历史
 
-def record_search_history(search_type, keyword, results_count):
-    """记录搜索历史"""
+    Args:
+        events: (搜索类型, 关键词, 结果数, 创建时间) 列表
+    """
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO search_history (keyword, search_type, results_count)
-            VALUES (?, ?, ?)
-        ''', (keyword, search_type, results_count))
+        cursor.executemany('''
+            INSERT INTO search_history (search_type, keyword, results_count, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', events)
         
         conn.commit()
         conn.close()
@@ -301,6 +783,32 @@ def record_search_history(search_type, keyword, results_count):
         logger.error(f"记录搜索历史失败: {str(e)}")
 
 
+@db_timed
+def prune_search_history(max_rows=None, max_age_days=None):
+    """按保留策略清理搜索历史（最大行数 / 最长保留天数）"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    deleted = 0
+    if max_age_days:
+        cursor.execute("DELETE FROM search_history WHERE created_at < datetime('now', ?)",
+                       (f'-{int(max_age_days)} days',))
+        deleted += cursor.rowcount
+    
+    if max_rows:
+        cursor.execute('''
+            DELETE FROM search_history WHERE id <= (
+                SELECT id FROM search_history ORDER BY id DESC LIMIT 1 OFFSET ?
+            )
+        ''', (int(max_rows),))
+        deleted += cursor.rowcount
+    
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+@db_timed
 def get_search_history(limit=10):
     """获取搜索历史"""
     conn = get_db_connection()
@@ -318,6 +826,7 @@ def get_search_history(limit=10):
     return history
 
 
+@db_timed
 def clear_search_history():
     """清空搜索历史"""
     conn = get_db_connection()
@@ -328,7 +837,8 @@ def clear_search_history():
     conn.close()
 
 
-def export_projects_to_csv(unit='', code=''):
+@db_timed
+def export_projects_to_csv(unit='', code='', filters=None):
     """导出项目列表为CSV"""
     import csv
     import io
@@ -336,18 +846,8 @@ def export_projects_to_csv(unit='', code=''):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    query = 'SELECT * FROM projects WHERE 1=1'
-    params = []
-    
-    if unit:
-        query += ' AND unit LIKE ?'
-        params.append(f'%{unit}%')
-    
-    if code:
-        query += ' AND application_code LIKE ?'
-        params.append(f'%{code}%')
-    
-    query += ' ORDER BY created_at DESC'
+    where, params = _build_project_filters(unit, code, filters)
+    query = _project_select() + where + ' ORDER BY created_at DESC'
     
     cursor.execute(query, params)
     projects = [dict(row) for row in cursor.fetchall()]
@@ -377,3 +877,342 @@ def export_projects_to_csv(unit='', code=''):
         ])
     
     return output.getvalue().encode('utf-8-sig')
+
+
+def iter_project_batches(unit='', code='', batch_size=1000, filters=None):
+    """按批次流式读取项目记录，避免一次性加载全部数据"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        where, params = _build_project_filters(unit, code, filters)
+        cursor.execute(_project_select() + where + ' ORDER BY created_at DESC', params)
+        
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+# 统计结果排序方式
+STATS_ORDERS = {
+    'count': 'project_count DESC, key',
+    'funding': 'total_funding DESC, key',
+    'key': 'key',
+}
+
+
+@db_timed
+def get_project_stats(dimension, order_by='count', limit=50, key=None):
+    """从统计汇总表读取分组统计结果（不扫描 projects 表）
+
+    Args:
+        dimension: 统计维度，见 STATS_DIMENSIONS
+        order_by: 排序方式，见 STATS_ORDERS
+        limit: 返回的分组数量上限
+        key: 仅返回指定分组
+
+    Returns:
+        list: [{'key', 'project_count', 'total_funding', 'avg_funding'}]
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    query = '''
+        SELECT key, project_count, total_funding,
+               CASE WHEN project_count > 0 THEN total_funding / project_count END AS avg_funding
+        FROM project_stats WHERE dimension = ?
+    '''
+    params = [dimension]
+    
+    if key is not None:
+        query += ' AND key = ?'
+        params.append(key)
+    
+    query += f' ORDER BY {STATS_ORDERS[order_by]} LIMIT ?'
+    params.append(limit)
+    
+    cursor.execute(query, params)
+    stats = [dict(row) for row in cursor.fetchall()]
+    
+    conn.close()
+    return stats
+
+
+# 下载任务被中断（租约过期）后最多重新排队的尝试次数
+DOWNLOAD_TASK_MAX_ATTEMPTS = 3
+# 已结束的下载任务记录（含追踪 JSON）保留的时长（秒）
+DOWNLOAD_TASK_RETENTION = float(os.environ.get('NSFC_TASK_RETENTION_DAYS', '7')) * 86400
+
+
+def _row_to_dict(row):
+    return dict(row) if row else None
+
+
+@db_timed
+def create_download_task(project_id, nsfc_id, project_name):
+    """创建下载任务；项目已有排队或进行中的任务时直接返回该任务
+
+    Returns:
+        dict: 任务记录
+    """
+    conn = get_db_connection()
+    try:
+        # 立即获取写锁，避免多个应用进程为同一项目重复建任务
+        conn.execute('BEGIN IMMEDIATE')
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM download_tasks WHERE project_id = ? AND status IN ('queued', 'running')
+            ORDER BY created_at DESC LIMIT 1
+        ''', (project_id,))
+        task = cursor.fetchone()
+        if task is None:
+            task_id = uuid.uuid4().hex
+            now = time.time()
+            cursor.execute('''
+                INSERT INTO download_tasks (id, project_id, nsfc_id, project_name, status, message, created_at, updated_at)
+                VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)
+            ''', (task_id, project_id, nsfc_id, project_name, '等待下载工作进程...', now, now))
+            cursor.execute('SELECT * FROM download_tasks WHERE id = ?', (task_id,))
+            task = cursor.fetchone()
+        conn.commit()
+        return dict(task)
+    finally:
+        conn.close()
+
+
+@db_timed
+def get_download_task(task_id):
+    """获取下载任务记录"""
+    conn = get_db_connection()
+    try:
+        return _row_to_dict(conn.execute('SELECT * FROM download_tasks WHERE id = ?', (task_id,)).fetchone())
+    finally:
+        conn.close()
+
+
+def _requeue_expired_tasks(cursor, now):
+    """租约过期的任务（工作进程已退出或失联）重新排队，超过尝试次数的标记为失败"""
+    cursor.execute('''
+        UPDATE download_tasks
+        SET status = CASE
+                WHEN cancel_requested THEN 'cancelled'
+                WHEN attempts >= ? THEN 'failed'
+                ELSE 'queued' END,
+            error = CASE
+                WHEN cancel_requested THEN '下载已取消'
+                WHEN attempts >= ? THEN '下载工作进程多次中断'
+                ELSE error END,
+            finished_at = CASE WHEN cancel_requested OR attempts >= ? THEN ? END,
+            worker_id = NULL, lease_expires_at = NULL, updated_at = ?
+        WHERE status = 'running' AND lease_expires_at < ?
+    ''', (DOWNLOAD_TASK_MAX_ATTEMPTS, DOWNLOAD_TASK_MAX_ATTEMPTS, DOWNLOAD_TASK_MAX_ATTEMPTS, now, now, now))
+    if cursor.rowcount:
+        logger.warning(f"[下载任务] {cursor.rowcount} 个任务的租约已过期，已重新排队或结束")
+
+
+@db_timed
+def claim_download_task(worker_id, lease_seconds):
+    """领取最早排队的下载任务并设置租约，没有任务时返回None"""
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        cursor = conn.cursor()
+        now = time.time()
+        _requeue_expired_tasks(cursor, now)
+        cursor.execute('''
+            SELECT id FROM download_tasks WHERE status = 'queued' ORDER BY created_at LIMIT 1
+        ''')
+        row = cursor.fetchone()
+        task = None
+        if row:
+            cursor.execute('''
+                UPDATE download_tasks
+                SET status = 'running', worker_id = ?, lease_expires_at = ?, attempts = attempts + 1,
+                    started_at = COALESCE(started_at, ?), updated_at = ?
+                WHERE id = ?
+            ''', (worker_id, now + lease_seconds, now, now, row['id']))
+            cursor.execute('SELECT * FROM download_tasks WHERE id = ?', (row['id'],))
+            task = dict(cursor.fetchone())
+        conn.commit()
+        return task
+    finally:
+        conn.close()
+
+
+@db_timed
+def renew_download_task_lease(task_id, worker_id, lease_seconds):
+    """续约（心跳）
+
+    Returns:
+        tuple: (租约是否仍属于该工作进程, 是否已请求取消)
+    """
+    conn = get_db_connection()
+    try:
+        now = time.time()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE download_tasks SET lease_expires_at = ?
+            WHERE id = ? AND worker_id = ? AND status = 'running'
+        ''', (now + lease_seconds, task_id, worker_id))
+        owned = cursor.rowcount == 1
+        conn.commit()
+        row = conn.execute('SELECT cancel_requested FROM download_tasks WHERE id = ?', (task_id,)).fetchone()
+        return owned, bool(row and row['cancel_requested'])
+    finally:
+        conn.close()
+
+
+@db_timed
+def update_download_task_progress(task_id, worker_id, progress, message, current_page=0,
+                                  collected_pages=0, total_pages=None):
+    """写入下载进度，任务已不属于该工作进程时返回False"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE download_tasks
+            SET progress = ?, message = ?, current_page = ?, collected_pages = ?, total_pages = ?, updated_at = ?
+            WHERE id = ? AND worker_id = ? AND status = 'running'
+        ''', (progress, message, current_page, collected_pages, total_pages, time.time(), task_id, worker_id))
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+@db_timed
+def finish_download_task(task_id, worker_id, status, message=None, report_id=None, filename=None,
+                         page_count=None, error=None, trace=None):
+    """结束下载任务（status 为 completed / failed / cancelled），任务已不属于该工作进程时返回False"""
+    conn = get_db_connection()
+    try:
+        now = time.time()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE download_tasks
+            SET status = ?, message = COALESCE(?, message), report_id = ?, filename = ?, page_count = ?,
+                error = ?, trace = ?, progress = CASE WHEN ? = 'completed' THEN 100 ELSE progress END,
+                lease_expires_at = NULL, finished_at = ?, updated_at = ?
+            WHERE id = ? AND worker_id = ? AND status = 'running'
+        ''', (status, message, report_id, filename, page_count, error, trace, status, now, now, task_id, worker_id))
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+@db_timed
+def complete_download_task(task_id, worker_id, project_id, filename, file_path, file_size, content_hash,
+                           page_count, message, trace=None):
+    """在一个事务中写入报告记录并把任务标记为完成
+
+    任务已不属于该工作进程、已请求取消或项目已被删除时不写入报告，返回None，文件由调用方删除。
+
+    Returns:
+        str: 报告ID
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 1 FROM download_tasks t JOIN projects p ON p.id = t.project_id
+            WHERE t.id = ? AND t.worker_id = ? AND t.status = 'running' AND NOT t.cancel_requested
+        ''', (task_id, worker_id))
+        if cursor.fetchone() is None:
+            conn.rollback()
+            return None
+        report_id = _insert_report(cursor, project_id, filename, file_path, file_size, content_hash)
+        now = time.time()
+        cursor.execute('''
+            UPDATE download_tasks
+            SET status = 'completed', message = ?, report_id = ?, filename = ?, page_count = ?, trace = ?,
+                progress = 100, lease_expires_at = NULL, finished_at = ?, updated_at = ?
+            WHERE id = ?
+        ''', (message, report_id, filename, page_count, trace, now, now, task_id))
+        conn.commit()
+    finally:
+        conn.close()
+    query_cache.invalidate()
+    return report_id
+
+
+@db_timed
+def release_download_task(task_id, worker_id):
+    """工作进程正常退出时交还未完成的任务，重新排队（不计入尝试次数）"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE download_tasks
+            SET status = 'queued', worker_id = NULL, lease_expires_at = NULL, attempts = attempts - 1,
+                message = '下载工作进程已退出，等待重新领取...', updated_at = ?
+            WHERE id = ? AND worker_id = ? AND status = 'running'
+        ''', (time.time(), task_id, worker_id))
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+@db_timed
+def request_download_task_cancel(task_id, reason='下载已取消'):
+    """请求取消下载任务：排队中的任务直接取消，进行中的由工作进程在下次心跳时停止"""
+    conn = get_db_connection()
+    try:
+        now = time.time()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE download_tasks SET status = 'cancelled', error = ?, finished_at = ?, updated_at = ?
+            WHERE id = ? AND status = 'queued'
+        ''', (reason, now, now, task_id))
+        cursor.execute('''
+            UPDATE download_tasks SET cancel_requested = 1, error = ?, updated_at = ?
+            WHERE id = ? AND status = 'running'
+        ''', (reason, now, task_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _cancel_project_download_tasks(cursor, project_ids, placeholders):
+    """在删除项目的事务中取消这些项目的下载任务：排队中的直接取消，进行中的请求工作进程停止"""
+    now = time.time()
+    cursor.execute(f'''
+        UPDATE download_tasks SET status = 'cancelled', error = '项目已删除', finished_at = ?, updated_at = ?
+        WHERE project_id IN ({placeholders}) AND status = 'queued'
+    ''', (now, now, *project_ids))
+    cursor.execute(f'''
+        UPDATE download_tasks SET cancel_requested = 1, error = '项目已删除', updated_at = ?
+        WHERE project_id IN ({placeholders}) AND status = 'running'
+    ''', (now, *project_ids))
+
+
+@db_timed
+def prune_download_tasks(retention=DOWNLOAD_TASK_RETENTION):
+    """删除结束超过 retention 秒的下载任务记录，返回删除的条数"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            DELETE FROM download_tasks
+            WHERE status IN ('completed', 'failed', 'cancelled') AND finished_at < ?
+        ''', (time.time() - retention,))
+        conn.commit()
+        if cursor.rowcount:
+            logger.info(f"[下载任务] 已清理 {cursor.rowcount} 条过期的任务记录")
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def count_download_tasks(status='queued'):
+    """按状态统计下载任务数"""
+    conn = get_db_connection()
+    try:
+        return conn.execute('SELECT COUNT(*) FROM download_tasks WHERE status = ?', (status,)).fetchone()[0]
+    finally:
+        conn.close()
@@ -0,0 +1,50 @@
+"""字段规范化工具（资助经费、日期等）"""
+import re
+from datetime import date
+
+_FUNDING_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+_DATE_PATTERN = re.compile(r'(\d{4})\s*[-/.年]\s*(\d{1,2})(?:\s*[-/.月]\s*(\d{1,2}))?')
+
+
+def parse_funding(value):
+    """将资助经费解析为浮点数（万元），无法解析时返回None"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _FUNDING_PATTERN.search(str(value).replace(',', ''))
+    return float(match.group(0)) if match else None
+
+
+def parse_date(value):
+    """将日期文本解析为 ISO 格式（YYYY-MM-DD），无法解析时返回None
+
+    支持 2019-01-01、2019/1/1、2019.01、2019年01月01日 等常见写法，缺少日时按1日处理。
+    """
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value.isoformat()
+    match = _DATE_PATTERN.search(str(value))
+    if not match:
+        return None
+    year, month, day = int(match.group(1)), int(match.group(2)), int(match.group(3) or 1)
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def normalize_project_info(project_info):
+    """规范化项目信息：经费转为数值，日期转为 ISO 格式，并补充开始/结束年份
+
+    无法解析的日期保留原文，对应年份为None。返回新的字典。
+    """
+    info = dict(project_info)
+    info['funding'] = parse_funding(info.get('funding'))
+    for field in ('start_date', 'end_date'):
+        iso = parse_date(info.get(field))
+        if iso:
+            info[field] = iso
+        info[field.replace('_date', '_year')] = int(iso[:4]) if iso else None
+    return info
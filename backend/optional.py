@@ -0,0 +1,15 @@
+"""可选依赖和重量级依赖的延迟导入
+
+PyMuPDF、pyarrow 等库导入耗时较长，只在真正用到时才导入，缩短应用启动和工作进程重启的时间。
+"""
+import functools
+import importlib
+
+
+@functools.lru_cache(maxsize=None)
+def optional_import(name):
+    """首次调用时导入模块并缓存，未安装时返回None"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
@@ -0,0 +1,114 @@
+"""报告页面图片的判别：空白页、占位图和重复页
+
+kd.nsfc.cn 在报告最后一页之后有时仍返回图片地址，图片是空白页、占位图或与上一页相同，而不是空 URL 或 404。
+下载器据此丢弃这些页面，连续出现多页时判断报告结束，不再为后续页面发请求、重试和写入 PDF。
+配置的已知占位图（NSFC_PLACEHOLDER_SHA1）出现一次即结束；空白页不在下载之间记录为占位图，报告正文中也可能有同样的空白页。
+"""
+import hashlib
+import os
+
+# 灰度标准差低于该值的页面视为空白页
+BLANK_STDDEV = 2.0
+# 比较前把页面缩小到的尺寸上限（像素）
+THUMBNAIL_SIZE = 256
+# 与上一页缩略图的平均灰度差（0-255）低于该值时视为重复页。
+# 不用 8x8 / 16x16 均值哈希：正文页的版式相同，不同页面的均值哈希几乎一样
+DUPLICATE_MEAN_DIFF = 1.0
+# 连续多少页为空白、占位或重复时判断报告结束
+END_RUN = int(os.environ.get('NSFC_PAGE_END_RUN', '3'))
+
+
+def _parse_set(value, cast):
+    return {cast(item.strip()) for item in value.split(',') if item.strip()}
+
+
+# 已知占位图的 SHA-1 和字节数（逗号分隔）
+PLACEHOLDER_SHA1 = _parse_set(os.environ.get('NSFC_PLACEHOLDER_SHA1', ''), str.lower)
+PLACEHOLDER_SIZES = _parse_set(os.environ.get('NSFC_PLACEHOLDER_SIZES', ''), int)
+
+
+def is_placeholder_size(size):
+    """按字节数（如 HEAD 响应的 Content-Length）判断是否为配置的占位图（NSFC_PLACEHOLDER_SIZES）"""
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        return False
+    return size in PLACEHOLDER_SIZES
+
+
+def thumbnail(img):
+    """灰度缩略图，用于判断空白页和比较相邻页面"""
+    gray = img.convert('L')
+    gray.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return gray
+
+
+def mean_difference(a, b):
+    """两张缩略图的平均灰度差，尺寸不同时返回None"""
+    from PIL import ImageChops, ImageStat
+
+    if a.size != b.size:
+        return None
+    return ImageStat.Stat(ImageChops.difference(a, b)).mean[0]
+
+
+class PageFilter:
+    """一次报告下载中的页面判别
+
+    先用 check_content 按内容判断（不需要解码），未判定时解码后用 check_image 判断。
+    与上一张图片比较的是上一张收到的图片，不论它是否被保留。
+    站点在报告末尾重复返回最后一页时，只丢弃重复的页面，最后一页本身保留；
+    一串重复页的第一张是空白页或已知占位图时，它在判别时已被丢弃。
+    """
+
+    PAGE = 'page'
+    BLANK = 'blank'
+    DUPLICATE = 'duplicate'
+    PLACEHOLDER = 'placeholder'
+
+    def __init__(self, end_run=END_RUN):
+        self.end_run = end_run
+        # 连续被丢弃的页数
+        self.run = 0
+        self._sha1 = None
+        self._last_sha1 = None
+        self._last_thumb = None
+        self.last_kind = None
+
+    @property
+    def ended(self):
+        """是否判断报告已结束"""
+        return self.last_kind == self.PLACEHOLDER or self.run >= self.end_run
+
+    def check_content(self, content):
+        """按内容判断，返回 PLACEHOLDER / DUPLICATE，无法判定时返回None"""
+        self._sha1 = hashlib.sha1(content).hexdigest()
+        if self._sha1 in PLACEHOLDER_SHA1:
+            return self._record(self.PLACEHOLDER, None)
+        if self._sha1 == self._last_sha1:
+            return self._record(self.DUPLICATE, self._last_thumb)
+        return None
+
+    def check_image(self, img):
+        """check_content 未判定时，按解码后的图片判断，返回 PAGE / BLANK / DUPLICATE"""
+        from PIL import ImageStat
+
+        thumb = thumbnail(img)
+        difference = mean_difference(thumb, self._last_thumb) if self._last_thumb is not None else None
+        if ImageStat.Stat(thumb).stddev[0] < BLANK_STDDEV:
+            kind = self.BLANK
+        elif difference is not None and difference < DUPLICATE_MEAN_DIFF:
+            kind = self.DUPLICATE
+        else:
+            kind = self.PAGE
+        return self._record(kind, thumb)
+
+    def _record(self, kind, thumb):
+        if kind == self.PAGE:
+            self.run = 0
+        else:
+            self.run += 1
+        self._last_sha1 = self._sha1
+        self._last_thumb = thumb
+        self.last_kind = kind
+        return kind
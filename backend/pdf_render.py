@@ -0,0 +1,126 @@
+"""PDF 页面渲染与磁盘缓存
+
+按页面、分辨率渲染报告页面为图片，结果缓存在 cache/pages/ 中。缓存总大小超过上限时，
+按最近访问时间淘汰最旧的文件（命中时会刷新文件的修改时间）。
+"""
+import logging
+import os
+import threading
+
+from optional import optional_import
+from fileutils import file_fingerprint, atomic_write
+
+logger = logging.getLogger(__name__)
+
+# 磁盘缓存大小上限（字节）
+RENDER_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# 默认分辨率、分辨率和宽度上限
+DEFAULT_DPI = 96
+MAX_DPI = 300
+MAX_WIDTH = 4000
+# 缩略图默认宽度（像素）
+THUMBNAIL_WIDTH = 240
+# JPEG 质量
+JPEG_QUALITY = 80
+
+# 支持的输出格式：格式名 -> (MIME类型, PyMuPDF 输出格式)
+RENDER_FORMATS = {
+    'png': ('image/png', 'png'),
+    'jpeg': ('image/jpeg', 'jpg'),
+}
+
+
+class PageRenderCache:
+    """页面渲染结果的磁盘 LRU 缓存"""
+
+    def __init__(self, cache_dir=None, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._total_bytes = None
+        self._lock = threading.Lock()
+
+    def configure(self, cache_dir):
+        """设置磁盘缓存目录"""
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = None
+
+    def render(self, report_id, file_path, page_number, dpi=None, width=None, fmt='png'):
+        """渲染指定页面（页码从1开始）
+
+        Args:
+            dpi: 渲染分辨率，与 width 二选一
+            width: 输出图片宽度（像素），优先于 dpi
+
+        Returns:
+            tuple: (图片字节, 缓存键)；页码超出范围时抛出 IndexError
+        """
+        size_key = f'w{width}' if width else f'd{dpi or DEFAULT_DPI}'
+        key = f'{report_id}-{file_fingerprint(file_path)}-p{page_number}-{size_key}.{fmt}'
+        path = os.path.join(self.cache_dir, key)
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data, key
+        except FileNotFoundError:
+            pass
+
+        data = self._render_page(file_path, page_number, dpi, width, fmt)
+        try:
+            atomic_write(path, data)
+            self._account(len(data))
+        except OSError as e:
+            logger.warning(f"写入页面缓存失败: {str(e)}")
+        return data, key
+
+    def _render_page(self, file_path, page_number, dpi, width, fmt):
+        """使用 PyMuPDF 渲染页面"""
+        fitz = optional_import('fitz')
+        with fitz.open(file_path) as doc:
+            if page_number < 1 or page_number > doc.page_count:
+                raise IndexError(f'页码超出范围（共 {doc.page_count} 页）')
+            page = doc.load_page(page_number - 1)
+            zoom = width / page.rect.width if width else (dpi or DEFAULT_DPI) / 72
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            output = RENDER_FORMATS[fmt][1]
+            if output == 'jpg':
+                return pixmap.tobytes(output, jpg_quality=JPEG_QUALITY)
+            return pixmap.tobytes(output)
+
+    def _account(self, added_bytes):
+        """累计缓存大小，超过上限时淘汰最久未访问的文件"""
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(entry.stat().st_size for entry in self._entries())
+            else:
+                self._total_bytes += added_bytes
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.cache_dir)
+                if entry.is_file() and not entry.name.endswith('.tmp')]
+
+    def _evict(self):
+        """淘汰到缓存上限的 90%"""
+        target = self.max_bytes * 0.9
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in entries)
+        removed = 0
+        for entry in entries:
+            if total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+        self._total_bytes = total
+        logger.info(f"页面缓存淘汰 {removed} 个文件，当前 {total / 1024 / 1024:.1f} MB")
+
+
+page_render_cache = PageRenderCache()
@@ -0,0 +1,118 @@
+"""PDF 文本提取缓存
+
+每份报告的逐页文本只提取一次，缓存在内存（LRU）和磁盘（cache/text/）中，
+文件大小或修改时间变化后自动重新提取。
+"""
+import json
+import logging
+import os
+
+from cache import QueryCache
+from optional import optional_import
+from fileutils import file_fingerprint, atomic_write
+
+logger = logging.getLogger(__name__)
+
+# 内存中缓存的报告数
+TEXT_MEMORY_CACHE_SIZE = 32
+# 页面之间的分隔符
+PAGE_SEPARATOR = "\n\n--- 页面分隔 ---\n\n"
+
+
+class PdfTextCache:
+    """报告逐页文本的两级缓存"""
+
+    def __init__(self, cache_dir=None, memory_size=TEXT_MEMORY_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.memory = QueryCache(maxsize=memory_size, ttl=float('inf'))
+
+    def configure(self, cache_dir):
+        """设置磁盘缓存目录"""
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_pages(self, report_id, file_path):
+        """获取报告的逐页文本列表"""
+        fingerprint = file_fingerprint(file_path)
+        key = (report_id, fingerprint)
+
+        hit, pages = self.memory.get(key)
+        if hit:
+            return pages
+
+        generation = self.memory.generation
+        pages = self._load(report_id, fingerprint)
+        if pages is None:
+            pages = self._extract(file_path)
+            self._store(report_id, fingerprint, pages)
+
+        self.memory.set(key, pages, generation)
+        return pages
+
+    def discard(self, report_id):
+        """删除报告的磁盘缓存"""
+        path = self._cache_path(report_id)
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"删除文本缓存失败: {str(e)}")
+
+    def prune(self, report_ids):
+        """删除不在 report_ids 中的报告（已删除的报告）的磁盘缓存，返回删除的文件数"""
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return 0
+        known = set(report_ids)
+        removed = 0
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                report_id, ext = os.path.splitext(entry.name)
+                if ext != '.json' or report_id in known:
+                    continue
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"删除文本缓存失败: {str(e)}")
+        if removed:
+            logger.info(f"已清理 {removed} 个已删除报告的文本缓存")
+        return removed
+
+    def _cache_path(self, report_id):
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f'{report_id}.json')
+
+    def _load(self, report_id, fingerprint):
+        """读取磁盘缓存，指纹不匹配时返回None"""
+        path = self._cache_path(report_id)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get('fingerprint') != fingerprint:
+            return None
+        return cached.get('pages')
+
+    def _store(self, report_id, fingerprint, pages):
+        """写入磁盘缓存"""
+        path = self._cache_path(report_id)
+        if not path:
+            return
+        try:
+            data = json.dumps({'fingerprint': fingerprint, 'pages': pages}, ensure_ascii=False)
+            atomic_write(path, data.encode('utf-8'))
+        except OSError as e:
+            logger.warning(f"写入文本缓存失败: {str(e)}")
+
+    def _extract(self, file_path):
+        """提取所有页面的文本"""
+        fitz = optional_import('fitz')
+        with fitz.open(file_path) as doc:
+            return [page.get_text() for page in doc]
+
+
+pdf_text_cache = PdfTextCache()
@@ -0,0 +1,266 @@
+"""按主机的请求节流调度
+
+进程内所有下载和抓取对同一主机发出的请求都先从该主机的调度器取得许可，不再由各个下载器各自按固定延时休眠：
+并发下载再多，对 kd.nsfc.cn 的总请求速率也不超过调度器当前允许的速率。
+
+- 公平：多个任务同时等待时按任务轮流发放许可，每个任务获得相近的份额；
+- 自适应（AIMD）：请求成功时速率线性增加（直到 NSFC_HOST_MAX_RATE），收到 429 时速率减半并遵守 Retry-After，
+  总吞吐维持在主机能承受的最高速率附近；
+- 跨进程：设置 NSFC_POLITENESS_DIR 后，同一主机的速率状态保存在该目录下的文件中并通过文件锁共享，
+  同一台机器上的应用进程和下载工作进程合计受限。
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from metrics import POLITENESS_RATE, POLITENESS_THROTTLED, POLITENESS_WAIT_SECONDS
+from optional import optional_import
+
+logger = logging.getLogger(__name__)
+
+# 每个主机的初始请求速率（次/秒），0 表示不限速
+HOST_RATE = float(os.environ.get('NSFC_HOST_RATE', '1'))
+# AIMD 调整的速率上下限（次/秒）
+HOST_MIN_RATE = float(os.environ.get('NSFC_HOST_MIN_RATE', '0.1'))
+HOST_MAX_RATE = float(os.environ.get('NSFC_HOST_MAX_RATE', '2'))
+# 每次成功请求增加的速率（次/秒）
+RATE_INCREASE_STEP = 0.02
+# 收到 429 时速率乘以该系数
+RATE_DECREASE_FACTOR = 0.5
+# 请求间隔的随机抖动比例（±）
+INTERVAL_JITTER = 0.25
+# 跨进程共享状态的目录，为空时只在进程内调度
+POLITENESS_DIR = os.environ.get('NSFC_POLITENESS_DIR', '')
+# 等待许可时检查取消的最长间隔（秒）
+_WAIT_SLICE = 0.5
+# 到点重试时附加的随机延迟（秒）：跨进程共享时各进程同时醒来，由它随机决定谁先取得许可，
+# 否则刚取得许可、立即再次等待的进程总是先到
+_WAKE_JITTER = 0.02
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），返回秒数，无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateState:
+    """一个主机的速率状态：当前速率、下一次可发请求的时间和因 429 暂停到的时间
+
+    时间使用 time.time()，跨进程共享时各进程的取值可比较。
+    """
+
+    FIELDS = ('rate', 'next_at', 'blocked_until', 'decreased_at')
+
+    def __init__(self, rate, min_rate, max_rate):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.next_at = 0.0
+        self.blocked_until = 0.0
+        self.decreased_at = 0.0
+
+    def try_reserve(self, now):
+        """到达可发请求的时间时占用一个许可并返回 0，否则返回还需等待的秒数"""
+        ready = max(self.next_at, self.blocked_until)
+        if now < ready:
+            return ready - now
+        interval = random.uniform(1 - INTERVAL_JITTER, 1 + INTERVAL_JITTER) / self.rate
+        self.next_at = now + interval
+        return 0.0
+
+    def on_success(self):
+        """线性增加速率"""
+        self.rate = min(self.max_rate, self.rate + RATE_INCREASE_STEP)
+        return self.rate
+
+    def on_throttle(self, now, retry_after=None):
+        """速率减半（同一批在途请求的 429 只减一次）并暂停到 Retry-After 之后"""
+        if now - self.decreased_at >= 1 / self.rate:
+            self.rate = max(self.min_rate, self.rate * RATE_DECREASE_FACTOR)
+            self.decreased_at = now
+        pause = retry_after if retry_after is not None else 1 / self.rate
+        self.blocked_until = max(self.blocked_until, now + pause)
+        return self.rate
+
+
+class SharedRateState(RateState):
+    """保存在文件中的速率状态，每次读写都在文件锁内进行，供同一台机器上的多个进程共享"""
+
+    def __init__(self, path, rate, min_rate, max_rate):
+        super().__init__(rate, min_rate, max_rate)
+        self.path = path
+
+    @contextmanager
+    def _locked(self):
+        fcntl = optional_import('fcntl')
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.read(fd, 4096)
+            if raw:
+                try:
+                    saved = json.loads(raw)
+                    for field in self.FIELDS:
+                        setattr(self, field, float(saved[field]))
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"[节流] 状态文件损坏，重新初始化: {self.path}")
+            yield
+            data = json.dumps({field: getattr(self, field) for field in self.FIELDS}).encode()
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, data, 0)
+        finally:
+            os.close(fd)  # 关闭时释放锁
+
+    def try_reserve(self, now):
+        with self._locked():
+            return super().try_reserve(now)
+
+    def on_success(self):
+        with self._locked():
+            return super().on_success()
+
+    def on_throttle(self, now, retry_after=None):
+        with self._locked():
+            return super().on_throttle(now, retry_after)
+
+
+class HostScheduler:
+    """一个主机的请求调度器
+
+    等待中的任务排成一个环，只有环首的任务可以取得许可，取得后移到环尾，其他任务依次轮到。
+    同一任务同时有多个请求等待时，它们共用该任务的一个位置。
+    """
+
+    def __init__(self, host, state):
+        self.host = host
+        self.state = state
+        self._cond = threading.Condition()
+        # 任务标识 -> 该任务等待中的请求数，顺序即轮转顺序
+        self._waiting = OrderedDict()
+        POLITENESS_RATE.set(state.rate, host=host)
+
+    @property
+    def rate(self):
+        return self.state.rate
+
+    def acquire(self, job_key, cancel_event=None):
+        """等待轮到 job_key 且主机速率允许时返回，返回等待的秒数
+
+        cancel_event 被设置时停止等待并返回None，由调用方决定如何处理取消。
+        """
+        start = time.monotonic()
+        with self._cond:
+            self._waiting[job_key] = self._waiting.get(job_key, 0) + 1
+            granted = False
+            try:
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return None
+                    timeout = _WAIT_SLICE
+                    if next(iter(self._waiting)) == job_key:
+                        wait = self.state.try_reserve(time.time())
+                        if wait <= 0:
+                            granted = True
+                            break
+                        timeout = min(wait + random.uniform(0, _WAKE_JITTER), _WAIT_SLICE)
+                    self._cond.wait(timeout)
+            finally:
+                remaining = self._waiting.pop(job_key) - 1
+                if remaining:
+                    # 该任务还有请求在等待，排到环尾
+                    self._waiting[job_key] = remaining
+                self._cond.notify_all()
+        waited = time.monotonic() - start
+        if granted:
+            POLITENESS_WAIT_SECONDS.observe(waited, host=self.host)
+        return waited
+
+    def record_success(self):
+        """请求成功（非 429 / 5xx），线性提高速率"""
+        with self._cond:
+            rate = self.state.on_success()
+        POLITENESS_RATE.set(rate, host=self.host)
+
+    def record_throttle(self, retry_after=None):
+        """收到 429，降低速率并暂停"""
+        with self._cond:
+            previous = self.state.rate
+            rate = self.state.on_throttle(time.time(), retry_after)
+            self._cond.notify_all()
+        POLITENESS_THROTTLED.inc(host=self.host)
+        POLITENESS_RATE.set(rate, host=self.host)
+        if rate < previous:
+            logger.warning(f"[节流] {self.host} 返回 429，请求速率降为 {rate:.2f} 次/秒"
+                           f"{f'，暂停 {retry_after:.0f} 秒' if retry_after else ''}")
+
+
+class UnlimitedScheduler:
+    """不限速的调度器（NSFC_HOST_RATE=0）"""
+
+    rate = 0
+
+    def __init__(self, host):
+        self.host = host
+
+    def acquire(self, job_key, cancel_event=None):
+        return 0.0
+
+    def record_success(self):
+        pass
+
+    def record_throttle(self, retry_after=None):
+        POLITENESS_THROTTLED.inc(host=self.host)
+
+
+class PolitenessRegistry:
+    """按主机名创建和缓存调度器"""
+
+    def __init__(self, rate=HOST_RATE, min_rate=HOST_MIN_RATE, max_rate=HOST_MAX_RATE, shared_dir=POLITENESS_DIR):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.shared_dir = shared_dir
+        self._schedulers = {}
+        self._lock = threading.Lock()
+
+    def _create(self, host):
+        if self.rate <= 0:
+            return UnlimitedScheduler(host)
+        rate = min(max(self.rate, self.min_rate), self.max_rate)
+        if self.shared_dir:
+            if optional_import('fcntl') is None:
+                logger.warning("[节流] 当前平台不支持文件锁，跨进程节流退化为进程内节流")
+            else:
+                os.makedirs(self.shared_dir, exist_ok=True)
+                path = os.path.join(self.shared_dir, f"{host.replace(':', '_')}.json")
+                return HostScheduler(host, SharedRateState(path, rate, self.min_rate, self.max_rate))
+        return HostScheduler(host, RateState(rate, self.min_rate, self.max_rate))
+
+    def for_url(self, url):
+        """返回 url 所在主机的调度器"""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            scheduler = self._schedulers.get(host)
+            if scheduler is None:
+                scheduler = self._schedulers[host] = self._create(host)
+            return scheduler
+
+
+# 进程内共享的调度器注册表
+politeness = PolitenessRegistry()
@@ -0,0 +1,201 @@
+"""请求性能剖析与慢查询日志
+
+剖析默认关闭：设置 NSFC_PROFILE_ENABLED=1 后，按采样率或带 X-Profile 请求头的请求使用 cProfile 剖析，
+结果（pstats 格式，可用 snakeviz 等工具查看）写入大小受限的 profiles/ 目录，可通过接口列出和下载。
+慢查询日志：models 的数据库连接使用 SlowQueryConnection，执行时间超过阈值的 SQL 连同
+EXPLAIN QUERY PLAN 一起写入日志，并保留最近的记录供接口查看。
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+# 是否启用请求剖析
+PROFILE_ENABLED = os.environ.get('NSFC_PROFILE_ENABLED', '') in ('1', 'true', 'yes')
+# 随机剖析的请求比例（0~1）
+PROFILE_SAMPLE_RATE = float(os.environ.get('NSFC_PROFILE_SAMPLE_RATE', '0'))
+# 带此请求头（任意非空值）的请求总会被剖析
+PROFILE_HEADER = 'X-Profile'
+# 剖析结果目录的上限
+PROFILE_MAX_FILES = int(os.environ.get('NSFC_PROFILE_MAX_FILES', '100'))
+PROFILE_MAX_BYTES = int(os.environ.get('NSFC_PROFILE_MAX_BYTES', str(200 * 1024 * 1024)))
+# 慢查询阈值（毫秒），0 表示关闭
+SLOW_QUERY_MS = float(os.environ.get('NSFC_SLOW_QUERY_MS', '200'))
+# 保留的慢查询记录数
+SLOW_QUERY_LOG_SIZE = 200
+
+_PROFILE_NAME = re.compile(r'^[\w.-]+\.prof$')
+# 可以执行 EXPLAIN QUERY PLAN 的语句类型
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH')
+
+
+class ProfileStore:
+    """剖析结果目录：按修改时间保留最新的文件"""
+
+    def __init__(self, directory=None, max_files=PROFILE_MAX_FILES, max_bytes=PROFILE_MAX_BYTES):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def configure(self, directory):
+        """设置剖析结果目录"""
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, profiler, method, route, elapsed):
+        """保存剖析结果，返回文件名"""
+        slug = re.sub(r'[^\w]+', '_', route).strip('_') or 'root'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{method}-{slug}-{int(elapsed * 1000)}ms.prof"
+        profiler.dump_stats(os.path.join(self.directory, name))
+        self._prune()
+        return name
+
+    def list(self):
+        """列出剖析结果（按时间倒序）"""
+        entries = []
+        for entry in self._entries():
+            stat = entry.stat()
+            entries.append({'name': entry.name, 'size': stat.st_size, 'created_at': stat.st_mtime})
+        return sorted(entries, key=lambda item: item['created_at'], reverse=True)
+
+    def path(self, name):
+        """获取剖析结果文件路径，名称无效或不存在时返回None"""
+        if not self.directory or not _PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def summary(self, name, sort='cumulative', limit=50):
+        """以文本形式输出剖析结果中耗时最多的函数"""
+        output = io.StringIO()
+        stats = pstats.Stats(self.path(name), stream=output)
+        stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def _entries(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        return [entry for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith('.prof')]
+
+    def _prune(self):
+        """删除超出数量或总大小上限的最旧文件"""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime, reverse=True)
+            total = 0
+            for i, entry in enumerate(entries):
+                total += entry.stat().st_size
+                if i >= self.max_files or total > self.max_bytes:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+
+profile_store = ProfileStore()
+
+
+def should_profile():
+    """当前请求是否需要剖析"""
+    if not PROFILE_ENABLED:
+        return False
+    if request.headers.get(PROFILE_HEADER):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def init_profiling(app, directory):
+    """注册请求剖析中间件（流式响应只剖析到开始输出）"""
+    profile_store.configure(directory)
+
+    @app.before_request
+    def _start_profiler():
+        if should_profile():
+            profiler = cProfile.Profile()
+            g.profile = (profiler, time.perf_counter())
+            profiler.enable()
+
+    @app.after_request
+    def _save_profile(response):
+        state = g.pop('profile', None)
+        if state is None:
+            return response
+        profiler, start = state
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else request.path
+        try:
+            name = profile_store.save(profiler, request.method, route, elapsed)
+            response.headers['X-Profile-Id'] = name
+        except OSError as e:
+            logger.warning(f"保存剖析结果失败: {str(e)}")
+        return response
+
+
+# 最近的慢查询记录
+slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+
+def _record_slow_query(connection, sql, params, elapsed):
+    """记录慢查询及其查询计划"""
+    plan = None
+    words = sql.split(None, 1)
+    if words and words[0].upper() in _EXPLAINABLE:
+        try:
+            # 使用普通游标，避免查询计划本身再被记录
+            rows = sqlite3.Cursor(connection).execute('EXPLAIN QUERY PLAN ' + sql, params or ()).fetchall()
+            plan = [row[-1] for row in rows]
+        except sqlite3.Error:
+            plan = None
+
+    statement = ' '.join(sql.split())
+    elapsed_ms = round(elapsed * 1000, 2)
+    slow_queries.append({
+        'sql': statement,
+        'params': repr(params)[:200] if params else None,
+        'elapsed_ms': elapsed_ms,
+        'plan': plan,
+        'at': time.time(),
+    })
+    logger.warning("慢查询 %.1fms: %.500s | 查询计划: %s", elapsed_ms, statement, '; '.join(plan or []))
+
+
+class SlowQueryCursor(sqlite3.Cursor):
+    """记录执行时间超过阈值的语句"""
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        result = super().execute(sql, params)
+        elapsed = time.perf_counter() - start
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            _record_slow_query(self.connection, sql, params, elapsed)
+        return result
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        result = super().executemany(sql, seq_of_params)
+        elapsed = time.perf_counter() - start
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            _record_slow_query(self.connection, sql, None, elapsed)
+        return result
+
+
+class SlowQueryConnection(sqlite3.Connection):
+    """游标默认为 SlowQueryCursor 的连接（Connection.execute 也经过该游标）"""
+
+    def cursor(self, factory=None):
+        if SLOW_QUERY_MS <= 0:
+            return super().cursor(factory or sqlite3.Cursor)
+        return super().cursor(factory or SlowQueryCursor)
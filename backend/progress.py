@@ -0,0 +1,116 @@
+"""下载进度事件代理
+
+每个下载任务对应一个进度通道，通道保存有界的事件日志。SSE 订阅者在条件变量上等待新事件，
+支持多个订阅者同时观看，并可通过 Last-Event-ID 在断线重连后补发错过的事件。
+"""
+import json
+import threading
+import time
+from collections import deque
+
+# 每个通道保留的事件数
+PROGRESS_LOG_SIZE = 500
+# 已结束的通道保留时间（秒），期间仍可重连回放
+PROGRESS_RETENTION = 300
+# 无新事件时发送心跳的间隔（秒）
+HEARTBEAT_INTERVAL = 15
+# 建议客户端断线后的重连间隔（毫秒）
+RECONNECT_DELAY_MS = 3000
+
+
+class ProgressChannel:
+    """单个下载任务的进度事件通道"""
+
+    def __init__(self, channel_id, max_events=PROGRESS_LOG_SIZE):
+        self.id = channel_id
+        self.events = deque(maxlen=max_events)
+        self.closed = False
+        self.closed_at = None
+        self._next_seq = 1
+        self._condition = threading.Condition()
+
+    def publish(self, data):
+        """发布事件，返回事件序号"""
+        with self._condition:
+            seq = self._next_seq
+            self._next_seq += 1
+            self.events.append((seq, data))
+            self._condition.notify_all()
+            return seq
+
+    def close(self):
+        """结束通道，唤醒所有订阅者"""
+        with self._condition:
+            self.closed = True
+            self.closed_at = time.monotonic()
+            self._condition.notify_all()
+
+    def wait_events(self, after_seq, timeout):
+        """返回序号大于 after_seq 的事件，没有新事件时最多等待 timeout 秒"""
+        with self._condition:
+            if not self._has_events_after(after_seq) and not self.closed:
+                self._condition.wait(timeout)
+            return [event for event in self.events if event[0] > after_seq]
+
+    def _has_events_after(self, after_seq):
+        return bool(self.events) and self.events[-1][0] > after_seq
+
+
+class ProgressBroker:
+    """进度通道的注册表与 SSE 流生成"""
+
+    def __init__(self, retention=PROGRESS_RETENTION):
+        self.retention = retention
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def create(self, channel_id):
+        """创建进度通道"""
+        with self._lock:
+            self._expire()
+            channel = ProgressChannel(channel_id)
+            self._channels[channel_id] = channel
+            return channel
+
+    def get(self, channel_id):
+        """获取进度通道，不存在或已过期时返回None"""
+        with self._lock:
+            self._expire()
+            return self._channels.get(channel_id)
+
+    def _expire(self):
+        """移除结束超过保留时间的通道"""
+        now = time.monotonic()
+        expired = [channel_id for channel_id, channel in self._channels.items()
+                   if channel.closed and now - channel.closed_at > self.retention]
+        for channel_id in expired:
+            del self._channels[channel_id]
+
+    def stream(self, channel, last_event_id=None):
+        """生成 SSE 事件流：先回放 last_event_id 之后的事件，再实时推送，空闲时发送心跳"""
+        after_seq = parse_event_id(last_event_id, channel.id)
+        yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+
+        while True:
+            events = channel.wait_events(after_seq, HEARTBEAT_INTERVAL)
+            for seq, data in events:
+                after_seq = seq
+                yield f"id: {channel.id}:{seq}\ndata: {json.dumps(data)}\n\n"
+
+            if not events:
+                if channel.closed:
+                    break
+                yield ": heartbeat\n\n"
+
+
+def parse_event_id(last_event_id, channel_id):
+    """解析 Last-Event-ID（格式为 "<通道ID>:<序号>"），属于其他通道时从头回放"""
+    if not last_event_id or ':' not in last_event_id:
+        return 0
+    event_channel, _, seq = last_event_id.rpartition(':')
+    if event_channel != channel_id or not seq.isdigit():
+        return 0
+    return int(seq)
+
+
+progress_broker = ProgressBroker()
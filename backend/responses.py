@@ -0,0 +1,92 @@
+"""JSON 响应的序列化与压缩
+
+安装了 orjson 时使用其替代标准库 json 序列化响应；超过阈值的 JSON 响应按客户端的
+Accept-Encoding 进行 brotli（需安装 brotli）或 gzip 压缩。
+"""
+import gzip
+import logging
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 小于此大小（字节）的响应不压缩
+COMPRESS_MIN_SIZE = 1024
+# 压缩的响应类型
+COMPRESS_MIMETYPES = {'application/json'}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """使用 orjson 序列化，不支持的类型交给 DefaultJSONProvider.default 处理"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+        except TypeError:
+            # orjson 不支持的情况（如超过64位的整数）回退到标准库
+            return super().dumps(obj, **kwargs)
+
+
+def choose_encoding(accept_encoding):
+    """根据 Accept-Encoding 选择压缩方式，优先 brotli"""
+    if brotli is not None and 'br' in accept_encoding:
+        return 'br'
+    if 'gzip' in accept_encoding:
+        return 'gzip'
+    return None
+
+
+def compress_response(response, accept_encoding):
+    """压缩较大的 JSON 响应"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200 or response.status_code >= 300
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    if encoding == 'br':
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_responses(app):
+    """配置 JSON 序列化与响应压缩"""
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    else:
+        logger.info("未安装 orjson，使用标准库 json 序列化响应")
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, request.headers.get('Accept-Encoding', ''))
@@ -5,53 +5,262 @@ import os
 import re
 import time
 import uuid
+import hashlib
 import logging
-import json
-import queue
-import threading
+import io
 from datetime import datetime
 from werkzeug.utils import secure_filename
-try:
-    import fitz  # PyPDF2
-except ImportError:
-    fitz = None
-from io import BytesIO
-from PIL import Image
+from urllib.parse import quote
 
 from models import (
     init_db, get_db_connection, create_project, update_project, 
     find_existing_project, get_projects_list, get_project_detail,
-    delete_project_and_reports, create_report_record, get_report_info,
-    delete_report, record_search_history, get_search_history,
-    clear_search_history, export_projects_to_csv
+    delete_project_and_reports, delete_projects_bulk, create_report_record, get_report_info,
+    delete_report, get_search_history, set_report_content_hash,
+    clear_search_history, export_projects_to_csv, RANGE_FILTERS,
+    get_project_stats, STATS_DIMENSIONS, STATS_ORDERS, PROJECT_LIST_FIELDS, count_download_tasks,
+    prune_download_tasks, get_report_ids
 )
+from responses import init_responses
+from history import record_search_history, search_history_writer
+from file_reaper import file_reaper
+from cache import query_cache
+from exporter import EXPORT_FORMATS, ARROW_FORMATS, export_projects, arrow_available
+from importer import IMPORT_FORMATS, detect_format, import_projects
 from downloader import NsfcReportDownloader
+from jobs import start_download_job, get_download_job, find_project_job, active_job_count
+from metrics import registry as metrics_registry, init_metrics, QUEUE_DEPTH
+from profiling import init_profiling, profile_store, slow_queries, PROFILE_ENABLED, SLOW_QUERY_MS
+from progress import progress_broker
+from pdf_text import pdf_text_cache, PAGE_SEPARATOR
+from optional import optional_import
+from fileutils import file_sha256, copy_stream
+from chunked_upload import chunked_uploads, UploadError, CHUNK_SIZE
+from pdf_render import (
+    page_render_cache, RENDER_FORMATS, DEFAULT_DPI, MAX_DPI, MAX_WIDTH, THUMBNAIL_WIDTH
+)
 from scraper import extract_project_info
 
 logger = logging.getLogger(__name__)
 
 # 配置
+# 数据目录（uploads / cache / profiles 的上级目录），默认为项目根目录
+DATA_DIR = os.environ.get('NSFC_DATA_DIR', '')
 UPLOAD_FOLDER = 'uploads'
+CACHE_FOLDER = 'cache'
+PROFILE_FOLDER = 'profiles'
 ALLOWED_EXTENSIONS = {'pdf'}
 MAX_CONTENT_LENGTH = 1000 * 1024 * 1024  # 1000MB
 
+# 报告文件的浏览器缓存时间（秒）；报告文件创建后内容不再变化
+REPORT_CACHE_MAX_AGE = 365 * 24 * 3600
+# 由前端 Web 服务器发送文件：'' 不启用，'x-accel'（nginx X-Accel-Redirect），'x-sendfile'（Apache/lighttpd）
+SENDFILE_MODE = os.environ.get('NSFC_SENDFILE_MODE', '')
+# X-Accel-Redirect 模式下 uploads 目录对应的 nginx internal location
+X_ACCEL_PREFIX = os.environ.get('NSFC_X_ACCEL_PREFIX', '/protected-uploads/')
+
 
 def allowed_file(filename):
     """检查文件类型"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def parse_range_filters(args):
+    """解析经费、起止年份的范围筛选参数
+
+    支持 funding_min/funding_max、start_year_min/start_year_max、end_year_min/end_year_max，
+    以及 start_year/end_year 表示精确年份。
+
+    Returns:
+        tuple: (筛选条件字典, 错误信息)
+    """
+    filters = {}
+    for year_field in ('start_year', 'end_year'):
+        if args.get(year_field):
+            filters[f'{year_field}_min'] = args.get(year_field)
+            filters[f'{year_field}_max'] = args.get(year_field)
+    
+    for name in RANGE_FILTERS:
+        if args.get(name):
+            filters[name] = args.get(name)
+    
+    for name, value in filters.items():
+        try:
+            filters[name] = float(value) if name.startswith('funding') else int(value)
+        except ValueError:
+            return None, f'参数 {name} 格式错误: {value}'
+    
+    return filters, None
+
+
+def parse_fields(value):
+    """解析 fields 参数（逗号分隔的字段名），始终包含 id
+
+    Returns:
+        tuple: (按 PROJECT_LIST_FIELDS 顺序排列的字段元组，未指定时为None, 错误信息)
+    """
+    if not value:
+        return None, None
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested - set(PROJECT_LIST_FIELDS)
+    if unknown:
+        return None, f"不支持的字段: {', '.join(sorted(unknown))}"
+    requested.add('id')
+    return tuple(field for field in PROJECT_LIST_FIELDS if field in requested), None
+
+
+def get_download_target(project_id):
+    """获取下载结题报告所需的 nsfc_id 和项目名称，项目不存在时返回None"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # 检查项目是否存在，获取nsfc_id和项目名称
+    cursor.execute('SELECT id, nsfc_id, title, url FROM projects WHERE id = ?', (project_id,))
+    project = cursor.fetchone()
+    conn.close()
+
+    if not project:
+        return None
+
+    nsfc_id = project['nsfc_id']
+    
+    # 如果没有nsfc_id，尝试从URL中提取
+    if not nsfc_id and project['url']:
+        nsfc_id_match = re.search(r'id=([a-f0-9]{32})', project['url'])
+        if nsfc_id_match:
+            nsfc_id = nsfc_id_match.group(1)
+    
+    return nsfc_id, project['title']
+
+
+def get_report_target(upload_folder, project_id):
+    """生成报告文件名（申请代码_项目名称_项目批准号.pdf）和保存路径，项目不存在时返回None"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT application_code, title, approval_number FROM projects WHERE id = ?', (project_id,))
+    project = cursor.fetchone()
+    conn.close()
+
+    if not project:
+        return None
+
+    # 清理文件名中的非法字符
+    safe_code = re.sub(r'[\\/*?:"<>|]', '_', project['application_code'] or '未知代码')
+    safe_title = re.sub(r'[\\/*?:"<>|]', '_', project['title'] or '未知项目')
+    safe_approval_number = re.sub(r'[\\/*?:"<>|]', '_', project['approval_number'] or '未知批准号')
+    
+    # 限制文件名长度，避免过长
+    if len(safe_title) > 50:
+        safe_title = safe_title[:50]
+    
+    filename = f"{safe_code}_{safe_title}_{safe_approval_number}.pdf"
+    file_path = os.path.join(upload_folder, filename)
+    
+    # 如果文件已存在，添加时间戳避免冲突
+    if os.path.exists(file_path):
+        timestamp = int(time.time())
+        filename = f"{safe_code}_{safe_title}_{timestamp}.pdf"
+        file_path = os.path.join(upload_folder, filename)
+    
+    return filename, file_path
+
+
+def sse_response(job, last_event_id=None):
+    """返回订阅下载任务进度的 SSE 响应，客户端断开时注销观看者"""
+    def generate():
+        job.subscribe()
+        try:
+            yield from progress_broker.stream(job.channel, last_event_id)
+        finally:
+            job.unsubscribe()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no',
+            'Access-Control-Allow-Origin': '*'
+        }
+    )
+
+
+def send_report_file(report, download_name):
+    """发送报告文件：强 ETag（内容哈希）、Last-Modified、Range 请求和长期缓存
+
+    SENDFILE_MODE 启用时只返回响应头，由前端 Web 服务器发送文件内容。
+    """
+    file_path = report['file_path']
+    etag = report.get('content_hash')
+    if not etag:
+        etag = file_sha256(file_path)
+        set_report_content_hash(report['id'], etag)
+    
+    last_modified = os.path.getmtime(file_path)
+    
+    if SENDFILE_MODE == 'x-accel':
+        response = Response(mimetype='application/pdf')
+        response.headers['X-Accel-Redirect'] = X_ACCEL_PREFIX + quote(os.path.basename(file_path))
+        response.headers['Content-Disposition'] = f"inline; filename*=UTF-8''{quote(download_name)}"
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.max_age = REPORT_CACHE_MAX_AGE
+        response = response.make_conditional(request)
+    else:
+        response = send_file(
+            file_path,
+            mimetype='application/pdf',
+            as_attachment=False,  # 设置为 False 以支持预览
+            download_name=download_name,
+            conditional=True,
+            etag=etag,
+            last_modified=last_modified,
+            max_age=REPORT_CACHE_MAX_AGE
+        )
+    
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
 def register_routes(app: Flask):
     """注册所有路由"""
     CORS(app)
+    init_responses(app)
+    init_metrics(app)
     
     # 配置上传文件夹
     # 获取应用根目录的绝对路径
     app_root = os.path.dirname(os.path.abspath(__file__))
-    upload_path = os.path.join(app_root, '..', UPLOAD_FOLDER)
+    data_root = DATA_DIR or os.path.join(app_root, '..')
+    upload_path = os.path.join(data_root, UPLOAD_FOLDER)
     app.config['UPLOAD_FOLDER'] = upload_path
     app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+    app.config['USE_X_SENDFILE'] = SENDFILE_MODE == 'x-sendfile'
     os.makedirs(upload_path, exist_ok=True)
+    file_reaper.start(upload_path)
+    chunked_uploads.configure(upload_path)
+    file_reaper.add_sweep(chunked_uploads.cleanup_stale)
+    file_reaper.add_sweep(prune_download_tasks)
+    
+    # 后台队列长度指标
+    QUEUE_DEPTH.set_function(search_history_writer.pending, queue='search_history')
+    QUEUE_DEPTH.set_function(file_reaper.pending, queue='file_reaper')
+    QUEUE_DEPTH.set_function(active_job_count, queue='download_jobs')
+    QUEUE_DEPTH.set_function(count_download_tasks, queue='download_tasks')
+    
+    # 配置缓存文件夹（文本提取、页面图片等）
+    cache_path = os.path.join(data_root, CACHE_FOLDER)
+    app.config['CACHE_FOLDER'] = cache_path
+    pdf_text_cache.configure(os.path.join(cache_path, 'text'))
+    # 删除项目时不逐个清理报告的文本缓存，由定期清理删除已不存在的报告的缓存
+    file_reaper.add_sweep(lambda: pdf_text_cache.prune(get_report_ids()))
+    page_render_cache.configure(os.path.join(cache_path, 'pages'))
+    
+    # 请求剖析（需设置 NSFC_PROFILE_ENABLED=1）
+    init_profiling(app, os.path.join(data_root, PROFILE_FOLDER))
 
     @app.route('/api/health', methods=['GET'])
     def health_check():
@@ -110,174 +319,60 @@ def register_routes(app: Flask):
 
     @app.route('/api/projects/<project_id>/download-report', methods=['GET', 'POST'])
     def download_project_report(project_id):
-        """单独下载结题报告 - 使用 SSE 实时推送进度"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # 检查项目是否存在，获取nsfc_id和项目名称
-        cursor.execute('SELECT id, nsfc_id, title FROM projects WHERE id = ?', (project_id,))
-        project = cursor.fetchone()
-
-        if not project:
-            conn.close()
-            return jsonify({'error': '项目不存在'}), 404
-
-        nsfc_id = project['nsfc_id']
-        project_name = project['title']
-        
-        # 如果没有nsfc_id，尝试从URL中提取
-        if not nsfc_id:
-            cursor.execute('SELECT url FROM projects WHERE id = ?', (project_id,))
-            url_result = cursor.fetchone()
-            if url_result and url_result['url']:
-                nsfc_id_match = re.search(r'id=([a-f0-9]{32})', url_result['url'])
-                if nsfc_id_match:
-                    nsfc_id = nsfc_id_match.group(1)
-        
-        conn.close()
-
-        def generate():
-            """生成 SSE 事件流"""
-            try:
-                # 发送开始事件
-                yield f"data: {json.dumps({'type': 'start', 'message': '开始下载结题报告...'})}\n\n"
-                logger.info(f"开始下载结题报告: {project_id}, nsfc_id: {nsfc_id}, 项目名称: {project_name}")
-
-                # 使用队列来收集进度消息
-                progress_queue = queue.Queue()
-
-                # 定义进度回调函数
-                def progress_callback(progress, message, current_page=0, collected_pages=0, total_pages=None):
-                    # 将进度事件放入队列
-                    event_data = {
-                        'type': 'progress',
-                        'progress': progress,
-                        'message': message,
-                        'current_page': current_page,
-                        'collected_pages': collected_pages,
-                        'total_pages': total_pages
-                    }
-                    progress_queue.put(event_data)
-                    if total_pages:
-                        logger.info(f"[下载进度] {progress}% - {message} (第{current_page}页，已收集{collected_pages}/{total_pages}页)")
-                    else:
-                        logger.info(f"[下载进度] {progress}% - {message} (第{current_page}页，已收集{collected_pages}页)")
-
-                # 在单独的线程中执行下载
-                download_result = {'result': None, 'exception': None}
-                
-                def download_thread():
-                    try:
-                        downloader = NsfcReportDownloader()
-                        result = downloader.download_report(nsfc_id, project_name, progress_callback)
-                        download_result['result'] = result
-                    except Exception as e:
-                        download_result['exception'] = e
-
-                thread = threading.Thread(target=download_thread)
-                thread.start()
-
-                # 持续发送进度消息，直到下载完成
-                while thread.is_alive():
-                    try:
-                        # 从队列中获取进度消息（超时0.1秒）
-                        event_data = progress_queue.get(timeout=0.1)
-                        yield f"data: {json.dumps(event_data)}\n\n"
-                    except queue.Empty:
-                        # 队列为空，继续等待
-                        continue
-
-                # 等待下载线程完成
-                thread.join()
-                
-                # 发送队列中剩余的所有消息
-                while not progress_queue.empty():
-                    try:
-                        event_data = progress_queue.get_nowait()
-                        yield f"data: {json.dumps(event_data)}\n\n"
-                    except queue.Empty:
-                        break
-                
-                result = download_result['result']
-                
-                if download_result['exception']:
-                    raise download_result['exception']
-
-                if result['success']:
-                    # 保存到数据库
-                    report_id = create_report_record(
-                        project_id, 
-                        result['filename'], 
-                        result['file_path'], 
-                        os.path.getsize(result['file_path'])
-                    )
-
-                    logger.info(f"结题报告下载完成: {result['filename']}, 共 {result.get('page_count', 0)} 页")
-
-                    # 发送完成事件
-                    complete_data = {
-                        'type': 'complete',
-                        'success': True,
-                        'report_id': report_id,
-                        'filename': result['filename'],
-                        'page_count': result.get('page_count', 0),
-                        'message': result['message']
-                    }
-                    yield f"data: {json.dumps(complete_data)}\n\n"
-                else:
-                    logger.warning(f"结题报告下载失败: {result['message']}")
-                    error_data = {
-                        'type': 'error',
-                        'message': result['message']
-                    }
-                    yield f"data: {json.dumps(error_data)}\n\n"
-
-            except Exception as e:
-                logger.error(f"下载结题报告失败: {str(e)}")
-                error_data = {
-                    'type': 'error',
-                    'message': f'下载失败: {str(e)}'
-                }
-                yield f"data: {json.dumps(error_data)}\n\n"
-
-        # 返回 SSE 响应
-        return Response(
-            stream_with_context(generate()),
-            mimetype='text/event-stream',
-            headers={
-                'Cache-Control': 'no-cache',
-                'Connection': 'keep-alive',
-                'Access-Control-Allow-Origin': '*'
-            }
-        )
+        """单独下载结题报告 - 使用 SSE 实时推送进度
+
+        下载在后台任务中执行，本接口只订阅其进度。项目已有进行中的下载时直接订阅该任务；
+        断线重连（携带 Last-Event-ID）时从断点回放事件。
+        """
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        
+        job = find_project_job(project_id)
+        if job is None or (job.finished and not last_event_id):
+            target = get_download_target(project_id)
+            if not target:
+                return jsonify({'error': '项目不存在'}), 404
+            job = start_download_job(project_id, *target)
+        
+        return sse_response(job, last_event_id)
+
+    @app.route('/api/downloads/<download_id>/events', methods=['GET'])
+    def download_events(download_id):
+        """订阅指定下载任务的进度事件（SSE），支持 Last-Event-ID 回放"""
+        job = get_download_job(download_id)
+        if job is None:
+            return jsonify({'error': '下载任务不存在'}), 404
+        
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        return sse_response(job, last_event_id)
+
+    @app.route('/api/downloads/<download_id>/trace', methods=['GET'])
+    def download_trace(download_id):
+        """下载任务的追踪时间线：各阶段（scan/api/image/decode/pdf_write/sleep）的耗时区间与汇总"""
+        job = get_download_job(download_id)
+        if job is None:
+            return jsonify({'error': '下载任务不存在'}), 404
+        return jsonify({'success': True, 'data': job.trace.to_dict()})
+
+    @app.route('/api/downloads/<download_id>', methods=['DELETE'])
+    def cancel_download(download_id):
+        """取消进行中的下载任务"""
+        job = get_download_job(download_id)
+        if job is None:
+            return jsonify({'error': '下载任务不存在'}), 404
+        if job.finished:
+            return jsonify({'error': '下载任务已结束'}), 409
+        
+        job.cancel('用户已取消下载')
+        return jsonify({'success': True})
 
     @app.route('/api/projects/<project_id>/download-report-simple', methods=['POST'])
     def download_project_report_simple(project_id):
         """简化版下载 - 不使用 SSE，只返回最终结果"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # 检查项目是否存在，获取nsfc_id和项目名称
-        cursor.execute('SELECT id, nsfc_id, title FROM projects WHERE id = ?', (project_id,))
-        project = cursor.fetchone()
-
-        if not project:
-            conn.close()
+        target = get_download_target(project_id)
+        if not target:
             return jsonify({'error': '项目不存在'}), 404
-
-        nsfc_id = project['nsfc_id']
-        project_name = project['title']
-        
-        # 如果没有nsfc_id，尝试从URL中提取
-        if not nsfc_id:
-            cursor.execute('SELECT url FROM projects WHERE id = ?', (project_id,))
-            url_result = cursor.fetchone()
-            if url_result and url_result['url']:
-                nsfc_id_match = re.search(r'id=([a-f0-9]{32})', url_result['url'])
-                if nsfc_id_match:
-                    nsfc_id = nsfc_id_match.group(1)
         
-        conn.close()
+        nsfc_id, project_name = target
 
         # 定义进度回调函数，实时记录日志
         def progress_callback(progress, message, current_page=0, collected_pages=0, total_pages=None):
@@ -319,13 +414,21 @@ def register_routes(app: Flask):
 
     @app.route('/api/projects', methods=['GET'])
     def get_projects():
-        """查询项目列表"""
+        """查询项目列表，fields=title,unit,... 只返回指定字段"""
         unit = request.args.get('unit', '')
         code = request.args.get('code', '')
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
         
-        projects, total = get_projects_list(unit, code, page, per_page)
+        filters, error = parse_range_filters(request.args)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        fields, error = parse_fields(request.args.get('fields'))
+        if error:
+            return jsonify({'error': error}), 400
+        
+        projects, total = get_projects_list(unit, code, page, per_page, filters, fields)
         
         # 记录搜索历史
         if unit or code:
@@ -426,10 +529,24 @@ def register_routes(app: Flask):
             return jsonify({'error': '项目不存在'}), 404
         conn.close()
         
-        delete_project_and_reports(project_id)
+        file_reaper.enqueue(delete_project_and_reports(project_id))
         
         return jsonify({'success': True})
 
+    @app.route('/api/projects/bulk-delete', methods=['POST'])
+    def bulk_delete_projects_route():
+        """批量删除项目（单个事务），报告文件由后台线程删除"""
+        data = request.get_json() or {}
+        project_ids = data.get('ids')
+        
+        if not project_ids or not isinstance(project_ids, list):
+            return jsonify({'error': 'ids不能为空'}), 400
+        
+        deleted, file_paths = delete_projects_bulk([str(project_id) for project_id in project_ids])
+        file_reaper.enqueue(file_paths)
+        
+        return jsonify({'success': True, 'deleted': deleted, 'queued_files': len(file_paths)})
+
     @app.route('/api/reports/upload', methods=['POST'])
     def upload_report():
         """上传结题报告PDF"""
@@ -448,58 +565,20 @@ def register_routes(app: Flask):
         if not allowed_file(file.filename):
             return jsonify({'error': '只支持PDF格式文件'}), 400
         
-        # 检查项目是否存在并获取项目信息
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, application_code, title FROM projects WHERE id = ?', (project_id,))
-        project = cursor.fetchone()
-        if not project:
-            conn.close()
+        # 检查项目是否存在并生成文件名
+        target = get_report_target(app.config['UPLOAD_FOLDER'], project_id)
+        if not target:
             return jsonify({'error': '项目不存在'}), 404
-        
-        # 获取项目信息用于文件命名
-        application_code = project['application_code'] or '未知代码'
-        title = project['title'] or '未知项目'
-        
-        conn.close()
+        new_filename, file_path = target
         
         try:
-            # 生成新的文件名：申请代码_项目名称_项目批准号.pdf
-            # 获取项目批准号
-            conn_temp = get_db_connection()
-            cursor_temp = conn_temp.cursor()
-            cursor_temp.execute('SELECT approval_number FROM projects WHERE id = ?', (project_id,))
-            project_info = cursor_temp.fetchone()
-            approval_number = project_info['approval_number'] if project_info else '未知批准号'
-            conn_temp.close()
-            
-            # 清理文件名中的非法字符
-            safe_code = re.sub(r'[\\/*?:"<>|]', '_', application_code)
-            safe_title = re.sub(r'[\\/*?:"<>|]', '_', title)
-            safe_approval_number = re.sub(r'[\\/*?:"<>|]', '_', approval_number)
-            
-            # 限制文件名长度，避免过长
-            if len(safe_title) > 50:
-                safe_title = safe_title[:50]
-            
-            new_filename = f"{safe_code}_{safe_title}_{safe_approval_number}.pdf"
-            
-            # 保存文件
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], new_filename)
-            
-            # 如果文件已存在，添加时间戳避免冲突
-            if os.path.exists(file_path):
-                timestamp = int(time.time())
-                new_filename = f"{safe_code}_{safe_title}_{timestamp}.pdf"
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], new_filename)
-            
-            file.save(file_path)
-            
-            # 获取文件大小
-            file_size = os.path.getsize(file_path)
+            # 分块写入文件，同时计算内容哈希，避免保存后再读一遍
+            digest = hashlib.sha256()
+            with open(file_path, 'wb') as f:
+                file_size = copy_stream(file.stream, f, digest)
             
             # 保存到数据库
-            report_id = create_report_record(project_id, new_filename, file_path, file_size)
+            report_id = create_report_record(project_id, new_filename, file_path, file_size, digest.hexdigest())
             
             return jsonify({
                 'success': True,
@@ -510,12 +589,118 @@ def register_routes(app: Flask):
             
         except Exception as e:
             logger.error(f"上传失败: {str(e)}")
+            file_reaper.enqueue(file_path)
             return jsonify({'error': f'上传失败: {str(e)}'}), 500
 
+    @app.route('/api/reports/uploads', methods=['POST'])
+    def create_chunked_upload():
+        """创建分块上传会话
+
+        请求体：{"project_id": ..., "filename": ..., "size": 文件总字节数}。
+        之后按顺序 PUT 分块到 /api/reports/uploads/<upload_id>，最后 POST .../complete。
+        """
+        data = request.get_json(silent=True) or {}
+        project_id = data.get('project_id')
+        filename = data.get('filename') or ''
+        size = data.get('size')
+        
+        if not project_id:
+            return jsonify({'error': '项目ID不能为空'}), 400
+        
+        if not allowed_file(filename):
+            return jsonify({'error': '只支持PDF格式文件'}), 400
+        
+        if size is not None and not isinstance(size, int):
+            return jsonify({'error': 'size必须是整数'}), 400
+        
+        if not get_project_detail(project_id):
+            return jsonify({'error': '项目不存在'}), 404
+        
+        try:
+            upload_id = chunked_uploads.create(project_id, filename, size)
+        except UploadError as e:
+            return jsonify({'error': str(e)}), e.status
+        
+        return jsonify({'success': True, 'upload_id': upload_id, 'offset': 0, 'chunk_size': CHUNK_SIZE}), 201
+
+    @app.route('/api/reports/uploads/<upload_id>', methods=['GET'])
+    def get_chunked_upload(upload_id):
+        """查询上传进度（断线续传时从返回的 offset 继续）"""
+        upload = chunked_uploads.get(upload_id)
+        if not upload:
+            return jsonify({'error': '上传不存在或已过期'}), 404
+        
+        response = jsonify(upload)
+        response.headers['Upload-Offset'] = str(upload['offset'])
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    @app.route('/api/reports/uploads/<upload_id>', methods=['PUT', 'PATCH'])
+    def append_chunked_upload(upload_id):
+        """写入一个分块，偏移量由 Upload-Offset 请求头或 ?offset= 指定，必须等于当前已上传字节数"""
+        offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+        if offset is None or not offset.isdigit():
+            return jsonify({'error': '缺少或无效的偏移量'}), 400
+        
+        try:
+            new_offset = chunked_uploads.append(upload_id, int(offset), request.stream)
+        except UploadError as e:
+            response = jsonify({'error': str(e), 'offset': e.offset})
+            if e.offset is not None:
+                response.headers['Upload-Offset'] = str(e.offset)
+            return response, e.status
+        
+        response = jsonify({'success': True, 'offset': new_offset})
+        response.headers['Upload-Offset'] = str(new_offset)
+        return response
+
+    @app.route('/api/reports/uploads/<upload_id>/complete', methods=['POST'])
+    def complete_chunked_upload(upload_id):
+        """完成上传：校验文件后移动到上传目录并登记报告"""
+        try:
+            upload, part_path, content_hash = chunked_uploads.finish(upload_id)
+        except UploadError as e:
+            return jsonify({'error': str(e), 'offset': e.offset}), e.status
+        
+        target = get_report_target(app.config['UPLOAD_FOLDER'], upload['project_id'])
+        if not target:
+            chunked_uploads.discard(upload_id)
+            return jsonify({'error': '项目不存在'}), 404
+        new_filename, file_path = target
+        
+        try:
+            os.replace(part_path, file_path)
+            chunked_uploads.discard(upload_id)
+            report_id = create_report_record(
+                upload['project_id'], new_filename, file_path, upload['offset'], content_hash)
+            
+            return jsonify({
+                'success': True,
+                'report_id': report_id,
+                'filename': new_filename,
+                'file_size': upload['offset']
+            })
+            
+        except Exception as e:
+            logger.error(f"上传失败: {str(e)}")
+            return jsonify({'error': f'上传失败: {str(e)}'}), 500
+
+    @app.route('/api/reports/uploads/<upload_id>', methods=['DELETE'])
+    def abort_chunked_upload(upload_id):
+        """放弃上传并删除已上传的数据"""
+        if not chunked_uploads.get(upload_id):
+            return jsonify({'error': '上传不存在或已过期'}), 404
+        chunked_uploads.discard(upload_id)
+        return jsonify({'success': True})
+
     @app.route('/api/reports/<report_id>/view', methods=['GET'])
     def view_report(report_id):
-        """查看PDF内容"""
-        if fitz is None:
+        """查看PDF内容
+
+        支持 ?page=n 返回单页，或 ?from=a&to=b 返回页码范围（从1开始，含两端），此时同时返回逐页的 pages；
+        不带参数时只在 content 中返回全部文本。提取结果按报告缓存，文件变化后自动失效。
+        """
+        if optional_import('fitz') is None:
             return jsonify({'error': 'PDF处理功能未安装，请安装 PyMuPDF'}), 503
         
         report = get_report_info(report_id)
@@ -529,35 +714,98 @@ def register_routes(app: Flask):
             return jsonify({'error': '文件不存在'}), 404
         
         try:
-            # 读取PDF内容
-            doc = fitz.open(file_path)
-            text = ""
-            page_count = doc.page_count
-            
-            # 读取所有页面的内容
-            for page_num in range(page_count):
-                page = doc.load_page(page_num)
-                text += page.get_text()
-                
-                # 在页面之间添加分隔符
-                if page_num < page_count - 1:
-                    text += "\n\n--- 页面分隔 ---\n\n"
-            
-            doc.close()
-            
-            # 如果内容为空，提供提示信息
-            if not text.strip():
-                text = "该PDF文件可能只包含图片或格式化内容，无法提取文本。\n\n您可以下载后查看完整内容。"
-            
-            return jsonify({
-                'success': True,
-                'content': text,
-                'page_count': page_count
-            })
-            
+            pages = pdf_text_cache.get_pages(report_id, file_path)
         except Exception as e:
             logger.error(f"读取PDF失败: {str(e)}")
             return jsonify({'error': f'读取PDF失败: {str(e)}'}), 500
+        
+        page_count = len(pages)
+        ranged = any(request.args.get(name) for name in ('page', 'from', 'to'))
+        try:
+            if request.args.get('page'):
+                first = last = int(request.args['page'])
+            else:
+                first = int(request.args.get('from', 1))
+                last = int(request.args.get('to', page_count))
+        except ValueError:
+            return jsonify({'error': '页码格式错误'}), 400
+        
+        first, last = max(first, 1), min(last, page_count)
+        if page_count and first > last:
+            return jsonify({'error': f'页码超出范围（共 {page_count} 页）'}), 400
+        
+        selected = pages[first - 1:last]
+        text = PAGE_SEPARATOR.join(selected)
+        
+        # 如果内容为空，提供提示信息
+        if not text.strip():
+            text = "该PDF文件可能只包含图片或格式化内容，无法提取文本。\n\n您可以下载后查看完整内容。"
+        
+        result = {
+            'success': True,
+            'content': text,
+            'page_count': page_count,
+            'from': first,
+            'to': last,
+        }
+        if ranged:
+            result['pages'] = [{'page': first + i, 'text': page_text} for i, page_text in enumerate(selected)]
+        return jsonify(result)
+
+    def render_report_page(report_id, page_number, dpi, width, fmt):
+        """渲染报告页面并返回图片响应（带缓存校验头）"""
+        if optional_import('fitz') is None:
+            return jsonify({'error': 'PDF处理功能未安装，请安装 PyMuPDF'}), 503
+        
+        if fmt not in RENDER_FORMATS:
+            return jsonify({'error': f'format 仅支持: {", ".join(RENDER_FORMATS)}'}), 400
+        if dpi is not None and not 0 < dpi <= MAX_DPI:
+            return jsonify({'error': f'dpi 取值范围为 1-{MAX_DPI}'}), 400
+        if width is not None and not 0 < width <= MAX_WIDTH:
+            return jsonify({'error': f'width 取值范围为 1-{MAX_WIDTH}'}), 400
+        
+        report = get_report_info(report_id)
+        if not report or not os.path.exists(report['file_path']):
+            return jsonify({'error': '文件不存在'}), 404
+        
+        try:
+            data, cache_key = page_render_cache.render(report_id, report['file_path'], page_number, dpi, width, fmt)
+        except IndexError as e:
+            return jsonify({'error': str(e)}), 404
+        except Exception as e:
+            logger.error(f"渲染页面失败: {str(e)}")
+            return jsonify({'error': f'渲染页面失败: {str(e)}'}), 500
+        
+        response = Response(data, mimetype=RENDER_FORMATS[fmt][0])
+        response.set_etag(cache_key)
+        response.cache_control.public = True
+        response.cache_control.max_age = 86400
+        return response.make_conditional(request)
+
+    @app.route('/api/reports/<report_id>/pages/<int:page_number>', methods=['GET'])
+    def report_page_image(report_id, page_number):
+        """渲染报告的单个页面为图片（?dpi= 或 ?width=，?format=png|jpeg）"""
+        try:
+            dpi = int(request.args['dpi']) if request.args.get('dpi') else None
+            width = int(request.args['width']) if request.args.get('width') else None
+        except ValueError:
+            return jsonify({'error': 'dpi / width 格式错误'}), 400
+        
+        if dpi is None and width is None:
+            dpi = DEFAULT_DPI
+        fmt = request.args.get('format', 'png')
+        return render_report_page(report_id, page_number, dpi, width, fmt)
+
+    @app.route('/api/reports/<report_id>/thumbnail', methods=['GET'])
+    def report_thumbnail(report_id):
+        """报告缩略图（默认第1页，?page= 可指定页码，?width= 指定宽度）"""
+        try:
+            page_number = int(request.args.get('page', 1))
+            width = int(request.args.get('width', THUMBNAIL_WIDTH))
+        except ValueError:
+            return jsonify({'error': 'page / width 格式错误'}), 400
+        
+        return render_report_page(report_id, page_number, None, width, request.args.get('format', 'jpeg'))
 
     @app.route('/api/reports/<report_id>/download', methods=['GET'])
     def download_report_file(report_id):
@@ -574,13 +822,8 @@ def register_routes(app: Flask):
             return jsonify({'error': '文件不存在'}), 404
         
         try:
-            # 使用 send_file 直接返回文件，支持预览和下载
-            return send_file(
-                file_path,
-                mimetype='application/pdf',
-                as_attachment=False,  # 设置为 False 以支持预览
-                download_name=filename
-            )
+            # 直接返回文件，支持预览、下载和断点续传
+            return send_report_file(report, filename)
             
         except Exception as e:
             logger.error(f"下载失败: {str(e)}")
@@ -600,13 +843,8 @@ def register_routes(app: Flask):
             return jsonify({'error': '文件不存在'}), 404
         
         try:
-            # 使用 send_file 返回 PDF，浏览器会自动预览
-            return send_file(
-                file_path,
-                mimetype='application/pdf',
-                as_attachment=False,  # 关键：不触发下载，直接预览
-                download_name=f'preview_{report_id}.pdf'
-            )
+            # 返回 PDF，浏览器会自动预览；支持 Range 请求，PDF.js 可按需加载
+            return send_report_file(report, f'preview_{report_id}.pdf')
         except Exception as e:
             logger.error(f"预览失败: {str(e)}")
             return jsonify({'error': f'预览失败: {str(e)}'}), 500
@@ -619,20 +857,87 @@ def register_routes(app: Flask):
         if not report:
             return jsonify({'error': '文件不存在'}), 404
         
-        delete_report(report_id)
+        file_reaper.enqueue(delete_report(report_id))
+        pdf_text_cache.discard(report_id)
         
         return jsonify({'success': True})
 
+    @app.route('/api/maintenance/sweep-orphans', methods=['POST'])
+    def sweep_orphan_files_route():
+        """立即清理 uploads/ 中没有报告记录引用的文件"""
+        removed = file_reaper.sweep_orphans()
+        return jsonify({'success': True, 'removed': removed})
+
+    @app.route('/api/stats', methods=['GET'])
+    def get_stats_route():
+        """分组统计（项目数、资助经费），由触发器维护的汇总表直接返回"""
+        group_by = request.args.get('group_by', 'unit')
+        order_by = request.args.get('order_by', 'count')
+        limit = int(request.args.get('limit', 50))
+        key = request.args.get('key')
+        
+        if group_by not in STATS_DIMENSIONS:
+            return jsonify({'error': f'group_by 仅支持: {", ".join(STATS_DIMENSIONS)}'}), 400
+        if order_by not in STATS_ORDERS:
+            return jsonify({'error': f'order_by 仅支持: {", ".join(STATS_ORDERS)}'}), 400
+        
+        stats = get_project_stats(group_by, order_by, limit, key)
+        total = get_project_stats('total')
+        
+        return jsonify({
+            'success': True,
+            'group_by': group_by,
+            'data': stats,
+            'total': total[0] if total else {'project_count': 0, 'total_funding': 0}
+        })
+
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics_route():
+        """运行指标（Prometheus 文本格式）"""
+        return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    @app.route('/api/profiles', methods=['GET'])
+    def list_profiles_route():
+        """列出请求剖析结果"""
+        return jsonify({'success': True, 'enabled': PROFILE_ENABLED, 'data': profile_store.list()})
+
+    @app.route('/api/profiles/<name>', methods=['GET'])
+    def get_profile_route(name):
+        """下载剖析结果（pstats 格式），?format=text 返回耗时最多的函数列表"""
+        path = profile_store.path(name)
+        if not path:
+            return jsonify({'error': '剖析结果不存在'}), 404
+        
+        if request.args.get('format') == 'text':
+            sort = request.args.get('sort', 'cumulative')
+            if sort not in ('cumulative', 'tottime', 'ncalls'):
+                return jsonify({'error': 'sort必须是 cumulative、tottime 或 ncalls'}), 400
+            return Response(profile_store.summary(name, sort), mimetype='text/plain; charset=utf-8')
+        
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=name)
+
+    @app.route('/api/slow-queries', methods=['GET'])
+    def slow_queries_route():
+        """最近的慢查询及其查询计划"""
+        return jsonify({'success': True, 'threshold_ms': SLOW_QUERY_MS, 'data': list(reversed(slow_queries))})
+
+    @app.route('/api/cache/stats', methods=['GET'])
+    def cache_stats_route():
+        """查询结果缓存的命中统计"""
+        return jsonify({'success': True, 'data': query_cache.stats()})
+
     @app.route('/api/search/history', methods=['GET'])
     def get_search_history_route():
         """获取搜索历史"""
         limit = int(request.args.get('limit', 10))
+        search_history_writer.flush()
         history = get_search_history(limit)
         return jsonify({'success': True, 'data': history})
 
     @app.route('/api/search/history', methods=['DELETE'])
     def clear_search_history_route():
         """清空搜索历史"""
+        search_history_writer.flush()
         clear_search_history()
         return jsonify({'success': True})
 
@@ -641,8 +946,31 @@ def register_routes(app: Flask):
         """导出项目列表"""
         unit = request.args.get('unit', '')
         code = request.args.get('code', '')
+        fmt = request.args.get('format', 'csv').lower()
+        if fmt == 'jsonl':
+            fmt = 'ndjson'
         
-        csv_content = export_projects_to_csv(unit, code)
+        filters, error = parse_range_filters(request.args)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        if fmt in EXPORT_FORMATS:
+            if fmt in ARROW_FORMATS and not arrow_available():
+                return jsonify({'error': '列式导出功能未安装，请安装 pyarrow'}), 503
+            
+            mimetype, extension = EXPORT_FORMATS[fmt]
+            return Response(
+                stream_with_context(export_projects(fmt, unit, code, filters)),
+                mimetype=mimetype,
+                headers={
+                    'Content-Disposition': f'attachment; filename=projects_{int(time.time())}.{extension}'
+                }
+            )
+        
+        if fmt != 'csv':
+            return jsonify({'error': f'不支持的导出格式: {fmt}'}), 400
+        
+        csv_content = export_projects_to_csv(unit, code, filters)
         
         return Response(
             csv_content,
@@ -652,3 +980,31 @@ def register_routes(app: Flask):
                 'Content-Type': 'text/csv; charset=utf-8-sig'
             }
         )
+
+    @app.route('/api/import/projects', methods=['POST'])
+    def import_projects_route():
+        """批量导入项目（CSV / NDJSON），支持表单上传或直接发送文件内容"""
+        if 'file' in request.files:
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({'error': '未选择文件'}), 400
+            fmt = request.form.get('format') or detect_format(file.filename)
+            stream = file.stream
+        else:
+            content_type = request.mimetype or ''
+            fmt = request.args.get('format') or ('ndjson' if 'json' in content_type else 'csv')
+            stream = request.stream
+        
+        if fmt not in IMPORT_FORMATS:
+            return jsonify({'error': f'不支持的导入格式: {fmt}'}), 400
+        
+        try:
+            text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+            report = import_projects(text_stream, fmt)
+        except (ValueError, UnicodeDecodeError) as e:
+            return jsonify({'error': f'导入失败: {str(e)}'}), 400
+        except Exception as e:
+            logger.error(f"导入失败: {str(e)}")
+            return jsonify({'error': f'导入失败: {str(e)}'}), 500
+        
+        return jsonify({'success': True, **report})
@@ -2,19 +2,25 @@
 import re
 import time
 import logging
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.edge.service import Service
-from selenium.webdriver.edge.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+
+from metrics import SCRAPE_SECONDS
+from politeness import politeness
 
 logger = logging.getLogger(__name__)
 
 
+@SCRAPE_SECONDS.timed()
 def extract_project_info(url):
     """从URL提取项目信息 - 使用Edge浏览器和特定的元素定位"""
+    # selenium 和 bs4 导入较慢，只在抓取时导入
+    from bs4 import BeautifulSoup
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.edge.service import Service
+    from selenium.webdriver.edge.options import Options
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    
     try:
         logger.info(f"开始抓取: {url}")
 
@@ -37,7 +43,8 @@ def extract_project_info(url):
         driver = webdriver.Edge(service=service, options=edge_options)
         
         try:
-            # 访问页面
+            # 访问页面（与报告下载共用该主机的请求速率）
+            politeness.for_url(url).acquire(f'scrape-{id(driver)}')
             driver.get(url)
             
             # 等待"info"区域真正渲染完成
@@ -0,0 +1,73 @@
+"""报告末尾重复页、占位图的处理"""
+import io
+import random
+
+from PIL import Image
+
+from downloader import NsfcReportDownloader
+
+
+def make_page(seed):
+    """内容各不相同的页面图片"""
+    rng = random.Random(seed)
+    img = Image.frombytes('L', (200, 280), rng.randbytes(200 * 280))
+    buffer = io.BytesIO()
+    img.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_blank():
+    buffer = io.BytesIO()
+    Image.new('L', (200, 280), 255).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def download(tmp_path, images):
+    """用给定的页面图片序列运行 download_report，返回 (结果, 请求过的页码)"""
+    downloader = NsfcReportDownloader(delay_scale=0, output_dir=str(tmp_path))
+    requested = []
+
+    def get_image_url(nsfc_id, index, check_only=False):
+        return f'/report/{index}.png' if index <= len(images) else None
+
+    def download_image(img_url, index=0):
+        requested.append(index)
+        return images[index - 1]
+
+    downloader.init_session = lambda: None
+    downloader.scan_total_pages = lambda nsfc_id, progress_callback=None: None
+    downloader.get_image_url_from_api = get_image_url
+    downloader.download_image_content = download_image
+    return downloader.download_report('0' * 32, 'test'), requested
+
+
+def test_repeated_last_page_is_kept(tmp_path):
+    pages = [make_page(seed) for seed in range(5)]
+    result, requested = download(tmp_path, pages + [pages[-1]] * 10)
+
+    assert result['success']
+    assert result['page_count'] == 5
+    assert requested == list(range(1, 9))
+
+
+def test_repeated_placeholder_ends_report(tmp_path):
+    pages = [make_page(seed) for seed in range(5)]
+    blank = make_blank()
+    result, requested = download(tmp_path, pages + [blank] * 10)
+
+    assert result['success']
+    assert result['page_count'] == 5
+    assert requested == list(range(1, 9))
+
+
+def test_blank_page_inside_later_report_is_dropped(tmp_path):
+    blank = make_blank()
+    pages = [make_page(seed) for seed in range(6)]
+    download(tmp_path, pages[:2] + [blank] * 10)
+
+    # 之前的下载以同样的空白页结束，不影响之后报告正文中间的空白页
+    result, requested = download(tmp_path, pages[:3] + [blank] + pages[3:])
+
+    assert result['success']
+    assert result['page_count'] == 6
+    assert requested == list(range(1, 8))
@@ -0,0 +1,127 @@
+"""下载任务的追踪时间线与逐页日志采样
+
+每个下载任务记录一份追踪：扫描、接口请求、图片下载、解码、PDF 写入、等待等阶段的耗时区间，
+以紧凑的列表形式保存在内存中，可通过 /api/downloads/<id>/trace 查看时间花在了哪里。
+逐页日志按页码采样输出，未输出的日志不做字符串格式化。
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 每个追踪最多保存的区间数，超出后只计入汇总
+TRACE_MAX_SPANS = 5000
+# 逐页日志的采样间隔：第1页和每隔 N 页以 INFO 输出，其余页降为 DEBUG
+PAGE_LOG_INTERVAL = max(1, int(os.environ.get('NSFC_PAGE_LOG_INTERVAL', '10')))
+
+
+class Trace:
+    """单个下载任务的追踪记录
+
+    区间保存为 (名称, 开始偏移毫秒, 耗时毫秒, 属性) 元组，属性为空时为None。
+    """
+
+    def __init__(self, trace_id, max_spans=TRACE_MAX_SPANS):
+        self.id = trace_id
+        self.started_at = time.time()
+        self.max_spans = max_spans
+        self.spans = []
+        self.dropped = 0
+        self.finished_at = None
+        self._start = time.perf_counter()
+        self._summary = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """记录代码块的耗时区间；代码块内可向 attrs 补充属性"""
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self._add(name, start, time.perf_counter(), attrs)
+
+    def event(self, name, **attrs):
+        """记录一个瞬时事件"""
+        now = time.perf_counter()
+        self._add(name, now, now, attrs)
+
+    def finish(self):
+        """标记追踪结束"""
+        self.finished_at = time.time()
+
+    def _add(self, name, start, end, attrs):
+        duration_ms = (end - start) * 1000
+        with self._lock:
+            summary = self._summary.get(name)
+            if summary is None:
+                summary = self._summary[name] = [0, 0.0, 0.0]
+            summary[0] += 1
+            summary[1] += duration_ms
+            summary[2] = max(summary[2], duration_ms)
+
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            self.spans.append((name, round((start - self._start) * 1000, 2), round(duration_ms, 2), attrs or None))
+
+    def to_dict(self):
+        """导出为可序列化的字典"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span[1])
+            summary = {
+                name: {'count': count, 'total_ms': round(total, 2), 'max_ms': round(longest, 2)}
+                for name, (count, total, longest) in self._summary.items()
+            }
+        end = self.finished_at or time.time()
+        return {
+            'id': self.id,
+            'started_at': self.started_at,
+            'duration_ms': round((end - self.started_at) * 1000, 2),
+            'finished': self.finished_at is not None,
+            'summary': summary,
+            'fields': ['name', 'start_ms', 'duration_ms', 'attrs'],
+            'spans': spans,
+            'dropped': self.dropped,
+        }
+
+
+class NullTrace:
+    """不记录任何内容的追踪（未关联下载任务时使用）"""
+
+    id = None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        yield attrs
+
+    def event(self, name, **attrs):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+class TraceSnapshot:
+    """已结束的追踪的导出结果（由下载工作进程记录，应用进程只读取）"""
+
+    def __init__(self, data):
+        self.data = data
+        self.id = data.get('id')
+
+    def finish(self):
+        pass
+
+    def to_dict(self):
+        return self.data
+
+
+def log_page(logger, page, message, *args):
+    """按页码采样输出逐页日志，参数在真正输出时才格式化"""
+    if page <= 1 or page % PAGE_LOG_INTERVAL == 0:
+        logger.info(message, *args)
+    else:
+        logger.debug(message, *args)
@@ -0,0 +1,230 @@
+"""结题报告下载工作进程
+
+队列模式（应用设置 NSFC_DOWNLOAD_MODE=queue）下，应用只把下载任务写入 download_tasks 表，由本进程领取执行，
+结果通过 complete_download_task 与任务状态在同一事务中写入报告表（项目已删除时丢弃）。可以在应用所在的主机上启动任意多个工作进程
+（共用数据库和 uploads 存储，即相同的 --db 与 NSFC_DATA_DIR），下载吞吐随进程数增加。
+数据库使用 WAL 模式，依赖同一台主机上的共享内存，不支持多台主机通过网络文件系统共用数据库。
+
+任务通过租约领取：执行期间定期续约（心跳），进程崩溃或失联导致租约过期后，任务由其他工作进程重新领取，
+超过 DOWNLOAD_TASK_MAX_ATTEMPTS 次仍未完成的任务标记为失败。收到 SIGTERM / SIGINT 时停止领取新任务，
+取消进行中的下载并把任务交还队列。
+
+命令行用法:
+    python worker.py
+    python worker.py --concurrency 4 --db nsfc.db --worker-id host1-a
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+
+import models
+from downloader import NsfcReportDownloader
+from fileutils import file_sha256
+from models import (
+    claim_download_task, complete_download_task, finish_download_task, release_download_task,
+    renew_download_task_lease, update_download_task_progress
+)
+from tracing import Trace, log_page
+
+logger = logging.getLogger(__name__)
+
+# 租约时长（秒），进程失联超过该时间后任务被重新领取
+LEASE_SECONDS = float(os.environ.get('NSFC_TASK_LEASE_SECONDS', '60'))
+# 续约间隔（秒）
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 4
+# 没有任务时的轮询间隔（秒），附加随机抖动避免多个进程同时轮询
+IDLE_POLL_INTERVAL = 2.0
+# 进度写入数据库的最小间隔（秒）
+PROGRESS_WRITE_INTERVAL = 1.0
+
+
+class TaskRunner:
+    """执行一个已领取的下载任务，并在执行期间续约"""
+
+    def __init__(self, worker_id, task):
+        self.worker_id = worker_id
+        self.task = task
+        self.cancel_event = threading.Event()
+        self.cancel_reason = None
+        self.lease_lost = False
+        self.trace = Trace(task['id'])
+        self._done = threading.Event()
+        self._last_write = 0.0
+
+    def cancel(self, reason):
+        """停止下载：'shutdown'（工作进程退出）、'cancel'（用户取消）或 'lease'（租约丢失）"""
+        if self.cancel_reason is None:
+            self.cancel_reason = reason
+        self.cancel_event.set()
+
+    def _heartbeat(self):
+        """定期续约，同时检查取消请求"""
+        while not self._done.wait(HEARTBEAT_INTERVAL):
+            try:
+                owned, cancel_requested = renew_download_task_lease(self.task['id'], self.worker_id, LEASE_SECONDS)
+            except sqlite3.Error as e:
+                logger.warning(f"[工作进程] 任务 {self.task['id']} 续约失败: {str(e)}")
+                continue
+            if not owned:
+                self.lease_lost = True
+                self.cancel('lease')
+                logger.warning(f"[工作进程] 任务 {self.task['id']} 的租约已失效，停止下载")
+            elif cancel_requested:
+                self.cancel('cancel')
+
+    def progress_callback(self, progress, message, current_page=0, collected_pages=0, total_pages=None):
+        """下载器进度回调：按最小间隔写入任务记录"""
+        now = time.monotonic()
+        if now - self._last_write >= PROGRESS_WRITE_INTERVAL or progress >= 100:
+            self._last_write = now
+            try:
+                update_download_task_progress(self.task['id'], self.worker_id, progress, message,
+                                              current_page, collected_pages, total_pages)
+            except sqlite3.Error as e:
+                logger.warning(f"[工作进程] 写入任务 {self.task['id']} 进度失败: {str(e)}")
+        log_page(logger, current_page, "[下载进度] %s %s%% - %s (第%s页，已收集%s/%s页)",
+                 self.task['id'][:8], progress, message, current_page, collected_pages, total_pages or '?')
+
+    def run(self):
+        task = self.task
+        logger.info(f"[工作进程] 开始任务 {task['id']}（第 {task['attempts']} 次）: "
+                    f"{task['project_id']}, nsfc_id: {task['nsfc_id']}")
+        heartbeat = threading.Thread(target=self._heartbeat, name=f"lease-{task['id'][:8]}", daemon=True)
+        heartbeat.start()
+        try:
+            downloader = NsfcReportDownloader(cancel_event=self.cancel_event, trace=self.trace)
+            result = downloader.download_report(task['nsfc_id'], task['project_name'], self.progress_callback)
+        except Exception as e:
+            logger.error(f"下载结题报告失败: {str(e)}")
+            result = {'success': False, 'message': f'下载失败: {str(e)}'}
+        finally:
+            self._done.set()
+            heartbeat.join()
+            self.trace.finish()
+
+        self._finish(result)
+
+    def _finish(self, result):
+        task_id = self.task['id']
+        if self.lease_lost:
+            # 任务已被重新排队或由其他工作进程执行，结果不再写入，已生成的 PDF 没有报告记录引用，直接删除
+            if result.get('success'):
+                os.remove(result['file_path'])
+            logger.warning(f"[工作进程] 任务 {task_id} 的租约已失效，丢弃结果")
+            return
+
+        if result.get('cancelled') and self.cancel_reason == 'shutdown':
+            release_download_task(task_id, self.worker_id)
+            logger.info(f"[工作进程] 任务 {task_id} 已交还队列")
+            return
+
+        trace = json.dumps(self.trace.to_dict(), ensure_ascii=False)
+        if result.get('cancelled'):
+            finish_download_task(task_id, self.worker_id, 'cancelled', result['message'], trace=trace)
+        elif result['success']:
+            file_path = result['file_path']
+            report_id = complete_download_task(
+                task_id, self.worker_id, self.task['project_id'], result['filename'], file_path,
+                os.path.getsize(file_path), file_sha256(file_path), result.get('page_count', 0), result['message'],
+                trace=trace
+            )
+            if report_id is None:
+                # 下载期间项目被删除、任务被取消或租约失效，报告不再登记
+                os.remove(file_path)
+                finish_download_task(task_id, self.worker_id, 'cancelled', '下载已取消', trace=trace)
+                logger.warning(f"[工作进程] 任务 {task_id} 已取消或项目已删除，丢弃下载结果")
+                return
+            logger.info(f"[工作进程] 任务 {task_id} 完成: {result['filename']}, 共 {result.get('page_count', 0)} 页")
+        else:
+            finish_download_task(task_id, self.worker_id, 'failed', error=result['message'], trace=trace)
+            logger.warning(f"[工作进程] 任务 {task_id} 失败: {result['message']}")
+
+
+class DownloadWorker:
+    """下载工作进程：concurrency 个执行槽各自循环领取并执行任务"""
+
+    def __init__(self, worker_id, concurrency=1):
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.stop_event = threading.Event()
+        self._runners = set()
+        self._lock = threading.Lock()
+
+    def run(self):
+        """运行直到 stop() 被调用"""
+        logger.info(f"[工作进程] {self.worker_id} 已启动，并发 {self.concurrency}，租约 {LEASE_SECONDS:.0f} 秒")
+        slots = [threading.Thread(target=self._slot, args=(i,), name=f'slot-{i}', daemon=True)
+                 for i in range(self.concurrency)]
+        for slot in slots:
+            slot.start()
+        # 带超时等待，使主线程能及时处理信号
+        while any(slot.is_alive() for slot in slots):
+            for slot in slots:
+                slot.join(1)
+        logger.info(f"[工作进程] {self.worker_id} 已退出")
+
+    def stop(self):
+        """停止领取新任务，取消进行中的下载（任务交还队列）"""
+        if self.stop_event.is_set():
+            return
+        logger.info(f"[工作进程] {self.worker_id} 正在退出...")
+        self.stop_event.set()
+        with self._lock:
+            for runner in self._runners:
+                runner.cancel('shutdown')
+
+    def _slot(self, index):
+        worker_id = f'{self.worker_id}/{index}'
+        while not self.stop_event.is_set():
+            try:
+                task = claim_download_task(worker_id, LEASE_SECONDS)
+            except sqlite3.Error as e:
+                logger.warning(f"[工作进程] 领取任务失败: {str(e)}")
+                task = None
+            if task is None:
+                self.stop_event.wait(IDLE_POLL_INTERVAL * random.uniform(0.5, 1.5))
+                continue
+
+            runner = TaskRunner(worker_id, task)
+            with self._lock:
+                self._runners.add(runner)
+                if self.stop_event.is_set():
+                    runner.cancel('shutdown')
+            try:
+                runner.run()
+            except Exception as e:
+                logger.error(f"[工作进程] 执行任务 {task['id']} 出错: {str(e)}")
+            finally:
+                with self._lock:
+                    self._runners.discard(runner)
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='结题报告下载工作进程')
+    parser.add_argument('--concurrency', type=int, default=1, help='同时执行的下载数')
+    parser.add_argument('--db', default=models.DATABASE, help='数据库文件路径（与应用共用）')
+    parser.add_argument('--worker-id', default=f'{socket.gethostname()}-{os.getpid()}', help='工作进程标识')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    models.DATABASE = args.db
+    models.init_db()
+
+    worker = DownloadWorker(args.worker_id, args.concurrency)
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    worker.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -33,6 +33,9 @@ api.interceptors.response.use(
   }
 )
 
+// 列表页显示的项目字段，避免返回摘要等大字段
+const PROJECT_LIST_FIELDS = 'id,title,approval_number,application_code,leader,unit,funding,start_date,end_date,url'
+
 // API 方法
 export default {
   // 健康检查
@@ -40,13 +43,14 @@ export default {
 
   // 项目相关
   fetchProject: (url, autoDownload = false) => api.post('/projects/fetch', { url, auto_download: autoDownload }),
-  getProjects: (params = {}) => api.get('/projects', { params }),
+  getProjects: (params = {}) => api.get('/projects', { params: { fields: PROJECT_LIST_FIELDS, ...params } }),
   getProjectDetail: (id) => api.get(`/projects/${id}`),
   createProject: (data) => api.post('/projects', data),
   updateProject: (id, data) => api.put(`/projects/${id}`, data),
   deleteProject: (id) => api.delete(`/projects/${id}`),
   downloadProjectReport: (projectId) => api.post(`/projects/${projectId}/download-report`),
   downloadProjectReportSimple: (projectId) => api.post(`/projects/${projectId}/download-report-simple`),
+  cancelDownload: (downloadId) => api.delete(`/downloads/${downloadId}`),
 
   // PDF 相关
   uploadReport: (formData) => api.post('/reports/upload', formData, {